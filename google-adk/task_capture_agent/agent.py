@@ -2,30 +2,65 @@
 
 A single LlmAgent that captures tasks, classifies them by topic,
 routes them to the correct Notion database, and confirms the result.
+
+INSTRUCTION is rendered from the routing config (see config/loader.py)
+and sent as the agent's static_instruction, cached model-side via the
+App's context cache config. It only changes when the config file is
+reloaded, and is then re-rendered once before the next turn.
+Per-request content (the local pre-classification) is appended to the
+request contents instead, so it never invalidates the cached prefix.
+
+Only what building root_agent needs is imported eagerly; the classifier
+(and NumPy) load on the first pre-classification, and notion_client on
+the first Notion call. The instruction comes from the startup snapshot
+when one is configured (see snapshot.py).
+
+Tasks routed before are answered from the classification memo (see
+memo.py) without calling the model at all. CAPTURE_MODEL_CASCADE can
+add cheaper stages in front of the model: the local classifier, and
+smaller models that hand a turn to the next one when unsure (see
+cascade.py).
+
+Tool, Notion, Sheets, LLM and agent run latency are recorded through
+OpenTelemetry (see telemetry.py); TASK_CAPTURE_METRICS_PORT serves them
+in Prometheus format at /metrics.
 """
 
+import os
+import re
+
 from google.adk.agents import Agent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.apps import App
+from google.adk.models import LlmRequest
+from google.genai import types
 
-from task_capture_agent.tools.notion import (
-    create_master_record,
-    create_topic_entry,
-    update_master_record,
-)
-from task_capture_agent.tools.fallback import log_fallback
-from task_capture_agent.config.categories import CATEGORIES, CLASSIFICATION_RULES, CONFIDENCE_THRESHOLD
+# Async variants keep Notion and Sheets I/O off the runner's event loop.
+from task_capture_agent.tools.aio import log_fallback
+from task_capture_agent.tools.capture import capture_batch, capture_task
+from task_capture_agent.tools.replay import replay_fallback
+from task_capture_agent.config.loader import RoutingConfig, get_config
+from task_capture_agent.snapshot import load_snapshot
+from task_capture_agent import cascade, telemetry
+
+# Threshold of the local cascade stage (None if disabled) and the models, cheapest first.
+LOCAL_THRESHOLD, CASCADE_MODELS = cascade.parse_cascade()
+
+# Details the local stage can't extract into topic fields (a place,
+# company, contact, class or amount): capitalized words after the first,
+# and numbers. Tasks that mention them are left to the model.
+_HAS_DETAILS = re.compile(r"(?<!^)\b[A-Z]|\d")
 
 
 def _build_category_table() -> str:
-    """Build a markdown table of categories from config."""
-    lines = ["| Category | What belongs here | Examples |",
-             "|----------|------------------|----------|"]
-    for name, info in CATEGORIES.items():
-        examples = ", ".join(f'"{e}"' for e in info["examples"])
-        lines.append(f"| **{name}** | {info['description']} | {examples} |")
-    return "\n".join(lines)
+    """The markdown table of categories, precompiled with the config."""
+    return get_config().category_table
 
 
-INSTRUCTION = f"""You are a task capture assistant. Your job is to receive a task or to-do from the user, classify it by topic, route it to the correct Notion database, and confirm.
+def build_instruction(config: RoutingConfig) -> str:
+    """Render the agent instruction from a routing config's precompiled tables."""
+    return f"""You are a task capture assistant. Your job is to receive a task or to-do from the user, classify it by topic, route it to the correct Notion database, and confirm.
 
 Be conversational and low-friction. The user wants to capture a thought before it disappears — don't slow them down with unnecessary questions.
 
@@ -37,45 +72,30 @@ Follow these steps in exact order for every task:
 Receive the user's task. If it's clear, proceed immediately. Do NOT ask follow-up questions unless the input is genuinely ambiguous.
 Optionally note if the user mentions priority (High / Medium / Low) or extra context.
 
-### Step 2: Create Master Record
-Call the `create_master_record` tool with the raw task text and priority.
-This creates an audit trail entry before classification — a safety net so no task is lost.
-Save the returned page_id for Step 5.
+### Step 2: Classify
+If a "Local pre-classification" note follows the user's message, use that category with High confidence and skip the rest of this step.
 
-### Step 3: Classify
-Evaluate the raw input against these categories. Choose the single best fit.
+Otherwise, evaluate the raw input against these categories. Choose the single best fit.
 
-{_build_category_table()}
+{config.category_table}
 
 **Classification rules:**
-{CLASSIFICATION_RULES}
+{config.classification_rules}
 
 Assign a confidence level:
-- **High** (>= {CONFIDENCE_THRESHOLD}): the task clearly belongs to one category
+- **High** (>= {config.confidence_threshold}): the task clearly belongs to one category
 - **Medium**: reasonable fit but could go either way
-- **Low** (< {CONFIDENCE_THRESHOLD}): genuinely ambiguous — ask the user OR route to Needs Sorting
-
-### Step 4: Route
-Call the `create_topic_entry` tool with the classified category, task title, priority, and any domain-specific fields you can extract from the input:
-- Shopping / Errands: location, cost_estimate
-- Technical / Dev: project, repo
-- Class / Study: class_name, topic
-- Content / Writing: platform
-- Business / Sales: company, contact
-- Personal: area
-- Workflow / Process: workflow, type
-- Social / Community: event_or_group, location
-
-For "Needs Sorting": include suggested_category (your best guess) and reason (why you're unsure).
-
-### Step 5: Link
-Call the `update_master_record` tool to update the master record:
-- Set status to "Routed" (or "Needs Sorting" for ambiguous tasks)
-- Set the category
-- Set topic_link to the URL from Step 4
-- Set confidence to "High", "Medium", or "Low"
-
-### Step 6: Confirm
+- **Low** (< {config.confidence_threshold}): genuinely ambiguous — ask the user OR route to Needs Sorting
+
+### Step 3: Capture
+Call the `capture_task` tool ONCE with the task title, category, confidence, priority, and, in `extra_fields`, any domain-specific fields you can extract from the input:
+{config.field_list}
+
+For "Needs Sorting": include suggested_category (your best guess) and reason (why you're unsure) in `extra_fields`.
+
+The tool creates the master audit record, routes the task to its topic database, and links the two in a single call. If Notion fails it writes the task to the fallback log itself and returns status "Fallback".
+
+### Step 4: Confirm
 Respond briefly — the user is working, not doing admin.
 
 **Routed successfully:**
@@ -87,32 +107,214 @@ Respond briefly — the user is working, not doing admin.
 **Needs Sorting:**
 > Captured "[task summary]" but couldn't classify confidently — added to Needs Sorting.
 
-**Partial failure (Notion error):**
-If any Notion call fails, call the `log_fallback` tool to ensure the task isn't lost, then tell the user:
+**Partial failure (status "Fallback"):**
 > Captured "[task summary]" to the fallback log — Notion had an issue. Nothing is lost.
 
+If a tool call errors outright, call the `log_fallback` tool so the task isn't lost, then confirm as above.
+
 Keep confirmations to one or two sentences. Always include the category name.
 
 ## Multiple Tasks
-If the user provides multiple tasks in one message, process each one through the full pipeline (Steps 1-6) sequentially. Confirm all at the end in a summary.
+If the user provides multiple tasks in one message, do NOT call `capture_task` for each one. Instead:
+1. Classify every task (Step 2), extracting priority and any domain-specific fields.
+2. Call the `capture_batch` tool ONCE with all of them. It captures them concurrently and writes any failures to the fallback log itself.
+3. Confirm all at the end in a summary, using each result's status ("Routed", "Needs Sorting", or "Fallback").
+
+## Replaying the Fallback Log
+If the user asks to retry or recover tasks that went to the fallback log, call the `replay_fallback` tool and report how many were replayed and how many failed.
 
 ## Reviewing Tasks
 If the user asks to see their tasks or check what's been captured, let them know this agent is for capture only — they can check their Notion databases directly.
 """
 
+
+def _startup_instruction(config: RoutingConfig) -> str:
+    """The snapshot's instruction if it was built from config, else a fresh render."""
+    snapshot = load_snapshot()
+    if snapshot.get("instruction") and snapshot.get("config_version") == config.version:
+        return snapshot["instruction"]
+    return build_instruction(config)
+
+
+_config = get_config()
+INSTRUCTION = _startup_instruction(_config)
+_instruction_version = _config.version
+
+
+def _user_text(callback_context: CallbackContext) -> str:
+    """Return the text of the user message that started this turn."""
+    content = callback_context.user_content
+    if not content or not content.parts:
+        return ""
+    return "".join(part.text or "" for part in content.parts).strip()
+
+
+def _awaits_first_reply(llm_request: LlmRequest) -> bool:
+    """Whether the request ends with the user's message, i.e. no tool has run this turn."""
+    if not llm_request.contents:
+        return False
+    last = llm_request.contents[-1]
+    return last.role == "user" and not any(
+        part.function_response for part in last.parts or []
+    )
+
+
+def _preclassify(callback_context: CallbackContext, llm_request: LlmRequest):
+    """Attach a local classification so the model can skip Step 2.
+
+    Only single-line messages are pre-classified — multi-task messages
+    still go through the model — and only on the turn's first model
+    call. Later calls follow a tool result, where a new user note would
+    read as another request. Returns None so the model call proceeds.
+    """
+    text = _user_text(callback_context)
+    if not text or "\n" in text or not _awaits_first_reply(llm_request):
+        return None
+    from task_capture_agent.classifier import classify
+
+    prediction = classify(text)
+    if prediction["confident"]:
+        # Directly after the user's message, and kept out of the system
+        # instruction so the cached prefix stays intact.
+        llm_request.contents.append(types.Content(role="user", parts=[types.Part(
+            text=f"Local pre-classification: \"{prediction['category']}\" "
+                 f"(confidence {prediction['confidence']:.2f}).",
+        )]))
+    return None
+
+
+def _refresh_instruction(callback_context: CallbackContext):
+    """Re-render the instruction once after the routing config is reloaded.
+
+    Turns between reloads reuse the rendered instruction, so the cached
+    prefix only changes when the config does. Returns None so the turn
+    proceeds.
+    """
+    global INSTRUCTION, _instruction_version
+    config = get_config()
+    if config.version != _instruction_version:
+        INSTRUCTION = build_instruction(config)
+        root_agent.static_instruction = INSTRUCTION
+        _instruction_version = config.version
+    return None
+
+
+async def _route_from_memo(callback_context: CallbackContext):
+    """Capture a recurring task from the memo, skipping the model entirely.
+
+    The message is reduced to the task title it names, the key the memo
+    is written under; messages that aren't a single bare task are not
+    looked up. On a hit the task is captured with its remembered
+    classification and the confirmation is returned as the agent's
+    reply; on a miss returns None so the turn proceeds normally.
+    """
+    from task_capture_agent import memo
+
+    title = memo.task_title(_user_text(callback_context))
+    if title is None:
+        return None
+    entry = memo.get_memo().get(title)
+    if entry is None:
+        return None
+    return await _capture_and_confirm(
+        callback_context, entry["title"], entry["category"], entry["confidence"],
+        entry["priority"], entry["fields"],
+    )
+
+
+async def _route_locally(callback_context: CallbackContext):
+    """Cascade stage "local": capture a confidently classified task without a model.
+
+    Only messages that are a single bare task (see memo.bare_task) with
+    no priority cue or topic-field details are tried, and they are
+    captured under the same title the memo path derives, with Medium
+    priority and no extra fields. Returns None (the turn goes to the
+    model stages) when the stage is disabled, the message has more in
+    it than that, or the classifier is below its threshold.
+    """
+    if LOCAL_THRESHOLD is None:
+        return None
+    from task_capture_agent import memo
+
+    title = memo.bare_task(_user_text(callback_context))
+    if title is None or _HAS_DETAILS.search(title):
+        return None
+    from task_capture_agent.classifier import classify
+
+    prediction = classify(title)
+    if prediction["confidence"] < LOCAL_THRESHOLD:
+        telemetry.record_cascade_stage(cascade.LOCAL_STAGE, "low_confidence")
+        return None
+    telemetry.record_cascade_stage(cascade.LOCAL_STAGE, "answered")
+    return await _capture_and_confirm(
+        callback_context, title, prediction["category"], "High", "Medium", {}
+    )
+
+
+async def _capture_and_confirm(
+    callback_context: CallbackContext,
+    title: str,
+    category: str,
+    confidence: str,
+    priority: str,
+    fields: dict,
+) -> types.Content:
+    """Capture a task classified without the model and reply as Step 4 would.
+
+    Returning content ends the invocation before after_agent_callback
+    runs, so the run duration is recorded here instead.
+    """
+    try:
+        result = await capture_task(
+            title, category, confidence, priority,
+            extra_fields=fields, tool_context=callback_context,
+        )
+    finally:
+        telemetry.after_agent(callback_context)
+    if result["status"] == "Fallback":
+        reply = f'Captured "{title}" to the fallback log — Notion had an issue. Nothing is lost.'
+    else:
+        reply = f'Logged to {category}: "{title}"'
+    return types.Content(role="model", parts=[types.Part(text=reply)])
+
+
 root_agent = Agent(
     name="task_capture_agent",
-    model="gemini-2.5-flash",
-    instruction=INSTRUCTION,
+    model=(
+        CASCADE_MODELS[0] if len(CASCADE_MODELS) == 1
+        else cascade.CascadeLlm.from_names(CASCADE_MODELS)
+    ),
+    static_instruction=INSTRUCTION,
     description=(
         "Captures tasks and to-dos, classifies them by topic "
         "(Shopping, Technical, Study, Content, Business, Personal, "
         "Workflow, Social), and routes them to the correct Notion database."
     ),
+    # Timing starts after _preclassify so LLM latency is the model's own.
+    before_model_callback=[_preclassify, telemetry.before_model],
+    after_model_callback=telemetry.after_model,
+    on_model_error_callback=telemetry.on_model_error,
+    # telemetry.before_agent goes first so turns answered without the model are timed too.
+    before_agent_callback=[
+        telemetry.before_agent, _refresh_instruction, _route_from_memo, _route_locally,
+    ],
+    after_agent_callback=telemetry.after_agent,
     tools=[
-        create_master_record,
-        create_topic_entry,
-        update_master_record,
+        capture_task,
+        capture_batch,
         log_fallback,
+        replay_fallback,
     ],
 )
+
+app = App(
+    name="task_capture_agent",
+    root_agent=root_agent,
+    context_cache_config=ContextCacheConfig(
+        ttl_seconds=int(os.environ.get("PROMPT_CACHE_TTL_SECONDS", 1800)),
+        cache_intervals=int(os.environ.get("PROMPT_CACHE_INTERVALS", 10)),
+    ),
+)
+
+if os.environ.get("TASK_CAPTURE_METRICS_PORT"):
+    telemetry.configure_metrics(port=int(os.environ["TASK_CAPTURE_METRICS_PORT"]))
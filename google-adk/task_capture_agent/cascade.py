@@ -0,0 +1,142 @@
+"""Model cascade: answer each turn with the cheapest stage that can.
+
+Most captures are obvious, and a smaller model (or no model) classifies
+them as well as the full one. CAPTURE_MODEL_CASCADE lists the stages to
+try in order, cheapest first, e.g.
+"local,gemini-2.5-flash-lite,gemini-2.5-flash":
+
+    - local[:threshold]: the local pre-classifier (classifier.py). The
+      agent captures a single-line task it scores at or above threshold
+      (default: the config's confidence threshold) without calling a
+      model at all.
+      Must come first.
+    - Any other entry is a model name. Every model but the last answers
+      provisionally: its reply is kept if it is sure, otherwise the next
+      model gets the same request.
+
+A model's reply escalates when it:
+    - classifies a task below High confidence (under the confidence
+      threshold) or as Needs Sorting,
+    - answers the user's message without calling a tool, which is how
+      the classification rules' ambiguity cases ask a clarifying
+      question,
+    - or fails.
+A reply to a tool result (the confirmation) is always kept.
+
+The default, "gemini-2.5-flash", is the single-model agent.
+"""
+
+import os
+from typing import AsyncGenerator
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+from task_capture_agent import telemetry
+from task_capture_agent.config.loader import get_config
+
+DEFAULT_CASCADE = "gemini-2.5-flash"
+LOCAL_STAGE = "local"
+
+# Tools whose arguments carry a classification to check.
+_CAPTURE_TOOLS = ("capture_task", "capture_batch")
+
+
+def parse_cascade(spec: str | None = None) -> tuple[float | None, list[str]]:
+    """Split a cascade spec (default CAPTURE_MODEL_CASCADE) into its stages.
+
+    Returns:
+        The local stage's threshold (None without a local stage) and the
+        model names, cheapest first. ValueError if there is no model or
+        the local stage isn't first.
+    """
+    spec = spec or os.environ.get("CAPTURE_MODEL_CASCADE") or DEFAULT_CASCADE
+    stages = [stage.strip() for stage in spec.split(",") if stage.strip()]
+    threshold = None
+    if stages and stages[0].split(":")[0] == LOCAL_STAGE:
+        _, _, value = stages.pop(0).partition(":")
+        threshold = float(value) if value else get_config().confidence_threshold
+    if not stages:
+        raise ValueError(f"Model cascade {spec!r} has no model stage")
+    if any(stage.split(":")[0] == LOCAL_STAGE for stage in stages):
+        raise ValueError(f"The local stage must come first in {spec!r}")
+    return threshold, stages
+
+
+def _unsure(call: types.FunctionCall) -> bool:
+    """Whether a capture call classifies any task below High confidence."""
+    args = call.args or {}
+    tasks = args.get("tasks") if call.name == "capture_batch" else [args]
+    if not isinstance(tasks, list):
+        return True
+    return any(
+        not isinstance(task, dict)
+        or task.get("category") == "Needs Sorting"
+        or (task.get("confidence") or "High") != "High"
+        for task in tasks
+    )
+
+
+def escalation(llm_request: LlmRequest, response: LlmResponse | None) -> str | None:
+    """Why a provisional reply should go to the next model, or None to keep it."""
+    if response is None or response.error_code or not response.content:
+        return "error"
+    calls = [part.function_call for part in response.content.parts or [] if part.function_call]
+    if calls:
+        captures = [call for call in calls if call.name in _CAPTURE_TOOLS]
+        return "low_confidence" if any(_unsure(call) for call in captures) else None
+    return None if _after_tool_result(llm_request) else "no_tool_call"
+
+
+def _after_tool_result(llm_request: LlmRequest) -> bool:
+    """Whether the request ends with a tool result, i.e. the model is confirming."""
+    if not llm_request.contents:
+        return False
+    return any(part.function_response for part in llm_request.contents[-1].parts or [])
+
+
+class CascadeLlm(BaseLlm):
+    """Tries each stage model in turn, keeping the first reply that is sure.
+
+    model is the last stage's name, the one that answers when every
+    cheaper stage escalates.
+    """
+
+    stages: list[BaseLlm]
+
+    @classmethod
+    def from_names(cls, names: list[str]) -> "CascadeLlm":
+        from google.adk.models.registry import LLMRegistry
+
+        return cls(model=names[-1], stages=[LLMRegistry.new_llm(name) for name in names])
+
+    @property
+    def capabilities(self):
+        return self.stages[-1].capabilities
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        for stage in self.stages[:-1]:
+            # A provisional stage gets its own copy: context caching may
+            # rewrite the request, and the next stage needs the original.
+            request = llm_request.model_copy(update={
+                "model": stage.model,
+                "contents": [content.model_copy(deep=True) for content in llm_request.contents],
+                "config": llm_request.config.model_copy(deep=True),
+            })
+            try:
+                responses = [response async for response in stage.generate_content_async(request)]
+            except Exception:
+                responses = []
+            reason = escalation(llm_request, responses[-1] if responses else None)
+            telemetry.record_cascade_stage(stage.model, reason or "answered")
+            if reason is None:
+                for response in responses:
+                    yield response
+                return
+        final = self.stages[-1]
+        telemetry.record_cascade_stage(final.model, "answered")
+        llm_request.model = final.model
+        async for response in final.generate_content_async(llm_request, stream):
+            yield response
@@ -0,0 +1,284 @@
+"""Local pre-classifier for task categories.
+
+Obvious tasks like "Get groceries" don't need a model round trip to be
+classified. This builds hashed character n-gram vectors from each
+category's description and examples in the routing config and scores
+new tasks by cosine similarity, entirely in-process with NumPy. The
+shared classifier is rebuilt when the config is reloaded.
+
+Run as a module to print an accuracy/latency report for a labelled
+JSONL file (one {"title": ..., "category": ...} object per line), or
+with --fit to refit the calibration constants on one:
+
+    python -m task_capture_agent.classifier tests/fixtures/heldout_tasks.jsonl
+    python -m task_capture_agent.classifier --fit tests/fixtures/calibration_tasks.jsonl
+
+The calibration split and the held-out split share no tasks with each
+other or with the config's category examples (which are the
+prototypes), so the report measures tasks the classifier hasn't seen.
+"""
+
+import json
+import math
+import re
+import sys
+import time
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from task_capture_agent.config.loader import RoutingConfig, get_config
+
+HASH_DIM = 2 ** 14
+NGRAM_SIZES = (3, 4, 5)
+
+# Logistic calibration of the top-1 vs top-2 cosine margin into a
+# confidence. Fitted with fit_calibration() on
+# tests/fixtures/calibration_tasks.jsonl, which puts CONFIDENCE_THRESHOLD
+# (0.8) at a margin of ~0.3: CALIBRATION_MARGIN_BUFFER above every
+# misclassification in that split.
+CALIBRATION_SLOPE = 13.2
+CALIBRATION_INTERCEPT = -2.55
+CALIBRATION_MARGIN_BUFFER = 0.1
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def _features(text: str) -> list[str]:
+    """Word unigrams plus character n-grams within word boundaries."""
+    features = []
+    for word in _NON_ALNUM.sub(" ", text.lower()).split():
+        features.append("w:" + word)
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return features
+
+
+def _vectorize(text: str, dim: int = HASH_DIM) -> np.ndarray:
+    """Hash features into a sublinear, L2-normalized count vector.
+
+    crc32 is used rather than hash() so vectors are stable across
+    processes regardless of PYTHONHASHSEED.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        vector[zlib.crc32(feature.encode()) % dim] += 1.0
+    np.sqrt(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _calibrate(margin: float) -> float:
+    return 1.0 / (1.0 + math.exp(-(CALIBRATION_SLOPE * margin + CALIBRATION_INTERCEPT)))
+
+
+class LocalClassifier:
+    """Nearest-prototype classifier over the configured categories.
+
+    Each category contributes one prototype vector per example plus one
+    for its description. A task's score for a category is its best
+    cosine similarity against that category's prototypes.
+    """
+
+    def __init__(self, categories: dict | None = None, threshold: float | None = None):
+        if categories is None or threshold is None:
+            config = get_config()
+            categories = config.categories if categories is None else categories
+            threshold = config.confidence_threshold if threshold is None else threshold
+        self.threshold = threshold
+        self.category_names = list(categories)
+        texts, labels = [], []
+        for index, info in enumerate(categories.values()):
+            for text in [info["description"], *info["examples"]]:
+                texts.append(text)
+                labels.append(index)
+        self._prototypes = np.stack([_vectorize(t) for t in texts])
+        self._labels = np.array(labels)
+
+    def export(self) -> dict:
+        """Sparse, JSON-serializable form of the prototypes, for snapshots."""
+        rows = []
+        for prototype in self._prototypes:
+            (indices,) = np.nonzero(prototype)
+            rows.append([indices.tolist(), prototype[indices].tolist()])
+        return {
+            "category_names": self.category_names,
+            "labels": self._labels.tolist(),
+            "prototypes": rows,
+        }
+
+    @classmethod
+    def from_export(cls, data: dict, threshold: float | None = None) -> "LocalClassifier":
+        """Rebuild a classifier from export() output without re-vectorizing."""
+        classifier = cls.__new__(cls)
+        classifier.threshold = threshold if threshold is not None else get_config().confidence_threshold
+        classifier.category_names = data["category_names"]
+        classifier._labels = np.array(data["labels"])
+        classifier._prototypes = np.zeros((len(data["prototypes"]), HASH_DIM), dtype=np.float32)
+        for row, (indices, values) in zip(classifier._prototypes, data["prototypes"]):
+            row[indices] = values
+        return classifier
+
+    def scores(self, text: str) -> np.ndarray:
+        """Best cosine similarity per category, in category order."""
+        similarities = self._prototypes @ _vectorize(text)
+        per_category = np.full(len(self.category_names), -1.0, dtype=np.float32)
+        np.maximum.at(per_category, self._labels, similarities)
+        return per_category
+
+    def classify(self, text: str) -> dict:
+        """Classify a task and report whether the result can skip the LLM.
+
+        Returns:
+            A dict with category, confidence (0-1, calibrated), confident
+            (confidence >= threshold), and runner_up category.
+        """
+        return self._prediction(self.scores(text))
+
+    def classify_many(self, texts: list[str]) -> list[dict]:
+        """Classify a batch of tasks with a single matrix product.
+
+        Same results as classify() per text, for bulk imports.
+        """
+        if not texts:
+            return []
+        similarities = np.stack([_vectorize(t) for t in texts]) @ self._prototypes.T
+        scores = np.stack([
+            similarities[:, self._labels == index].max(axis=1)
+            for index in range(len(self.category_names))
+        ], axis=1)
+        return [self._prediction(row) for row in scores]
+
+    def margin(self, text: str) -> tuple[str, float]:
+        """Top category and its cosine margin over the runner-up, uncalibrated."""
+        scores = self.scores(text)
+        first, second = np.argsort(scores)[::-1][:2]
+        return self.category_names[first], float(scores[first] - scores[second])
+
+    def _prediction(self, scores: np.ndarray) -> dict:
+        first, second = np.argsort(scores)[::-1][:2]
+        confidence = _calibrate(float(scores[first] - scores[second]))
+        return {
+            "category": self.category_names[first],
+            "confidence": round(confidence, 3),
+            "confident": confidence >= self.threshold,
+            "runner_up": self.category_names[second],
+        }
+
+
+def get_classifier() -> LocalClassifier:
+    """Return the process-wide classifier for the current routing config.
+
+    Built on first use and again whenever the config is reloaded.
+    """
+    return _classifier_for(get_config())
+
+
+@lru_cache(maxsize=1)
+def _classifier_for(config: RoutingConfig) -> LocalClassifier:
+    """Prototypes come from the startup snapshot when it was built from config."""
+    from task_capture_agent.snapshot import load_snapshot
+
+    snapshot = load_snapshot()
+    exported = snapshot.get("classifier")
+    if exported and snapshot.get("config_version") == config.version:
+        return LocalClassifier.from_export(exported, config.confidence_threshold)
+    return LocalClassifier(config.categories, config.confidence_threshold)
+
+
+def classify(text: str) -> dict:
+    """Classify a task with the shared local classifier."""
+    return get_classifier().classify(text)
+
+
+def _labelled(path: str):
+    """Yield the {"title", "category"} rows of a labelled JSONL file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def fit_calibration(path: str, classifier: LocalClassifier | None = None) -> tuple[float, float]:
+    """Fit CALIBRATION_SLOPE and CALIBRATION_INTERCEPT on a labelled split.
+
+    The slope is a logistic regression of "top category is correct" on
+    the margin. The intercept then puts the threshold
+    CALIBRATION_MARGIN_BUFFER above the widest margin of any
+    misclassification, so no wrong answer in the split is confident:
+    a confident prediction skips the model, a wrong one files the task
+    in the wrong database.
+
+    Returns:
+        (slope, intercept), rounded as the constants are written.
+    """
+    classifier = classifier or get_classifier()
+    margins, hits = [], []
+    for row in _labelled(path):
+        category, margin = classifier.margin(row["title"])
+        margins.append(margin)
+        hits.append(category == row["category"])
+    x = np.array(margins)
+    y = np.array(hits, dtype=float)
+    # Newton's method on the log-likelihood, with a small ridge for stability.
+    features = np.stack([x, np.ones_like(x)], axis=1)
+    weights = np.zeros(2)
+    for _ in range(50):
+        p = 1.0 / (1.0 + np.exp(-features @ weights))
+        hessian = features.T @ (features * (p * (1 - p))[:, None]) + 1e-6 * np.eye(2)
+        weights += np.linalg.solve(hessian, features.T @ (y - p))
+    slope = round(float(weights[0]), 1)
+    wrong = x[y == 0]
+    cutoff = (float(wrong.max()) if wrong.size else 0.0) + CALIBRATION_MARGIN_BUFFER
+    logit = math.log(classifier.threshold / (1 - classifier.threshold))
+    return slope, round(logit - slope * cutoff, 2)
+
+
+def evaluate(path: str, classifier: LocalClassifier | None = None) -> dict:
+    """Score the classifier against a labelled JSONL fixture file.
+
+    Returns:
+        A dict with overall accuracy, coverage and accuracy of confident
+        predictions (the ones that would skip the LLM), and per-task
+        latency percentiles in milliseconds.
+    """
+    classifier = classifier or get_classifier()
+    correct = confident = confident_correct = 0
+    latencies = []
+    for row in _labelled(path):
+        start = time.perf_counter()
+        prediction = classifier.classify(row["title"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hit = prediction["category"] == row["category"]
+        correct += hit
+        if prediction["confident"]:
+            confident += 1
+            confident_correct += hit
+
+    total = len(latencies)
+    return {
+        "total": total,
+        "accuracy": correct / total if total else 0.0,
+        "confident_coverage": confident / total if total else 0.0,
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+        "latency_ms_p50": float(np.percentile(latencies, 50)) if total else 0.0,
+        "latency_ms_p99": float(np.percentile(latencies, 99)) if total else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--fit":
+        slope, intercept = fit_calibration(sys.argv[2])
+        print(f"CALIBRATION_SLOPE = {slope}")
+        print(f"CALIBRATION_INTERCEPT = {intercept}")
+        sys.exit()
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m task_capture_agent.classifier [--fit] LABELLED.jsonl")
+    report = evaluate(sys.argv[1])
+    print(f"tasks:               {report['total']}")
+    print(f"accuracy:            {report['accuracy']:.1%}")
+    print(f"confident coverage:  {report['confident_coverage']:.1%}")
+    print(f"confident accuracy:  {report['confident_accuracy']:.1%}")
+    print(f"latency p50 / p99:   {report['latency_ms_p50']:.3f} / {report['latency_ms_p99']:.3f} ms")
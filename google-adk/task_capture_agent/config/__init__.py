@@ -1,2 +1,2 @@
 from .categories import CATEGORIES, CONFIDENCE_THRESHOLD, CLASSIFICATION_RULES
-from .databases import MASTER_DB_ID, TOPIC_DATABASES, NEEDS_SORTING_DB_ID
+from .databases import MASTER_DB_ID, TOPIC_DATABASES, NEEDS_SORTING_DB_ID, FIELD_MAP
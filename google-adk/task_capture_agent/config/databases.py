@@ -72,3 +72,22 @@ TOPIC_DATABASES = {
         "defaults": {"Status": "Unsorted"},
     },
 }
+
+# Snake_case keys the agent passes as extra fields → Notion property names.
+FIELD_MAP = {
+    "location": "Location",
+    "cost_estimate": "Cost Estimate",
+    "project": "Project",
+    "repo": "Repo",
+    "class_name": "Class",
+    "topic": "Topic",
+    "platform": "Platform",
+    "company": "Company",
+    "contact": "Contact",
+    "area": "Area",
+    "workflow": "Workflow",
+    "type": "Type",
+    "event_or_group": "Event / Group",
+    "suggested_category": "Suggested Category",
+    "reason": "Reason",
+}
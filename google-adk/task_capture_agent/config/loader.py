@@ -0,0 +1,319 @@
+"""Hot-reloadable routing config, compiled into immutable lookup tables.
+
+The categories, topic databases and extra-field names in categories.py
+and databases.py are the built-in config. TASK_CAPTURE_CONFIG can point
+at a JSON file with the same data instead (export the built-in one as a
+starting point). Either way it is validated and compiled once into a
+RoutingConfig:
+
+    - routes: category → TopicRoute, which builds a topic entry's
+      fields from precomputed defaults and the snake_case → Notion
+      field map,
+    - the category table and per-category field list rendered for the
+      agent instruction,
+    - read-only views of everything else.
+
+get_config() checks the file's modification time at most every
+TASK_CAPTURE_CONFIG_CHECK_SECONDS and swaps in a newly compiled config
+in one assignment, so a call sees either the old tables or the new
+ones, never a mix. An edit that fails validation is ignored and the
+previous config stays in place; an invalid file at startup raises.
+
+Usage:
+    python -m task_capture_agent.config.loader --export config.json
+    python -m task_capture_agent.config.loader --check config.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from task_capture_agent.config import categories, databases
+
+DEFAULT_CHECK_SECONDS = 2.0
+NEEDS_SORTING = "Needs Sorting"
+BUILT_IN = "built-in"
+
+
+class ConfigError(ValueError):
+    """The routing config is malformed or inconsistent."""
+
+
+@dataclass(frozen=True, eq=False)
+class TopicRoute:
+    """Where one category's tasks go and how their fields are built."""
+
+    category: str
+    data_source_id: str
+    name: str
+    defaults: Mapping[str, str]
+    field_map: Mapping[str, str]
+
+    def fields(self, title: str, priority: str, notes: str, extra_fields: dict) -> dict:
+        """Notion field values for a topic entry, before schema encoding."""
+        fields = {**self.defaults, "Task": title}
+        if self.category != NEEDS_SORTING:
+            fields["Priority"] = priority
+        if notes:
+            fields["Notes"] = notes
+        for key, value in extra_fields.items():
+            notion_key = self.field_map.get(key)
+            if notion_key and value:
+                fields[notion_key] = value
+        return fields
+
+
+@dataclass(frozen=True, eq=False)
+class RoutingConfig:
+    """A validated config and the lookup tables compiled from it."""
+
+    version: str
+    source: str
+    master_db_id: str
+    confidence_threshold: float
+    classification_rules: str
+    categories: Mapping[str, Mapping]
+    topic_databases: Mapping[str, Mapping]
+    field_map: Mapping[str, str]
+    routes: Mapping[str, TopicRoute]
+    category_table: str
+    field_list: str
+
+    def route(self, category: str) -> TopicRoute:
+        """The category's route, or Needs Sorting for unknown categories."""
+        return self.routes.get(category) or self.routes[NEEDS_SORTING]
+
+    def data_source_ids(self) -> list[str]:
+        """Every data source the tools write to."""
+        return list(dict.fromkeys(
+            [self.master_db_id] + [route.data_source_id for route in self.routes.values()]
+        ))
+
+
+def default_config_data() -> dict:
+    """The built-in config from categories.py and databases.py, as file data."""
+    return {
+        "master_db_id": databases.MASTER_DB_ID,
+        "confidence_threshold": categories.CONFIDENCE_THRESHOLD,
+        "classification_rules": categories.CLASSIFICATION_RULES,
+        "categories": categories.CATEGORIES,
+        "topic_databases": databases.TOPIC_DATABASES,
+        "field_map": databases.FIELD_MAP,
+    }
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _validate(data) -> list[str]:
+    """Every problem with the config data, or [] if it is usable."""
+    if not isinstance(data, dict):
+        return ["config must be a JSON object"]
+    problems = []
+    if not isinstance(data.get("master_db_id"), str) or not data["master_db_id"]:
+        problems.append("master_db_id must be a non-empty string")
+    threshold = data.get("confidence_threshold")
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 < threshold <= 1:
+        problems.append("confidence_threshold must be a number in (0, 1]")
+    if not isinstance(data.get("classification_rules"), str):
+        problems.append("classification_rules must be a string")
+    field_map = data.get("field_map")
+    if not isinstance(field_map, dict) or not all(
+        isinstance(key, str) and isinstance(value, str) for key, value in field_map.items()
+    ):
+        problems.append("field_map must map snake_case names to Notion property names")
+    category_data = data.get("categories")
+    database_data = data.get("topic_databases")
+    if not isinstance(category_data, dict) or not category_data:
+        problems.append("categories must be a non-empty object")
+        category_data = {}
+    if not isinstance(database_data, dict):
+        problems.append("topic_databases must be an object")
+        database_data = {}
+    elif NEEDS_SORTING not in database_data:
+        problems.append(f'topic_databases needs a "{NEEDS_SORTING}" database')
+    for name, info in category_data.items():
+        if not isinstance(info, dict) or not isinstance(info.get("description"), str) \
+                or not isinstance(info.get("examples"), list) \
+                or not all(isinstance(example, str) for example in info["examples"]):
+            problems.append(f"category {name!r} needs a description and a list of examples")
+        if name not in database_data:
+            problems.append(f"category {name!r} has no topic database")
+    for name, db in database_data.items():
+        if not isinstance(db, dict) or not isinstance(db.get("data_source_id"), str) \
+                or not db["data_source_id"] or not isinstance(db.get("name"), str):
+            problems.append(f"topic database {name!r} needs a data_source_id and a name")
+            continue
+        if not isinstance(db.get("defaults", {}), dict):
+            problems.append(f"topic database {name!r} defaults must be an object")
+        for key in ("required_fields", "optional_fields"):
+            if not isinstance(db.get(key, []), list):
+                problems.append(f"topic database {name!r} {key} must be a list")
+    return problems
+
+
+def _render_category_table(category_data: dict) -> str:
+    lines = ["| Category | What belongs here | Examples |",
+             "|----------|------------------|----------|"]
+    for name, info in category_data.items():
+        examples = ", ".join(f'"{e}"' for e in info["examples"])
+        lines.append(f"| **{name}** | {info['description']} | {examples} |")
+    return "\n".join(lines)
+
+
+def _render_field_list(category_data: dict, database_data: dict, field_map: dict) -> str:
+    """Each category's extra fields, as snake_case names the model can pass."""
+    lines = []
+    for name in category_data:
+        if name == NEEDS_SORTING:
+            continue
+        optional = database_data[name].get("optional_fields", [])
+        names = [key for notion in optional for key, value in field_map.items() if value == notion]
+        if names:
+            lines.append(f"- {name}: {', '.join(names)}")
+    return "\n".join(lines)
+
+
+def compile_config(data: dict, source: str = BUILT_IN) -> RoutingConfig:
+    """Validate config data and compile its lookup tables. ConfigError if invalid."""
+    problems = _validate(data)
+    if problems:
+        raise ConfigError(f"Invalid config ({source}): " + "; ".join(problems))
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    field_map = _freeze(data["field_map"])
+    routes = {
+        name: TopicRoute(
+            category=name,
+            data_source_id=db["data_source_id"],
+            name=db["name"],
+            defaults=_freeze(db.get("defaults", {})),
+            field_map=field_map,
+        )
+        for name, db in data["topic_databases"].items()
+    }
+    return RoutingConfig(
+        version=hashlib.sha256(canonical.encode()).hexdigest()[:12],
+        source=source,
+        master_db_id=data["master_db_id"],
+        confidence_threshold=float(data["confidence_threshold"]),
+        classification_rules=data["classification_rules"],
+        categories=_freeze(data["categories"]),
+        topic_databases=_freeze(data["topic_databases"]),
+        field_map=field_map,
+        routes=MappingProxyType(routes),
+        category_table=_render_category_table(data["categories"]),
+        field_list=_render_field_list(
+            data["categories"], data["topic_databases"], data["field_map"]
+        ),
+    )
+
+
+def load_config(path: str) -> RoutingConfig:
+    """Read, validate and compile a config file. ConfigError if invalid."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as error:
+        raise ConfigError(f"Can't read config {path}: {error}") from error
+    return compile_config(data, source=path)
+
+
+def config_path() -> str | None:
+    """The config file from TASK_CAPTURE_CONFIG, if set."""
+    return os.environ.get("TASK_CAPTURE_CONFIG") or None
+
+
+class ConfigWatcher:
+    """Holds the current RoutingConfig and reloads it when its file changes.
+
+    Settings are read from the environment:
+        TASK_CAPTURE_CONFIG: Config file (default: the built-in config).
+        TASK_CAPTURE_CONFIG_CHECK_SECONDS: How often the file's
+            modification time is checked (default 2).
+    """
+
+    def __init__(self, check_seconds: float | None = None):
+        self.check_seconds = check_seconds if check_seconds is not None else float(
+            os.environ.get("TASK_CAPTURE_CONFIG_CHECK_SECONDS", DEFAULT_CHECK_SECONDS)
+        )
+        self._lock = threading.Lock()
+        self._config: RoutingConfig | None = None
+        self._key: tuple | None = None
+        self._checked_at = 0.0
+        self.last_error: str | None = None
+
+    def get(self) -> RoutingConfig:
+        """The current config, reloaded first if the file has changed."""
+        config = self._config
+        if config is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return config
+        return self._refresh()
+
+    def _refresh(self) -> RoutingConfig:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            path = config_path()
+            try:
+                stat = os.stat(path) if path else None
+            except OSError:
+                stat = None
+            key = (path, stat.st_mtime_ns, stat.st_size) if stat else (path, None, None)
+            if self._config is not None and key == self._key:
+                return self._config
+            try:
+                config = load_config(path) if path else compile_config(default_config_data())
+            except ConfigError as error:
+                if self._config is None:
+                    raise
+                self.last_error = str(error)
+                self._key = key  # Don't re-read the same bad file on every check.
+                _record_reload("invalid")
+                return self._config
+            if self._config is not None:
+                _record_reload("reloaded" if config.version != self._config.version else "unchanged")
+            self._config, self._key, self.last_error = config, key, None
+            return config
+
+
+def _record_reload(outcome: str) -> None:
+    from task_capture_agent import telemetry
+
+    telemetry.record_config_reload(outcome)
+
+
+_watcher = ConfigWatcher()
+
+
+def get_config() -> RoutingConfig:
+    """Return the current routing config, hot-reloaded from TASK_CAPTURE_CONFIG."""
+    return _watcher.get()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--export", metavar="PATH", help="Write the built-in config to PATH")
+    group.add_argument("--check", metavar="PATH", help="Validate the config file at PATH")
+    args = parser.parse_args()
+    if args.export:
+        with open(args.export, "w") as f:
+            json.dump(default_config_data(), f, indent=2)
+        print(f"Wrote the built-in config to {args.export}")
+    else:
+        try:
+            checked = load_config(args.check)
+        except ConfigError as error:
+            parser.exit(1, f"{error}\n")
+        print(f"{args.check}: valid, version {checked.version}, "
+              f"{len(checked.categories)} categories, {len(checked.routes)} topic databases")
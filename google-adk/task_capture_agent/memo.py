@@ -0,0 +1,216 @@
+"""Persistent memo of how recurring tasks were classified.
+
+Many captures repeat word for word — "Pay electric bill", "Get
+groceries" — and each one costs a full LLM turn to classify. Once a
+task has been routed (its master record updated), the memo stores its
+normalized text → category, confidence, priority and topic fields. The
+agent checks the memo before the model runs, and on a hit captures the
+task directly with zero model tokens.
+
+Entries are keyed on the normalized task title only. The user's message
+is not remembered: in a clarification turn it is an answer such as
+"yes" or "Business", which would otherwise capture the same task again
+on every later "yes". Lookups use the same key space: task_title()
+reduces a message to the bare task it names ("Remind me to pay electric
+bill." → "pay electric bill"), and messages that aren't a single bare
+task (questions, lists, priority cues) aren't looked up at all. Only
+Routed captures are remembered, never Needs Sorting. The store is a small SQLite file with least-recently-used
+eviction above max_entries.
+
+Usage:
+    python -m task_capture_agent.memo [--clear]
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from task_capture_agent import telemetry
+from task_capture_agent.tools.idempotency import normalize
+
+DEFAULT_MAX_ENTRIES = 2000
+
+# Phrasing around a task that the model leaves out of its title.
+_LEAD_IN = re.compile(
+    r"^\s*(?:please\s+)?(?:(?:remind me to|don'?t forget to|i need to|i have to|"
+    r"need to|to-?do|task|add)\b[\s:-]*)?",
+    re.IGNORECASE,
+)
+# Messages that are more than one bare task, or carry what only the model extracts.
+_NOT_BARE = re.compile(
+    r"[\n;?]|,|\b(?:priority|urgent|asap|also|then)\b", re.IGNORECASE
+)
+
+
+def bare_task(message: str) -> str | None:
+    """The task a single bare-task message names, as a title, or None.
+
+    "Remind me to pay electric bill." → "Pay electric bill".
+    """
+    if _NOT_BARE.search(message):
+        return None
+    task = _LEAD_IN.sub("", message).strip().rstrip(".!").strip()
+    return task[:1].upper() + task[1:] if normalize(task) else None
+
+
+def task_title(message: str) -> str | None:
+    """bare_task() in memo key form."""
+    task = bare_task(message)
+    return normalize(task) if task else None
+
+
+def default_memo_path() -> str:
+    """CLASSIFICATION_MEMO_DB, or .classification_memo.sqlite next to the package."""
+    return os.environ.get("CLASSIFICATION_MEMO_DB") or os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), ".classification_memo.sqlite"
+    )
+
+
+class ClassificationMemo:
+    """Size-bounded LRU of classifications, stored in SQLite.
+
+    Settings are read from the environment unless passed explicitly:
+        CLASSIFICATION_MEMO_DB: Store file (default .classification_memo.sqlite).
+        CLASSIFICATION_MEMO_MAX_ENTRIES: LRU capacity (default 2000; 0 disables).
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int | None = None):
+        self.path = path or default_memo_path()
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.environ.get("CLASSIFICATION_MEMO_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.max_entries > 0:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, hits INTEGER NOT NULL DEFAULT 0, "
+                "last_used REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, text: str) -> dict | None:
+        """The remembered classification for text, or None."""
+        key = normalize(text)
+        if self.max_entries <= 0 or not key:
+            return None
+        with self._connect() as db:
+            row = db.execute(
+                "UPDATE memo SET hits = hits + 1, last_used = ? WHERE key = ? "
+                "RETURNING value",
+                (time.time(), key),
+            ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        telemetry.record_memo_lookup(row is not None)
+        return json.loads(row[0]) if row else None
+
+    def put(self, texts, entry: dict) -> None:
+        """Remember entry under each of texts, evicting the least recently used."""
+        keys = {normalize(text) for text in texts} - {""}
+        if self.max_entries <= 0 or not keys:
+            return
+        now, value = time.time(), json.dumps(entry, sort_keys=True)
+        with self._connect() as db:
+            db.executemany(
+                "INSERT INTO memo (key, value, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "last_used = excluded.last_used",
+                [(key, value, now) for key in keys],
+            )
+            db.execute(
+                "DELETE FROM memo WHERE key NOT IN "
+                "(SELECT key FROM memo ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def remember(
+        self,
+        title: str,
+        category: str,
+        confidence: str,
+        priority: str,
+        fields: dict | None = None,
+    ) -> None:
+        """Record a routed capture under its normalized title.
+
+        Best effort: a failed write never fails the capture that fed it.
+        """
+        try:
+            self.put((title,), {
+                "title": title,
+                "category": category,
+                "confidence": confidence,
+                "priority": priority,
+                "fields": fields or {},
+            })
+        except sqlite3.Error:
+            pass
+
+    def clear(self) -> None:
+        if self.max_entries > 0:
+            with self._connect() as db:
+                db.execute("DELETE FROM memo")
+
+    def stats(self) -> dict:
+        """Entries stored, lifetime hits, and hits/misses in this process."""
+        entries = lifetime_hits = 0
+        if self.max_entries > 0:
+            entries, lifetime_hits = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM memo"
+            ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "lifetime_hits": lifetime_hits,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_memo: ClassificationMemo | None = None
+_memo_lock = threading.Lock()
+
+
+def get_memo() -> ClassificationMemo:
+    """Return the process-wide classification memo, opened on first use."""
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = ClassificationMemo()
+        return _memo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clear", action="store_true", help="Forget every entry")
+    args = parser.parse_args()
+    memo = get_memo()
+    if args.clear:
+        memo.clear()
+    rows = memo._connect().execute(
+        "SELECT key, value, hits FROM memo ORDER BY hits DESC LIMIT 20"
+    ).fetchall() if memo.max_entries > 0 else []
+    print(json.dumps({
+        **memo.stats(),
+        "top": [{"text": key, "hits": hits, **json.loads(value)} for key, value, hits in rows],
+    }, indent=2))
@@ -0,0 +1,398 @@
+"""Local stand-in for the subset of the Notion API the tools use.
+
+Load-testing against real Notion burns quota and can't produce rate
+limiting or outages on demand. This serves pages.create, pages.update
+and data_sources.retrieve for the data sources in config/databases.py,
+with injectable faults:
+
+    - latency drawn from a configurable distribution,
+    - 429 rate_limited responses with Retry-After from a token bucket,
+    - random 5xx errors at a given rate,
+    - outage windows during which every request gets a 503.
+
+Requests are validated the way Notion does it: unknown data sources and
+pages are 404s, and properties missing from the data source's schema,
+of the wrong type, or naming an unknown status option are 400
+validation_errors. Schemas use the types a real workspace has: Status
+is a status property with fixed options and Topic Link is a url, so
+requests only get through when the tools encode them from the schema
+they fetched.
+
+Point the tools at it with NOTION_BASE_URL (any NOTION_API_KEY works).
+GET /_standin/stats returns request counts by outcome.
+
+Usage:
+    python -m task_capture_agent.notion_standin [--port 8765]
+        [--latency lognormal:80,0.5] [--rate 3 --burst 3]
+        [--error-rate 0.02] [--outage 30:10 --outage-period 120] [--seed N]
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from task_capture_agent.config.loader import get_config
+
+# Property types, as set up in the real workspace.
+_SELECT_FIELDS = {
+    "Priority", "Category", "Source", "Area",
+    "Platform", "Type", "Class", "Confidence",
+}
+_NUMBER_FIELDS = {"Cost Estimate"}
+_URL_FIELDS = {"Topic Link"}
+_MASTER_FIELDS = ["Task", "Source", "Status", "Priority", "Category", "Topic Link", "Confidence"]
+# Notion won't create status options on write, so these are the only ones.
+_MASTER_STATUSES = ["Pending", "Routed", "Needs Sorting"]
+_TOPIC_STATUSES = ["To Do", "In Progress", "Done"]
+
+_PAGE_PATH = re.compile(r"^/v1/pages/([\w-]+)$")
+_DATA_SOURCE_PATH = re.compile(r"^/v1/data_sources/([\w-]+)$")
+
+
+def _property_type(name: str) -> str:
+    if name == "Task":
+        return "title"
+    if name == "Status":
+        return "status"
+    if name in _URL_FIELDS:
+        return "url"
+    if name in _SELECT_FIELDS:
+        return "select"
+    if name in _NUMBER_FIELDS:
+        return "number"
+    return "rich_text"
+
+
+def _schema(fields, statuses: list[str]) -> dict[str, dict]:
+    return {
+        name: {
+            "type": _property_type(name),
+            "options": statuses if _property_type(name) == "status" else [],
+        }
+        for name in fields
+    }
+
+
+def default_schemas() -> dict[str, dict[str, dict]]:
+    """Property name → type and options for every data source in the routing config."""
+    config = get_config()
+    schemas = {config.master_db_id: _schema(_MASTER_FIELDS, _MASTER_STATUSES)}
+    for db in config.topic_databases.values():
+        fields = [*db.get("required_fields", ()), *db.get("optional_fields", ())]
+        default = db.get("defaults", {}).get("Status")
+        statuses = _TOPIC_STATUSES + ([default] if default and default not in _TOPIC_STATUSES else [])
+        schemas[db["data_source_id"]] = _schema(fields, statuses)
+    return schemas
+
+
+class LatencyModel:
+    """Per-request latency, in seconds, from a "kind:params" spec in ms.
+
+    constant:MS, uniform:LOW,HIGH, normal:MEAN,STDDEV, or
+    lognormal:MEDIAN,SIGMA (a long right tail, like real API latency).
+    """
+
+    KINDS = ("constant", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec: str = "constant:0", rng: random.Random | None = None):
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}; expected one of {self.KINDS}")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",")] if params else [0.0]
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "constant":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(p[0], p[1])
+        else:
+            ms = self.rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        return max(0.0, ms) / 1000
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token; return 0, or seconds until one is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class _Fault(Exception):
+    def __init__(self, status: int, code: str, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.headers = headers or {}
+
+
+class NotionStandIn:
+    """The stand-in server. Use start()/stop() or as a context manager.
+
+    Args:
+        port: Port to listen on (0 picks a free one; see url).
+        latency: LatencyModel spec, e.g. "lognormal:80,0.5".
+        rate: Sustained requests per second before 429s (0 disables).
+        burst: Token-bucket size for rate limiting.
+        error_rate: Probability that a request fails with a random 5xx.
+        outages: (start, duration) windows in seconds from start().
+        outage_period: If set, the outage windows repeat every this many seconds.
+        seed: Seed for latency and error sampling, for repeatable runs.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "constant:0",
+        rate: float = 0.0,
+        burst: float = 3.0,
+        error_rate: float = 0.0,
+        outages: list[tuple[float, float]] | None = None,
+        outage_period: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.bucket = _TokenBucket(rate, burst) if rate > 0 else None
+        self.error_rate = error_rate
+        self.outages = outages or []
+        self.outage_period = outage_period
+        self.schemas = default_schemas()
+        self.pages: dict[str, dict] = {}
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "NotionStandIn":
+        self._started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), name="notion-standin", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "NotionStandIn":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # --- faults ---
+
+    def in_outage(self) -> bool:
+        elapsed = time.monotonic() - self._started
+        if self.outage_period:
+            elapsed %= self.outage_period
+        return any(start <= elapsed < start + duration for start, duration in self.outages)
+
+    def _inject_faults(self) -> None:
+        if self.in_outage():
+            raise _Fault(503, "service_unavailable", "Notion is unavailable (simulated outage).")
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait:
+                raise _Fault(
+                    429, "rate_limited", "You have been rate limited. Please try again later.",
+                    {"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+        with self._lock:
+            failed = self.rng.random() < self.error_rate
+            status = self.rng.choice((500, 502, 503))
+        if failed:
+            code = "service_unavailable" if status == 503 else "internal_server_error"
+            raise _Fault(status, code, f"Simulated {status}.")
+
+    # --- API ---
+
+    def _validate(self, data_source_id: str, properties) -> None:
+        schema = self.schemas[data_source_id]
+        if not isinstance(properties, dict):
+            raise _Fault(400, "validation_error", "body.properties should be an object.")
+        for name, value in properties.items():
+            prop = schema.get(name)
+            if prop is None:
+                raise _Fault(400, "validation_error", f"{name} is not a property that exists.")
+            expected = prop["type"]
+            if not isinstance(value, dict) or expected not in value:
+                raise _Fault(400, "validation_error", f"{name} is expected to be {expected}.")
+            if expected == "status" and (value["status"] or {}).get("name") not in prop["options"]:
+                raise _Fault(400, "validation_error", f"Invalid status option for {name}.")
+
+    def create_page(self, body: dict) -> dict:
+        parent = body.get("parent") or {}
+        data_source_id = parent.get("data_source_id") or parent.get("database_id")
+        if data_source_id not in self.schemas:
+            raise _Fault(404, "object_not_found", f"Could not find data source with ID: {data_source_id}.")
+        self._validate(data_source_id, body.get("properties", {}))
+        page_id = str(uuid.uuid4())
+        page = {
+            "object": "page",
+            "id": page_id,
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "parent": {"type": "data_source_id", "data_source_id": data_source_id},
+            "properties": body.get("properties", {}),
+        }
+        with self._lock:
+            self.pages[page_id] = page
+        return page
+
+    def update_page(self, page_id: str, body: dict) -> dict:
+        with self._lock:
+            page = self.pages.get(page_id)
+        if page is None:
+            raise _Fault(404, "object_not_found", f"Could not find page with ID: {page_id}.")
+        properties = body.get("properties", {})
+        self._validate(page["parent"]["data_source_id"], properties)
+        with self._lock:
+            page["properties"].update(properties)
+        return page
+
+    def retrieve_data_source(self, data_source_id: str) -> dict:
+        schema = self.schemas.get(data_source_id)
+        if schema is None:
+            raise _Fault(404, "object_not_found", f"Could not find data source with ID: {data_source_id}.")
+        return {
+            "object": "data_source",
+            "id": data_source_id,
+            "properties": {
+                name: {
+                    "id": name, "name": name, "type": prop["type"],
+                    prop["type"]: {"options": [{"name": o} for o in prop["options"]]}
+                    if prop["type"] in ("select", "multi_select", "status") else {},
+                }
+                for name, prop in schema.items()
+            },
+        }
+
+    def _route(self, method: str, path: str, body: dict) -> dict:
+        if method == "POST" and path == "/v1/pages":
+            return self.create_page(body)
+        match = _PAGE_PATH.match(path)
+        if method == "PATCH" and match:
+            return self.update_page(match.group(1), body)
+        match = _DATA_SOURCE_PATH.match(path)
+        if method == "GET" and match:
+            return self.retrieve_data_source(match.group(1))
+        raise _Fault(400, "invalid_request_url", f"Invalid request URL: {method} {path}")
+
+    def handle(self, method: str, path: str, headers, raw_body: bytes) -> tuple[int, dict, dict]:
+        """Process one request. Returns (status, headers, JSON body)."""
+        if path == "/_standin/stats":
+            with self._lock:
+                return 200, {}, {**self.stats, "pages": len(self.pages)}
+        time.sleep(self.latency.sample())
+        try:
+            if not (headers.get("Authorization") or "").startswith("Bearer "):
+                raise _Fault(401, "unauthorized", "API token is invalid.")
+            self._inject_faults()
+            try:
+                body = json.loads(raw_body) if raw_body else {}
+            except ValueError:
+                raise _Fault(400, "invalid_json", "Error parsing JSON body.") from None
+            result = self._route(method, path, body)
+        except _Fault as fault:
+            with self._lock:
+                self.stats[str(fault.status)] += 1
+            return fault.status, fault.headers, {
+                "object": "error", "status": fault.status,
+                "code": fault.code, "message": str(fault),
+            }
+        with self._lock:
+            self.stats["200"] += 1
+        return 200, {}, result
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw_body = self.rfile.read(length) if length else b""
+                status, headers, body = standin.handle(
+                    self.command, self.path.split("?")[0], self.headers, raw_body
+                )
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _parse_outage(spec: str) -> tuple[float, float]:
+    start, _, duration = spec.partition(":")
+    return float(start), float(duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="constant:0", help="e.g. lognormal:80,0.5")
+    parser.add_argument("--rate", type=float, default=3.0, help="Requests/second before 429s (0 = off)")
+    parser.add_argument("--burst", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--outage", type=_parse_outage, action="append", default=[],
+                        metavar="START:DURATION", help="Outage window in seconds (repeatable)")
+    parser.add_argument("--outage-period", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    server = NotionStandIn(
+        args.host, args.port, args.latency, args.rate, args.burst,
+        args.error_rate, args.outage, args.outage_period, args.seed,
+    )
+    print(f"Notion stand-in listening on {server.url} — set NOTION_BASE_URL={server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
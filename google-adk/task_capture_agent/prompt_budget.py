@@ -0,0 +1,59 @@
+"""Token report and budget for the agent's static prompt prefix.
+
+The static instruction and the tool declarations are sent at the start
+of every model request. They are cached model-side (see `app` in
+agent.py), but a cache miss, or a new category that pushes the prefix
+past the budget, still costs latency and tokens on every turn. This
+estimates each part so prompt growth shows up in review and in tests.
+
+Counts use the same ~4 characters per token estimate as ADK's context
+cache manager; they are for tracking growth, not billing.
+
+Usage:
+    python -m task_capture_agent.prompt_budget
+"""
+
+import json
+
+CHARS_PER_TOKEN = 4
+
+# Upper bound for static instruction + tool declarations, in estimated tokens.
+STATIC_PREFIX_TOKEN_BUDGET = 3072
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a string."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _tool_declaration_tokens(tool) -> int:
+    from google.adk.tools import FunctionTool
+
+    declaration = FunctionTool(tool)._get_declaration()
+    return estimate_tokens(json.dumps(declaration.model_dump(exclude_none=True)))
+
+
+def token_report() -> dict:
+    """Estimated tokens per part of the static prefix, and the budget check."""
+    from task_capture_agent import agent
+    from task_capture_agent.config.loader import get_config
+
+    config = get_config()
+    category_table = config.category_table
+    instruction = estimate_tokens(agent.INSTRUCTION)
+    tools = {tool.__name__: _tool_declaration_tokens(tool) for tool in agent.root_agent.tools}
+    total = instruction + sum(tools.values())
+    return {
+        "static_instruction": instruction,
+        "category_table": estimate_tokens(category_table),
+        "tokens_per_category": estimate_tokens(category_table) // max(1, len(config.categories)),
+        "classification_rules": estimate_tokens(config.classification_rules),
+        "tools": tools,
+        "static_prefix": total,
+        "budget": STATIC_PREFIX_TOKEN_BUDGET,
+        "within_budget": total <= STATIC_PREFIX_TOKEN_BUDGET,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(token_report(), indent=2))
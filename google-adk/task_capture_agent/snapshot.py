@@ -0,0 +1,115 @@
+"""Precomputed startup snapshot for cold starts.
+
+On scale-to-zero containers every new instance rebuilds the same state:
+the instruction, the classifier prototypes (vectorized from the category
+config), and — worst of all — one Notion data_sources.retrieve round
+trip per database before its first capture, since the schema cache
+lives on the instance's disk. A snapshot file built once at image build
+time carries all three.
+
+The snapshot is keyed on a hash of the source files it is derived from,
+so a snapshot left over from an older build is ignored instead of
+serving a stale instruction or classifier. The instruction and
+classifier are also only used while the routing config (see
+config/loader.py) has the version they were built from. Cached schemas keep their
+original fetch time and still expire after NOTION_SCHEMA_TTL_SECONDS.
+
+The snapshot is optional and only read when TASK_CAPTURE_SNAPSHOT
+points at it.
+
+Usage:
+    python -m task_capture_agent.snapshot snapshot.json [--fetch-schemas]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+SNAPSHOT_VERSION = 1
+
+_PACKAGE_DIR = os.path.dirname(__file__)
+_SOURCES = (
+    "agent.py",
+    "classifier.py",
+    os.path.join("config", "categories.py"),
+    os.path.join("config", "databases.py"),
+    os.path.join("config", "loader.py"),
+)
+
+
+def fingerprint() -> str:
+    """Hash of the sources the snapshot is derived from."""
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    for name in _SOURCES:
+        with open(os.path.join(_PACKAGE_DIR, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def load_snapshot() -> dict:
+    """Return the snapshot named by TASK_CAPTURE_SNAPSHOT, or {}.
+
+    Missing, unreadable or stale snapshots all return {}, and callers
+    compute the state themselves.
+    """
+    path = os.environ.get("TASK_CAPTURE_SNAPSHOT")
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if snapshot.get("fingerprint") != fingerprint():
+        return {}
+    return snapshot
+
+
+def build_snapshot(fetch_schemas: bool = False) -> dict:
+    """Compute the snapshot from the current sources and schema cache."""
+    from task_capture_agent import agent
+    from task_capture_agent.classifier import LocalClassifier
+    from task_capture_agent.config.loader import get_config
+    from task_capture_agent.tools import schema
+
+    registry = schema.get_registry()
+    if fetch_schemas:
+        from task_capture_agent.tools.client import get_client
+
+        for data_source_id in schema.data_source_ids():
+            registry.load(data_source_id, get_client())
+    return {
+        "fingerprint": fingerprint(),
+        "config_version": get_config().version,
+        "instruction": agent.INSTRUCTION,
+        "classifier": LocalClassifier().export(),
+        "schemas": registry.export(),
+    }
+
+
+def write_snapshot(path: str, fetch_schemas: bool = False) -> dict:
+    """Build a snapshot and write it to path atomically."""
+    snapshot = build_snapshot(fetch_schemas)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument(
+        "--fetch-schemas", action="store_true",
+        help="Fetch any Notion schemas missing from the cache (needs NOTION_API_KEY)",
+    )
+    args = parser.parse_args()
+    snapshot = write_snapshot(args.path, args.fetch_schemas)
+    print(
+        f"Wrote {args.path}: instruction, {len(snapshot['classifier']['prototypes'])} "
+        f"classifier prototypes, {len(snapshot['schemas'])} schemas"
+    )
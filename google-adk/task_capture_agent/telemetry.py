@@ -0,0 +1,360 @@
+"""Tracing and metrics for the capture pipeline.
+
+When a capture feels slow, the time could have gone to LLM turns, Notion
+pages.create / pages.update, or a Sheets fallback write. This records:
+
+    - spans for every tool call and every Notion and Sheets call, nested
+      under ADK's own invocation / LLM / tool spans,
+    - histograms for per-tool, per-Notion-call, end-to-end capture, LLM
+      turn and agent run latency,
+    - counters for fallbacks, Notion retries, routes by status
+      (Routed, Needs Sorting, Fallback), classification memo hits,
+      model cascade stage outcomes, Notion circuit breaker state
+      changes and routing config reloads.
+
+Everything goes through the OpenTelemetry API, so it is exported by
+whatever providers are configured (e.g. `adk web --otel_to_cloud`) and
+is a no-op otherwise. configure_metrics() installs an in-process reader
+that renders the metrics in Prometheus text format, optionally served
+over HTTP at /metrics, with no collector needed. The agent does this at
+startup when TASK_CAPTURE_METRICS_PORT is set.
+
+OpenTelemetry is imported on first use, not at import time, to keep
+cold starts fast.
+"""
+
+import functools
+import inspect
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVICE_NAME = "task_capture_agent"
+
+# Seconds; the OpenTelemetry defaults are sized for milliseconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_instruments = None
+_instruments_lock = threading.Lock()
+
+
+class _Instruments:
+    def __init__(self):
+        from opentelemetry import metrics, trace
+
+        self.trace = trace
+        self.no_op_providers = (trace.ProxyTracerProvider, trace.NoOpTracerProvider)
+        self.tracer = trace.get_tracer(SERVICE_NAME)
+        meter = metrics.get_meter(SERVICE_NAME)
+
+        def histogram(name, description):
+            return meter.create_histogram(
+                name, unit="s", description=description,
+                explicit_bucket_boundaries_advisory=LATENCY_BUCKETS,
+            )
+
+        self.tool_duration = histogram("task_capture.tool.duration", "Tool call latency")
+        self.notion_duration = histogram("task_capture.notion.duration", "Notion API call latency, per attempt")
+        self.sheets_duration = histogram("task_capture.sheets.duration", "Google Sheets call latency")
+        self.capture_duration = histogram("task_capture.capture.duration", "End-to-end latency of one capture")
+        self.llm_duration = histogram("task_capture.llm.duration", "LLM turn latency")
+        self.run_duration = histogram("task_capture.agent_run.duration", "Agent run latency")
+        self.fallbacks = meter.create_counter("task_capture.fallbacks", description="Tasks written to a fallback log")
+        self.retries = meter.create_counter("task_capture.notion.retries", description="Retried Notion calls")
+        self.routes = meter.create_counter("task_capture.routes", description="Captures by final status")
+        self.saved_calls = meter.create_counter("task_capture.notion.saved_calls", description="Notion calls avoided")
+        self.memo_lookups = meter.create_counter("task_capture.memo.lookups", description="Classification memo lookups")
+        self.breaker_transitions = meter.create_counter("task_capture.notion.breaker_transitions", description="Notion circuit breaker state changes")
+        self.config_reloads = meter.create_counter("task_capture.config.reloads", description="Routing config reloads")
+        self.cascade_stages = meter.create_counter("task_capture.cascade.stages", description="Model cascade stage outcomes")
+
+
+def _get() -> _Instruments:
+    global _instruments
+    if _instruments is None:
+        with _instruments_lock:
+            if _instruments is None:
+                _instruments = _Instruments()
+    return _instruments
+
+
+def span(name: str, **attributes):
+    """Context manager for a span; exceptions are recorded on it.
+
+    Free when no tracer provider is installed, which is the common case
+    outside `adk web` / `adk api_server` with tracing on.
+    """
+    instruments = _get()
+    if isinstance(instruments.trace.get_tracer_provider(), instruments.no_op_providers):
+        return nullcontext(instruments.trace.INVALID_SPAN)
+    return instruments.tracer.start_as_current_span(name, attributes=attributes)
+
+
+def _outcome(error: BaseException | None) -> str:
+    if error is None:
+        return "ok"
+    status = getattr(error, "status", None)
+    return str(status) if status else type(error).__name__
+
+
+def traced_tool(fn):
+    """Wrap a sync or async tool in a span and a latency histogram.
+
+    The wrapper keeps fn's name, docstring and signature, so ADK builds
+    the same tool declaration from it.
+    """
+    name = fn.__name__
+
+    def record(start: float, error: BaseException | None) -> None:
+        _get().tool_duration.record(
+            time.perf_counter() - start, {"tool": name, "outcome": _outcome(error)}
+        )
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start, error = time.perf_counter(), None
+            try:
+                with span(f"tool {name}", tool=name):
+                    return await fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                record(start, error)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start, error = time.perf_counter(), None
+        try:
+            with span(f"tool {name}", tool=name):
+                return fn(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            record(start, error)
+    return wrapper
+
+
+@contextmanager
+def timed(histogram: str, **attributes):
+    """Record the block's duration in one of the latency histograms."""
+    start, error = time.perf_counter(), None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        getattr(_get(), histogram).record(
+            time.perf_counter() - start, {**attributes, "outcome": _outcome(error)}
+        )
+
+
+def record_retry(operation: str, status) -> None:
+    _get().retries.add(1, {"operation": operation, "status": str(status)})
+    current = _get().trace.get_current_span()
+    current.add_event("retry", {"status": str(status)})
+
+
+def record_fallback(sink: str) -> None:
+    _get().fallbacks.add(1, {"sink": sink})
+
+
+def record_saved_call(reason: str) -> None:
+    _get().saved_calls.add(1, {"reason": reason})
+
+
+def record_breaker_transition(state: str) -> None:
+    _get().breaker_transitions.add(1, {"state": state})
+
+
+def record_config_reload(outcome: str) -> None:
+    _get().config_reloads.add(1, {"outcome": outcome})
+
+
+def record_memo_lookup(hit: bool) -> None:
+    _get().memo_lookups.add(1, {"result": "hit" if hit else "miss"})
+
+
+def record_cascade_stage(stage: str, outcome: str) -> None:
+    _get().cascade_stages.add(1, {"stage": stage, "outcome": outcome})
+
+
+def record_capture(status: str, duration: float) -> None:
+    _get().routes.add(1, {"status": status})
+    _get().capture_duration.record(duration, {"status": status})
+
+
+# --- agent callbacks: LLM turn and agent run latency ---
+
+_started: dict[tuple[str, str], float] = {}
+
+
+def _finish(kind: str, callback_context, histogram: str, error=None) -> None:
+    start = _started.pop((kind, callback_context.invocation_id), None)
+    if start is not None:
+        getattr(_get(), histogram).record(
+            time.perf_counter() - start,
+            {"agent": callback_context.agent_name, "outcome": _outcome(error)},
+        )
+
+
+def before_model(callback_context, llm_request):
+    _started[("llm", callback_context.invocation_id)] = time.perf_counter()
+    return None
+
+
+def after_model(callback_context, llm_response):
+    _finish("llm", callback_context, "llm_duration")
+    return None
+
+
+def on_model_error(callback_context, llm_request, error):
+    _finish("llm", callback_context, "llm_duration", error)
+    return None
+
+
+def before_agent(callback_context):
+    _started[("run", callback_context.invocation_id)] = time.perf_counter()
+    return None
+
+
+def after_agent(callback_context):
+    _finish("run", callback_context, "run_duration")
+    return None
+
+
+# --- in-process Prometheus exporter ---
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def _metric_name(name: str, unit: str, kind: str) -> str:
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    if unit == "s":
+        name += "_seconds"
+    if kind == "counter":
+        name += "_total"
+    return name
+
+
+def _labels(attributes: dict, extra: dict | None = None) -> str:
+    items = {**attributes, **(extra or {})}
+    if not items:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in sorted(items.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+def render_prometheus(metrics_data) -> str:
+    """Render an OpenTelemetry MetricsData snapshot in Prometheus text format."""
+    from opentelemetry.sdk.metrics.export import Histogram, Sum
+
+    lines = []
+    for resource_metrics in metrics_data.resource_metrics if metrics_data else []:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                data = metric.data
+                if isinstance(data, Histogram):
+                    name = _metric_name(metric.name, metric.unit, "histogram")
+                    lines += [f"# HELP {name} {metric.description}", f"# TYPE {name} histogram"]
+                    for point in data.data_points:
+                        attributes = dict(point.attributes)
+                        cumulative = 0
+                        bounds = list(point.explicit_bounds) + [math.inf]
+                        for bound, count in zip(bounds, point.bucket_counts):
+                            cumulative += count
+                            le = {"le": _format_bound(bound)}
+                            lines.append(f"{name}_bucket{_labels(attributes, le)} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(attributes)} {point.sum}")
+                        lines.append(f"{name}_count{_labels(attributes)} {point.count}")
+                elif isinstance(data, Sum):
+                    kind = "counter" if data.is_monotonic else "gauge"
+                    name = _metric_name(metric.name, metric.unit, kind)
+                    lines += [f"# HELP {name} {metric.description}", f"# TYPE {name} {kind}"]
+                    for point in data.data_points:
+                        lines.append(f"{name}{_labels(dict(point.attributes))} {point.value}")
+    return "\n".join(lines) + "\n"
+
+
+def _make_reader():
+    from opentelemetry.sdk.metrics.export import MetricReader
+
+    class PrometheusTextReader(MetricReader):
+        """Pull-based reader that renders the latest collection as text."""
+
+        def __init__(self):
+            super().__init__()
+            self._latest = None
+
+        def _receive_metrics(self, metrics_data, timeout_millis: float = 10_000, **kwargs) -> None:
+            self._latest = metrics_data
+
+        def render(self) -> str:
+            self.collect()
+            return render_prometheus(self._latest)
+
+        def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+            pass
+
+    return PrometheusTextReader()
+
+
+def configure_metrics(port: int | None = None, host: str = "0.0.0.0"):
+    """Install the in-process metrics reader as the global MeterProvider.
+
+    Idempotent. If port is given, also serve the metrics at
+    http://host:port/metrics. Returns the reader; reader.render()
+    returns the current metrics as Prometheus text.
+    """
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            from opentelemetry import metrics
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.resources import Resource
+
+            _reader = _make_reader()
+            metrics.set_meter_provider(MeterProvider(
+                metric_readers=[_reader],
+                resource=Resource.create({"service.name": SERVICE_NAME}),
+            ))
+        if port is not None:
+            _serve(_reader, host, port)
+        return _reader
+
+
+def _serve(reader, host: str, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = reader.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,128 @@
+"""Async variants of the task capture tools.
+
+The ADK runner awaits async tools on its event loop, so these let one
+worker serve many capture sessions without a slow Notion or Sheets call
+blocking every other session. They keep the names and docstrings of the
+sync tools in notion.py and fallback.py, so the agent instruction and
+the model see exactly the same tools.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from task_capture_agent import telemetry
+from task_capture_agent.tools import fallback, idempotency, notion, ratelimit, schema
+from task_capture_agent.config.loader import get_config
+from task_capture_agent.tools.client import get_async_client
+
+if TYPE_CHECKING:
+    from notion_client import AsyncClient
+
+# gspread is sync-only, so Sheets writes run on this pool instead of the loop.
+_fallback_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fallback")
+
+
+def _get_async_client() -> "AsyncClient":
+    """Return the shared Notion async client for the running loop."""
+    return get_async_client()
+
+
+@telemetry.traced_tool
+async def create_master_record(title: str, priority: str = "Medium") -> dict:
+    return await _create_master_record(title, priority)
+
+
+async def _create_master_record(
+    title: str, priority: str = "Medium", routing: dict | None = None
+) -> dict:
+    """create_master_record, optionally created already routed.
+
+    Single-phase captures (see capture.py) pass routing, the master
+    update fields from notion._master_routing_fields, so the master is
+    created linked to its topic entry without a separate update call.
+    """
+    async def create() -> dict:
+        client = _get_async_client()
+        await schema.get_registry().aload(get_config().master_db_id, client)
+        response = await ratelimit.acall(
+            client.pages.create, idempotent=False,
+            **notion._master_record_request(title, priority, routing),
+        )
+        return {"page_id": response["id"], "url": response["url"]}
+
+    key = idempotency.fingerprint("master", title)
+    return await idempotency.get_cache().arun_once(key, create)
+
+
+@telemetry.traced_tool
+async def create_topic_entry(
+    category: str,
+    title: str,
+    priority: str = "Medium",
+    notes: str = "",
+    **extra_fields,
+) -> dict:
+    route = notion._topic_route(category)
+
+    async def create() -> dict:
+        client = _get_async_client()
+        await schema.get_registry().aload(route.data_source_id, client)
+        _, request = notion._topic_entry_request(
+            category, title, priority, notes, extra_fields
+        )
+        response = await ratelimit.acall(client.pages.create, idempotent=False, **request)
+        return {
+            "page_id": response["id"],
+            "url": response["url"],
+            "database_name": route.name,
+        }
+
+    key = idempotency.fingerprint("topic", route.name, title)
+    return await idempotency.get_cache().arun_once(key, create)
+
+
+@telemetry.traced_tool
+async def update_master_record(
+    page_id: str,
+    status: str,
+    category: str,
+    topic_link: str,
+    confidence: str = "High",
+) -> dict:
+    client = _get_async_client()
+    await schema.get_registry().aload(get_config().master_db_id, client)
+    await ratelimit.acall(
+        client.pages.update,
+        priority=ratelimit.PRIORITY_UPDATE,
+        **notion._master_update_request(
+            page_id, status, category, topic_link, confidence
+        ),
+    )
+    return {"updated": True, "page_id": page_id, "status": status}
+
+
+async def log_fallback(
+    title: str,
+    category: str = "Unknown",
+    priority: str = "Medium",
+    error_message: str = "",
+) -> dict:
+    loop = asyncio.get_running_loop()
+    # The sync tool records its own span and latency; running it in a
+    # copy of this context keeps that span under the caller's.
+    return await loop.run_in_executor(
+        _fallback_executor,
+        functools.partial(
+            contextvars.copy_context().run, fallback.log_fallback,
+            title, category, priority, error_message,
+        ),
+    )
+
+
+create_master_record.__doc__ = notion.create_master_record.__doc__
+create_topic_entry.__doc__ = notion.create_topic_entry.__doc__
+update_master_record.__doc__ = notion.update_master_record.__doc__
+log_fallback.__doc__ = fallback.log_fallback.__doc__
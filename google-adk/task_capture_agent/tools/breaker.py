@@ -0,0 +1,250 @@
+"""Circuit breaker shared by every Notion call.
+
+When Notion is degraded, each call waits out its HTTP timeout (and its
+retries) before failing, so a capture can take tens of seconds to reach
+the fallback log. The breaker watches the outcome and latency of every
+Notion request made through ratelimit.py, whichever tool makes it:
+
+    closed: requests go through. Once at least min_calls requests in
+        the last window_seconds have been seen and the share that failed
+        or took longer than slow_call_seconds reaches failure_rate, the
+        breaker opens.
+    open: requests fail at once with CircuitOpenError, so captures go
+        straight to the fallback log. After open_seconds a background
+        thread probes Notion with one cheap read.
+    half_open: the probe is in flight, and requests still fail fast. A
+        healthy answer closes the breaker; otherwise it stays open for
+        another open_seconds.
+
+Failures are 5xx responses and errors without an HTTP status (timeouts,
+connection errors). Other 4xx responses mean Notion is up and count as
+successes; 429s are the rate limiter's business and aren't counted.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from task_capture_agent import telemetry
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_MIN_CALLS = 5
+DEFAULT_WINDOW_SECONDS = 60.0
+DEFAULT_SLOW_CALL_SECONDS = 10.0
+DEFAULT_OPEN_SECONDS = 30.0
+
+
+class CircuitOpenError(Exception):
+    """Notion is failing fast because the circuit breaker is open."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(
+            f"Notion unavailable (circuit breaker open, next probe in {retry_in:.0f}s)"
+        )
+        self.retry_in = retry_in
+
+
+def _is_failure(error: BaseException) -> bool | None:
+    """Whether error means Notion is unhealthy; None for ones that don't count."""
+    status = getattr(error, "status", None)
+    if status == 429:
+        return None
+    return status is None or status >= 500
+
+
+def _probe_notion() -> None:
+    """Read the master data source, the cheapest call every capture relies on."""
+    from task_capture_agent.config.loader import get_config
+    from task_capture_agent.tools import ratelimit
+    from task_capture_agent.tools.client import get_client
+
+    ratelimit.get_rate_limiter().acquire()
+    get_client().data_sources.retrieve(data_source_id=get_config().master_db_id)
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by error rate and latency.
+
+    Settings are read from the environment unless passed explicitly:
+        NOTION_BREAKER_FAILURE_RATE: Share of failed or slow requests
+            that opens the breaker (default 0.5).
+        NOTION_BREAKER_MIN_CALLS: Requests in the window before it may
+            open (default 5).
+        NOTION_BREAKER_WINDOW_SECONDS: Sliding window (default 60).
+        NOTION_BREAKER_SLOW_CALL_SECONDS: Latency that counts as a
+            failure (default 10).
+        NOTION_BREAKER_OPEN_SECONDS: Wait before each recovery probe
+            (default 30).
+    """
+
+    def __init__(
+        self,
+        failure_rate: float | None = None,
+        min_calls: int | None = None,
+        window_seconds: float | None = None,
+        slow_call_seconds: float | None = None,
+        open_seconds: float | None = None,
+        probe=None,
+    ):
+        self.failure_rate = failure_rate or float(
+            os.environ.get("NOTION_BREAKER_FAILURE_RATE", DEFAULT_FAILURE_RATE)
+        )
+        self.min_calls = min_calls or int(
+            os.environ.get("NOTION_BREAKER_MIN_CALLS", DEFAULT_MIN_CALLS)
+        )
+        self.window_seconds = window_seconds or float(
+            os.environ.get("NOTION_BREAKER_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS)
+        )
+        self.slow_call_seconds = slow_call_seconds or float(
+            os.environ.get("NOTION_BREAKER_SLOW_CALL_SECONDS", DEFAULT_SLOW_CALL_SECONDS)
+        )
+        self.open_seconds = open_seconds if open_seconds is not None else float(
+            os.environ.get("NOTION_BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS)
+        )
+        self.probe = probe or _probe_notion
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._failed = 0
+        self._opened_at = 0.0
+        self._prober: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def available(self) -> bool:
+        """Whether Notion requests are let through right now."""
+        return self.state == CLOSED
+
+    def _retry_in(self) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def check(self) -> None:
+        """Raise CircuitOpenError unless the breaker is closed."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            retry_in = self._retry_in()
+        raise CircuitOpenError(retry_in)
+
+    @contextmanager
+    def guard(self):
+        """Fail fast if open, otherwise time the request inside and record it."""
+        self.check()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            self.record(time.perf_counter() - start, error)
+            raise
+        self.record(time.perf_counter() - start)
+
+    def record(self, duration: float, error: BaseException | None = None) -> None:
+        """Count one request's outcome; opens the breaker past the failure rate."""
+        failed = duration > self.slow_call_seconds
+        if error is not None:
+            failure = _is_failure(error)
+            if failure is None:
+                return
+            failed = failed or failure
+        now = time.monotonic()
+        with self._lock:
+            if self._state != CLOSED:
+                return
+            self._calls.append((now, failed))
+            self._failed += failed
+            while self._calls[0][0] < now - self.window_seconds:
+                self._failed -= self._calls.popleft()[1]
+            # Only a failure can trip it: a success means Notion is answering.
+            if not failed or len(self._calls) < self.min_calls \
+                    or self._failed < self.failure_rate * len(self._calls):
+                return
+            self._transition(OPEN)
+            self.trips += 1
+            if self._prober is None:
+                # Each prober gets its own stop event, so one started
+                # after close() isn't stopped before it begins.
+                self._stop = threading.Event()
+                self._prober = threading.Thread(
+                    target=self._probe_until_healthy, args=(self._stop,),
+                    name="notion-breaker-probe", daemon=True,
+                )
+                self._prober.start()
+
+    def _transition(self, state: str) -> None:
+        """Move to state; must be called with the lock held."""
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._calls.clear()
+            self._failed = 0
+        telemetry.record_breaker_transition(state)
+
+    def _probe_until_healthy(self, stop: threading.Event) -> None:
+        while not stop.wait(self.open_seconds):
+            with self._lock:
+                if stop.is_set():
+                    return
+                self._transition(HALF_OPEN)
+            try:
+                self.probe()
+                healthy = True
+            except Exception as error:
+                healthy = _is_failure(error) is False
+            with self._lock:
+                if stop.is_set():
+                    return
+                if healthy:
+                    self._transition(CLOSED)
+                    self._prober = None
+                    return
+                self._transition(OPEN)
+
+    def stats(self) -> dict:
+        """Snapshot of the breaker for logging and health checks."""
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                "state": self._state,
+                "recent_calls": calls,
+                "recent_failures": self._failed,
+                "failure_rate": round(self._failed / calls, 3) if calls else 0.0,
+                "retry_in": round(self._retry_in(), 1) if self._state != CLOSED else 0.0,
+                "trips": self.trips,
+            }
+
+    def close(self) -> None:
+        """Stop the background probe, if one is running, and reset to closed.
+
+        Without the reset an open breaker would have no prober left to
+        close it, and every later request would fail fast.
+        """
+        with self._lock:
+            self._stop.set()
+            self._prober = None
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+
+_breaker = CircuitBreaker()
+
+
+def get_breaker() -> CircuitBreaker:
+    """Return the process-wide Notion circuit breaker."""
+    return _breaker
+
+
+def state() -> str:
+    """State of the shared breaker: "closed", "open" or "half_open"."""
+    return _breaker.state
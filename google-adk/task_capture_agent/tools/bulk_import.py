@@ -0,0 +1,318 @@
+"""Bulk-import an existing task backlog into Notion.
+
+Streams tasks from a CSV file, a JSONL file, or a Markdown checklist
+one record at a time, classifies them locally in batches, and routes
+each through the normal master → topic → link pipeline with bounded
+concurrency and the shared Notion rate limiter. The file is never
+loaded into memory, so a 10k-task backlog costs no more than a small
+one.
+
+Input formats (picked from the file extension unless --format is given):
+    - CSV: a header row naming the columns. "title" (or "task") is
+      required; "category", "priority", "confidence" and "notes" are
+      optional, and any other non-empty column becomes a topic field.
+    - JSONL: one object per line with the same keys.
+    - Markdown: unchecked "- [ ] ..." items. Checked items, headings
+      and other lines are skipped.
+
+Tasks without a known category are classified by the local
+pre-classifier. Confident predictions are routed with High confidence;
+the rest go to Needs Sorting with the prediction as the suggested
+category.
+
+Progress is checkpointed by byte offset in <file>.import.json, at most
+once a second, so an interrupted import resumes where it stopped. Tasks
+finished after the last save are caught by the duplicate protection
+(which survives a crash when CAPTURE_DEDUP_DB is set). Tasks Notion
+rejects are written to <file>.rejects.jsonl with the error and
+checkpointed, so they can be fixed and imported again on their own.
+
+Outages are not rejections. While the Notion circuit breaker is open
+the import waits for it to close, and a task that still fails with a
+5xx, 429, timeout or connection error after TRANSIENT_ATTEMPTS tries
+is counted as deferred and left uncheckpointed, so the next run picks
+it up again.
+
+Usage:
+    python -m task_capture_agent.tools.bulk_import backlog.csv
+        [--format csv|jsonl|md] [--concurrency N] [--batch-size N]
+        [--limit N]
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+
+from task_capture_agent.config.loader import get_config
+from task_capture_agent.tools import breaker, capture, idempotency
+from task_capture_agent.tools.client import aclose_clients
+from task_capture_agent.tools.replay import ReplayCheckpoint, _Replayer
+
+DEFAULT_MAX_CONCURRENCY = capture.DEFAULT_MAX_CONCURRENCY
+DEFAULT_BATCH_SIZE = 50
+CHECKPOINT_SAVE_SECONDS = 1.0
+TRANSIENT_ATTEMPTS = 3
+BREAKER_POLL_SECONDS = 1.0
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".md": "md", ".markdown": "md"}
+
+_CHECKLIST_ITEM = re.compile(r"^\s*[-*+]\s+\[([ xX])\]\s+(.+?)\s*$")
+_TITLE_KEYS = ("title", "task")
+
+
+def detect_format(path: str) -> str:
+    """Input format from the file extension, or ValueError."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Can't tell the format of {path}; pass --format")
+    return FORMATS[extension]
+
+
+def _task(record: dict) -> dict | None:
+    """Normalize a CSV row or JSON object to a capture_batch task dict."""
+    task = {}
+    for key, value in record.items():
+        if key is None or value in (None, ""):
+            continue
+        key = key.strip().lower().replace(" ", "_")
+        task[key] = value.strip() if isinstance(value, str) else value
+    for key in _TITLE_KEYS:
+        if task.get(key):
+            task["title"] = task.pop(key)
+            return task
+    return None
+
+
+def _parse_csv(text: str, header: list[str]) -> dict | None:
+    try:
+        row = next(csv.reader([text]), [])
+    except csv.Error as error:
+        raise ValueError(str(error)) from error
+    return _task(dict(zip(header, row))) if any(row) else None
+
+
+def _parse_jsonl(text: str, header=None) -> dict | None:
+    if not text.strip():
+        return None
+    record = json.loads(text)
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    return _task(record)
+
+
+def _parse_md(text: str, header=None) -> dict | None:
+    match = _CHECKLIST_ITEM.match(text)
+    if not match or match.group(1) != " ":
+        return None
+    return {"title": match.group(2)}
+
+
+_PARSERS = {"csv": _parse_csv, "jsonl": _parse_jsonl, "md": _parse_md}
+
+
+def iter_records(path: str, fmt: str, checkpoint: ReplayCheckpoint):
+    """Yield (start, end, task) for each record not yet imported.
+
+    task is None for lines that aren't tasks (blank lines, headings,
+    checked items). Malformed records raise ValueError from the parser
+    when their task is read, so the caller can reject just that record.
+    Reads one record at a time from the checkpoint offset; a quoted CSV
+    field may span several lines.
+    """
+    parse = _PARSERS[fmt]
+    with open(path, "rb") as f:
+        header = None
+        if fmt == "csv":
+            first = f.readline().decode("utf-8-sig")
+            header = [name.strip().lower() for name in next(csv.reader([first]), [])]
+            if checkpoint.offset < f.tell():
+                checkpoint.mark(0, f.tell())
+        start = max(checkpoint.offset, f.tell())
+        f.seek(start)
+        while record := f.readline():
+            if fmt == "csv":
+                while record.count(b'"') % 2 and (more := f.readline()):
+                    record += more
+            end = start + len(record)
+            if not checkpoint.is_done(start):
+                yield start, end, lambda text=record.decode("utf-8"): parse(text, header)
+            start = end
+
+
+def classify_batch(tasks: list[dict]) -> None:
+    """Fill in category and confidence for tasks without a known category."""
+    routes = get_config().routes
+    unlabelled = [task for task in tasks if task.get("category") not in routes]
+    if not unlabelled:
+        return
+    from task_capture_agent.classifier import get_classifier
+
+    predictions = get_classifier().classify_many([task["title"] for task in unlabelled])
+    for task, prediction in zip(unlabelled, predictions):
+        if prediction["confident"]:
+            task.update(category=prediction["category"], confidence="High")
+        else:
+            task.update(
+                category="Needs Sorting",
+                confidence="Low",
+                suggested_category=task.get("category") or prediction["category"],
+                reason=f"Bulk import: local classifier unsure "
+                       f"({prediction['confidence']:.2f})",
+            )
+
+
+def _transient(error: Exception) -> bool:
+    """Whether error means Notion is unavailable rather than the task is bad."""
+    if isinstance(error, (breaker.CircuitOpenError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    from httpx import TransportError
+    from notion_client.errors import RequestTimeoutError
+
+    return isinstance(error, (TransportError, RequestTimeoutError))
+
+
+async def _notion_available() -> None:
+    """Wait until the Notion circuit breaker lets requests through."""
+    while not breaker.get_breaker().available():
+        await asyncio.sleep(BREAKER_POLL_SECONDS)
+
+
+class _Importer(_Replayer):
+    """Routes imported tasks with at most max_concurrency in flight."""
+
+    def __init__(self, max_concurrency: int, rejects_path: str):
+        super().__init__(max_concurrency, limit=0)
+        self.rejects_path = rejects_path
+        self.single_phase = capture.single_phase_enabled()
+        self.stats = {
+            "imported": 0, "needs_sorting": 0, "failed": 0, "deferred": 0,
+            "skipped": 0, "saved_calls": 0, "errors": [],
+        }
+
+    def _error(self, task: dict, error: Exception) -> None:
+        if len(self.stats["errors"]) < 10:
+            self.stats["errors"].append(f"{task.get('title', task)}: {error}")
+
+    def reject(self, task: dict, error: Exception) -> None:
+        """Record a task that couldn't be imported in the rejects file."""
+        self.stats["failed"] += 1
+        self._error(task, error)
+        with open(self.rejects_path, "a") as f:
+            f.write(json.dumps({**task, "error": str(error)}) + "\n")
+
+    async def _run(self, task: dict, on_done) -> None:
+        """Import one task; on_done checkpoints it, and isn't called if deferred."""
+        fields = {key: value for key, value in task.items() if key not in capture._TASK_KEYS}
+        try:
+            for attempt in range(1, TRANSIENT_ATTEMPTS + 1):
+                await _notion_available()
+                try:
+                    result = await capture._capture_one(
+                        task["title"],
+                        task["category"],
+                        task.get("priority", "Medium"),
+                        task.get("confidence", ""),
+                        task.get("notes", ""),
+                        fields,
+                        fallback=False,
+                        single_phase=self.single_phase,
+                    )
+                except Exception as error:
+                    if not _transient(error):
+                        self.reject(task, error)
+                        on_done()
+                        return
+                    if attempt == TRANSIENT_ATTEMPTS:
+                        self.stats["deferred"] += 1
+                        self._error(task, error)
+                        return
+                else:
+                    self.stats["imported"] += 1
+                    self.stats["needs_sorting"] += result["status"] == "Needs Sorting"
+                    self.stats["saved_calls"] += result.get("saved_calls", 0)
+                    on_done()
+                    return
+        finally:
+            self.semaphore.release()
+
+
+async def bulk_import(
+    path: str,
+    fmt: str | None = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    limit: int = 0,
+) -> dict:
+    """Import the tasks in path into Notion, resuming any earlier run.
+
+    Returns:
+        A dict with counts of imported (of which needs_sorting), failed
+        (rejected), deferred (left for the next run after Notion kept
+        failing) and skipped records, Notion calls saved by single-phase
+        captures, and up to ten error messages.
+    """
+    fmt = fmt or detect_format(path)
+    checkpoint = ReplayCheckpoint(path + ".import.json", CHECKPOINT_SAVE_SECONDS)
+    importer = _Importer(max_concurrency, path + ".rejects.jsonl")
+    batch: list[tuple[int, int, dict]] = []
+    queued = 0
+
+    async def flush() -> None:
+        classify_batch([task for _, _, task in batch])
+        for start, end, task in batch:
+            await importer.submit(
+                task, lambda start=start, end=end: checkpoint.mark(start, end)
+            )
+        batch.clear()
+
+    # A resumed import reuses the same dedup session, so tasks created
+    # just before an interruption aren't created twice.
+    with idempotency.session_scope(f"import:{os.path.abspath(path)}"):
+        try:
+            for start, end, read_task in iter_records(path, fmt, checkpoint):
+                if limit and queued >= limit:
+                    break
+                try:
+                    task = read_task()
+                except ValueError as error:
+                    importer.reject({"record_offset": start}, error)
+                    checkpoint.mark(start, end)
+                    continue
+                if task is None:
+                    importer.stats["skipped"] += 1
+                    checkpoint.mark(start, end)
+                    continue
+                batch.append((start, end, task))
+                queued += 1
+                if len(batch) >= batch_size:
+                    await flush()
+            await flush()
+            await importer.drain()
+        finally:
+            checkpoint.save()
+    return importer.stats
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    try:
+        return await bulk_import(
+            args.path, args.format, args.concurrency, args.batch_size, args.limit
+        )
+    finally:
+        await aclose_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())))
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=0)
+    print(json.dumps(asyncio.run(_main(parser.parse_args())), indent=2))
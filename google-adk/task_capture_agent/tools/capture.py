@@ -0,0 +1,305 @@
+"""Server-side capture pipelines built on the async tools.
+
+Running master → topic → link as separate model tool calls costs one
+LLM turn per Notion call. These tools run the pipeline in-process and
+fan out across tasks, so the model classifies and then makes one call.
+
+With CAPTURE_WRITE_BEHIND set, they return once the master record is
+written and finish routing on the background worker in routing.py, or
+on the shared worker pool in jobqueue.py when CAPTURE_JOB_QUEUE_DB is
+set.
+
+With CAPTURE_SINGLE_PHASE set, a confidently classified task skips the
+Pending stage: the topic entry is created first and the master record
+is created already routed and linked, saving the master update call.
+The order is deliberate. Notion only returns the topic URL from the
+create, so creating both pages at once would still need a Topic Link
+update afterwards: three calls in two round trips, no better than the
+two-phase flow. Creating them in sequence is also two round trips, with
+two calls. Medium and Low confidence tasks keep the two-phase audit trail.
+
+With CAPTURE_LOCAL_STORE_DB set, they only write the task to the local
+store (store.py) and return; sync.py pushes it to Notion afterwards.
+
+While the Notion circuit breaker (breaker.py) is open, tasks go
+straight to the fallback log without attempting any Notion call.
+"""
+
+import asyncio
+import os
+import time
+
+from task_capture_agent import memo, telemetry
+from task_capture_agent.config.loader import get_config
+from task_capture_agent.tools import (
+    aio, breaker, idempotency, jobqueue, notion, routing, store, sync,
+)
+
+DEFAULT_MAX_CONCURRENCY = 5
+
+# Keys of a batch task dict that are not topic-database fields.
+_TASK_KEYS = ("title", "category", "priority", "confidence", "notes")
+
+
+def single_phase_enabled() -> bool:
+    """Whether confident captures create a finished master record (CAPTURE_SINGLE_PHASE)."""
+    return os.environ.get("CAPTURE_SINGLE_PHASE", "").lower() in ("1", "true", "yes")
+
+
+def _routing_status(category: str) -> str:
+    """Master record status for a category — unknown ones go to Needs Sorting."""
+    if category in get_config().routes and category != "Needs Sorting":
+        return "Routed"
+    return "Needs Sorting"
+
+
+async def _capture_one(
+    title: str,
+    category: str,
+    priority: str = "Medium",
+    confidence: str = "",
+    notes: str = "",
+    extra_fields: dict | None = None,
+    fallback: bool = True,
+    write_behind: bool = False,
+    single_phase: bool = False,
+) -> dict:
+    """Run one task through master → topic → link, falling back on error.
+
+    The master record and topic entry don't depend on each other, so
+    they are created concurrently; only the link update waits for both.
+    With write_behind=True only the master record is created before
+    returning, and the topic entry and link are queued on the routing
+    worker (or done inline if its queue is full). With single_phase=True
+    a Routed, High confidence task creates its topic entry first and
+    then a master record that is already routed and linked, with no
+    update. That is sequential on purpose: the master needs the topic
+    URL, which Notion only returns on create, and parallel creates plus
+    a link update would take the same two round trips with one more
+    call. With a local store configured, the task is only written there
+    and synced later. With fallback=False errors are raised instead of
+    logged, for callers such as the replayer that are already draining
+    the fallback log.
+    """
+    start = time.perf_counter()
+    status = _routing_status(category)
+    confidence = confidence or ("High" if status == "Routed" else "Low")
+    result = {"title": title, "category": category, "status": status}
+
+    async def link(master_page_id: str) -> dict:
+        topic = await aio.create_topic_entry(
+            category, title, priority, notes, **(extra_fields or {})
+        )
+        await aio.update_master_record(
+            master_page_id, status, category, topic["url"], confidence
+        )
+        routed()
+        return topic
+
+    def routed() -> None:
+        telemetry.record_capture(status, time.perf_counter() - start)
+        if status == "Routed":
+            memo.get_memo().remember(title, category, confidence, priority, extra_fields)
+
+    try:
+        if store.store_path():
+            # Deduplicated like Notion creates, so a retried call adds one row.
+            result["local_id"] = idempotency.get_cache().run_once(
+                idempotency.fingerprint("local", title),
+                lambda: {"local_id": store.get_store().add(
+                    title, category, priority, confidence, status, notes, extra_fields
+                )},
+            )["local_id"]
+            sync.get_sync_engine().nudge()
+            result.update(
+                sync="pending",
+                database_name=notion._topic_route(category).name,
+            )
+            telemetry.record_capture(status, time.perf_counter() - start)
+            return result
+        breaker.get_breaker().check()
+        if write_behind:
+            master = await aio.create_master_record(title, priority)
+            result["master_page_id"] = master["page_id"]
+            job = {
+                "master_page_id": master["page_id"], "title": title,
+                "category": category, "priority": priority, "notes": notes,
+                "extra_fields": extra_fields or {}, "status": status,
+                "confidence": confidence, "session_id": idempotency.current_session(),
+            }
+            if await _queue_link(link, job, start):
+                result.update(
+                    routing="queued",
+                    database_name=notion._topic_route(category).name,
+                )
+                return result
+            topic = await link(master["page_id"])
+        elif single_phase and status == "Routed" and confidence == "High":
+            topic = await aio.create_topic_entry(
+                category, title, priority, notes, **(extra_fields or {})
+            )
+            master = await aio._create_master_record(
+                title, priority,
+                notion._master_routing_fields(status, category, topic["url"], confidence),
+            )
+            result.update(master_page_id=master["page_id"], saved_calls=1)
+            telemetry.record_saved_call("single_phase")
+            routed()
+        else:
+            master, topic = await asyncio.gather(
+                aio.create_master_record(title, priority),
+                aio.create_topic_entry(
+                    category, title, priority, notes, **(extra_fields or {})
+                ),
+            )
+            result["master_page_id"] = master["page_id"]
+            await aio.update_master_record(
+                master["page_id"], status, category, topic["url"], confidence
+            )
+            routed()
+        result.update(topic_url=topic["url"], database_name=topic["database_name"])
+    except Exception as error:
+        if not fallback:
+            raise
+        logged = await aio.log_fallback(
+            title, category, priority, error_message=str(error)
+        )
+        result.update(status="Fallback", error=str(error), fallback=logged)
+        telemetry.record_capture("Fallback", time.perf_counter() - start)
+    return result
+
+
+async def _queue_link(link, job: dict, start: float) -> bool:
+    """Hand the routing steps to the background. False if the queue is full.
+
+    They go to the shared job queue when CAPTURE_JOB_QUEUE_DB is set,
+    otherwise to this process's routing worker as link(). Publishing is
+    a SQLite commit, so it runs in the executor, off the event loop.
+    """
+    if jobqueue.queue_path():
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, jobqueue.publish_route, job)
+        return True
+
+    async def on_failure(error: BaseException) -> None:
+        reason = "shutdown before routing finished" if isinstance(
+            error, asyncio.CancelledError
+        ) else str(error)
+        await aio.log_fallback(
+            job["title"], job["category"], job["priority"],
+            error_message=f"Routing failed, master record {job['master_page_id']} "
+                          f"left Pending: {reason}",
+        )
+        telemetry.record_capture("Fallback", time.perf_counter() - start)
+
+    return routing.get_routing_worker().submit(
+        lambda: link(job["master_page_id"]), on_failure
+    )
+
+
+@telemetry.traced_tool
+async def capture_task(
+    title: str,
+    category: str,
+    confidence: str = "High",
+    priority: str = "Medium",
+    notes: str = "",
+    extra_fields: dict | None = None,
+    tool_context=None,
+) -> dict:
+    """Capture one classified task: log it, route it, and link the two.
+
+    Call this ONCE per task, after classification. It creates the master
+    intake record, creates the entry in the topic database for the
+    category, and links the master record to it. If Notion fails, the
+    task is written to the fallback log automatically — do NOT call
+    log_fallback yourself. Repeating a call for the same task in the
+    same session returns the pages already created instead of
+    duplicating them.
+
+    Args:
+        title: The task text.
+        category: The classified category (e.g., "Shopping / Errands").
+            Use "Needs Sorting" when unsure.
+        confidence: Classification confidence — "High", "Medium", or "Low".
+        priority: Task priority — High, Medium, or Low. Defaults to Medium.
+        notes: Optional additional context or notes.
+        extra_fields: Optional domain-specific fields as a dict of
+            snake_case name → value, as for create_topic_entry (e.g.
+            {"location": "Target"} or {"project": "api"}). For Needs
+            Sorting, pass suggested_category and reason here.
+
+    Returns:
+        A dict with status ("Routed", "Needs Sorting", or "Fallback"),
+        category, database_name and topic_url, or error for fallback.
+        With routing "queued" the task is logged and is being routed in
+        the background; there is no topic_url yet.
+    """
+    with idempotency.session_scope(idempotency.session_id_from(tool_context)):
+        return await _capture_one(
+            title, category, priority, confidence, notes, extra_fields,
+            write_behind=routing.write_behind_enabled(),
+            single_phase=single_phase_enabled(),
+        )
+
+
+@telemetry.traced_tool
+async def capture_batch(
+    tasks: list[dict],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    tool_context=None,
+) -> dict:
+    """Capture several already-classified tasks in one call.
+
+    Use this when the user gives more than one task in a message.
+    Classify every task first, then pass them all here. Each task is
+    logged to the master database, routed to its topic database and
+    linked, with tasks processed concurrently. Any task whose Notion
+    calls fail is written to the fallback log automatically — do NOT
+    call log_fallback yourself for tasks passed here.
+
+    Args:
+        tasks: One dict per task with keys:
+            - title: The task text (required).
+            - category: The classified category (required).
+            - priority: High, Medium, or Low. Defaults to Medium.
+            - confidence: High, Medium, or Low.
+            - notes: Optional additional context.
+            - Any domain-specific fields, as for create_topic_entry
+              (e.g. location, project, company, suggested_category).
+        max_concurrency: Maximum tasks in flight at once. Defaults to 5.
+
+    Returns:
+        A dict with counts of captured and fallback tasks, Notion calls
+        saved by single-phase captures, and a results
+        list in input order with each task's status, category,
+        database_name and topic_url (or error for fallback tasks, or
+        routing "queued" for tasks still being routed in the background).
+    """
+    write_behind = routing.write_behind_enabled()
+    single_phase = single_phase_enabled()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def bounded(task: dict) -> dict:
+        extra_fields = {k: v for k, v in task.items() if k not in _TASK_KEYS}
+        async with semaphore:
+            return await _capture_one(
+                task["title"],
+                task.get("category", "Needs Sorting"),
+                task.get("priority") or "Medium",
+                task.get("confidence", ""),
+                task.get("notes", ""),
+                extra_fields,
+                write_behind=write_behind,
+                single_phase=single_phase,
+            )
+
+    with idempotency.session_scope(idempotency.session_id_from(tool_context)):
+        results = await asyncio.gather(*(bounded(task) for task in tasks))
+    fallback_count = sum(1 for r in results if r["status"] == "Fallback")
+    return {
+        "captured": len(results) - fallback_count,
+        "fallback": fallback_count,
+        "saved_calls": sum(r.get("saved_calls", 0) for r in results),
+        "results": list(results),
+    }
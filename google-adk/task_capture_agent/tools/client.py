@@ -0,0 +1,178 @@
+"""Shared Notion client for the task capture tools.
+
+One capture makes three Notion calls. Building a fresh client for each
+of them means a fresh connection and TLS handshake every time, so the
+tools share a single keep-alive connection pool per process instead.
+
+notion_client and httpx are imported on first use rather than at import
+time, so loading the agent doesn't pay for them before the first request.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+    from notion_client import AsyncClient, Client
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_KEEPALIVE_SECONDS = 60.0
+
+
+def _env_number(name: str, default, cast=float):
+    """Read a numeric setting from the environment, falling back to default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return cast(value)
+
+
+class NotionClientManager:
+    """Owns the process-wide Notion client and its connection pool.
+
+    The client is built lazily on first use and reused by every tool
+    call. httpx connection pools are thread-safe, so the same client can
+    be shared by concurrent tool invocations. Async clients are bound to
+    the event loop that created them, so one is kept per running loop.
+
+    Settings are read from the environment unless passed explicitly:
+        NOTION_POOL_SIZE: Maximum open connections (default 10).
+        NOTION_TIMEOUT_SECONDS: Per-request timeout (default 30).
+        NOTION_KEEPALIVE_SECONDS: How long idle connections are kept (default 60).
+        NOTION_BASE_URL: API root, e.g. a local notion_standin server
+            (default https://api.notion.com).
+    """
+
+    def __init__(
+        self,
+        pool_size: int | None = None,
+        timeout: float | None = None,
+        keepalive_expiry: float | None = None,
+        base_url: str | None = None,
+    ):
+        self.pool_size = pool_size or _env_number(
+            "NOTION_POOL_SIZE", DEFAULT_POOL_SIZE, int
+        )
+        self.timeout = timeout or _env_number(
+            "NOTION_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS
+        )
+        self.keepalive_expiry = keepalive_expiry or _env_number(
+            "NOTION_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS
+        )
+        self.base_url = base_url or os.environ.get("NOTION_BASE_URL") or None
+        self._lock = threading.Lock()
+        self._client: "Client | None" = None
+        self._auth: str | None = None
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _limits(self) -> "httpx.Limits":
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _base_url_option(self) -> dict:
+        return {"base_url": self.base_url.rstrip("/")} if self.base_url else {}
+
+    def get_client(self) -> "Client":
+        """Return the shared client, creating it on first use.
+
+        If NOTION_API_KEY changes, the old client is closed and a new
+        one is built for the new token.
+        """
+        auth = os.environ["NOTION_API_KEY"]
+        client = self._client
+        if client is not None and self._auth == auth:
+            return client
+
+        with self._lock:
+            if self._client is not None and self._auth == auth:
+                return self._client
+            if self._client is not None:
+                self._client.close()
+            import httpx
+            from notion_client import Client
+
+            self._client = Client(
+                client=httpx.Client(limits=self._limits()),
+                auth=auth,
+                timeout_ms=int(self.timeout * 1000),
+                # Retries are coordinated across calls by ratelimit.py.
+                retry=False,
+                **self._base_url_option(),
+            )
+            self._auth = auth
+            return self._client
+
+    def get_async_client(self) -> "AsyncClient":
+        """Return the async client for the running event loop.
+
+        Must be called from inside a coroutine.
+        """
+        auth = os.environ["NOTION_API_KEY"]
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async_clients.get(loop)
+            if entry is not None and entry[0] == auth:
+                return entry[1]
+            import httpx
+            from notion_client import AsyncClient
+
+            client = AsyncClient(
+                client=httpx.AsyncClient(limits=self._limits()),
+                auth=auth,
+                timeout_ms=int(self.timeout * 1000),
+                # Retries are coordinated across calls by ratelimit.py.
+                retry=False,
+                **self._base_url_option(),
+            )
+            self._async_clients[loop] = (auth, client)
+            return client
+
+    async def aclose(self) -> None:
+        """Close the async client bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async_clients.pop(loop, None)
+        if entry is not None:
+            await entry[1].aclose()
+
+    def close(self) -> None:
+        """Close the connection pool. The next get_client() builds a new one."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._auth = None
+
+
+_manager = NotionClientManager()
+atexit.register(_manager.close)
+
+
+def get_client() -> "Client":
+    """Return the process-wide Notion client."""
+    return _manager.get_client()
+
+
+def get_async_client() -> "AsyncClient":
+    """Return the Notion async client for the running event loop."""
+    return _manager.get_async_client()
+
+
+def close_clients() -> None:
+    """Close the process-wide Notion client and release its connections."""
+    _manager.close()
+
+
+async def aclose_clients() -> None:
+    """Close the async Notion client bound to the running event loop."""
+    await _manager.aclose()
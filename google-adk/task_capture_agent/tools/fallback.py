@@ -1,13 +1,44 @@
 """Google Sheets fallback logging for when Notion API is unavailable.
 
-Ensures no captured task is lost even if Notion is down.
+Ensures no captured task is lost even if Notion is down. Every entry is
+fsynced to the local journal before log_fallback returns. With Sheets
+configured, the row is then also buffered for the fallback Sheet, and
+its journal entry is marked handed off once the row is written there.
+If the process dies first, the journal entry is still pending and is
+replayed from the journal.
 """
 
 import os
-import json
 from datetime import datetime, timezone
 
+from task_capture_agent import telemetry
+from task_capture_agent.tools.journal import get_journal
+from task_capture_agent.tools.sheets import get_sheets_sink
 
+
+def local_log_path() -> str:
+    """Path of the legacy single-file JSONL log, read only by the replayer."""
+    return os.path.join(
+        os.path.dirname(__file__), "..", "..", "fallback_log.jsonl"
+    )
+
+
+def write_local_entries(entries: list[dict]) -> str:
+    """Durably append entries to the local fallback journal.
+
+    Returns the journal directory.
+    """
+    journal = get_journal()
+    journal.append_many(entries)
+    return journal.directory
+
+
+def _rows_written(locations: list[tuple[int, int]]) -> None:
+    """Mark journal entries whose rows reached the fallback Sheet as handed off."""
+    get_journal().mark_replayed_many(locations)
+
+
+@telemetry.traced_tool
 def log_fallback(
     title: str,
     category: str = "Unknown",
@@ -16,8 +47,9 @@ def log_fallback(
 ) -> dict:
     """Log a task to the Google Sheets fallback when Notion API fails.
 
-    This is a safety net — call it only when create_master_record or
-    create_topic_entry fails due to a Notion API error.
+    This is a safety net — call it only when a capture tool call fails
+    outright. capture_task and capture_batch already log their own
+    Notion failures here.
 
     Args:
         title: The raw task text.
@@ -30,34 +62,25 @@ def log_fallback(
     """
     creds_path = os.environ.get("GOOGLE_SHEETS_CREDENTIALS_PATH")
     sheet_id = os.environ.get("GOOGLE_SHEETS_FALLBACK_ID")
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "title": title,
+        "category": category,
+        "priority": priority,
+        "error": error_message,
+        "source": "Google ADK",
+    }
 
     if not creds_path or not sheet_id:
         # No Sheets configured — log locally as last resort
-        entry = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "title": title,
-            "category": category,
-            "priority": priority,
-            "error": error_message,
-            "source": "Google ADK",
-        }
-        fallback_path = os.path.join(
-            os.path.dirname(__file__), "..", "..", "fallback_log.jsonl"
-        )
-        with open(fallback_path, "a") as f:
-            f.write(json.dumps(entry) + "\n")
+        fallback_path = write_local_entries([entry])
+        telemetry.record_fallback("local_file")
         return {"logged_to": "local_file", "path": fallback_path}
 
-    import gspread
-    from google.oauth2.service_account import Credentials
-
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
-    gc = gspread.authorize(creds)
-    sheet = gc.open_by_key(sheet_id).sheet1
-
+    # Durable in the journal before returning; the Sheet copy is batched.
+    location = get_journal().append({**entry, "sheet_id": sheet_id})
     row = [
-        datetime.now(timezone.utc).isoformat(),
+        entry["timestamp"],
         title,
         category,
         priority,
@@ -65,5 +88,6 @@ def log_fallback(
         "Pending",
         error_message,
     ]
-    sheet.append_row(row)
+    get_sheets_sink(creds_path, sheet_id, written=_rows_written).append(row, location)
+    telemetry.record_fallback("google_sheets")
     return {"logged_to": "google_sheets", "sheet_id": sheet_id}
@@ -0,0 +1,244 @@
+"""Idempotent page creation for the capture tools.
+
+When the model retries a slow tool call, or the user resends a message,
+the same task would otherwise be created in Notion twice. Creates are
+keyed on a normalized fingerprint of the task plus the chat session, and
+a repeat inside the dedup window returns the original page_id and url
+without touching Notion. A repeat that arrives while the first call is
+still in flight waits for it instead of racing it.
+
+Results live in an in-memory LRU with a TTL, and optionally in a SQLite
+file so the window survives restarts and is shared between processes.
+With a local task store (CAPTURE_LOCAL_STORE_DB) the SQLite layer is
+always on: store rows are retried across restarts, so the window has to
+survive them too.
+
+Settings are read from the environment:
+    CAPTURE_DEDUP_TTL_SECONDS: Dedup window (default 600; 0 disables).
+    CAPTURE_DEDUP_MAX_ENTRIES: In-memory LRU size (default 2048).
+    CAPTURE_DEDUP_DB: Path of the optional SQLite store (default: the
+        local task store file, when one is configured).
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+DEFAULT_TTL_SECONDS = 600.0
+DEFAULT_MAX_ENTRIES = 2048
+
+_session_id = contextvars.ContextVar("capture_session_id", default="")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def fingerprint(kind: str, *parts: str) -> str:
+    """Stable key for a create call in the current session."""
+    material = "\x1f".join([kind, _session_id.get(), *(normalize(p) for p in parts)])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+@contextmanager
+def session_scope(session_id: str):
+    """Attribute creates made inside the block to a chat session."""
+    token = _session_id.set(session_id or "")
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+def current_session() -> str:
+    """The session creates are currently attributed to, for handing to a worker."""
+    return _session_id.get()
+
+
+def session_id_from(tool_context) -> str:
+    """Session ID from an ADK ToolContext, or "" outside the agent."""
+    session = getattr(tool_context, "session", None)
+    return getattr(session, "id", "") or ""
+
+
+class _SqliteStore:
+    """Shared on-disk layer of the cache, safe across processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS dedup "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str, now: float):
+        row = self._connect().execute(
+            "SELECT value, expires FROM dedup WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, value: dict, expires: float) -> None:
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO dedup (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires),
+            )
+            db.execute("DELETE FROM dedup WHERE expires <= ?", (time.time(),))
+
+
+class IdempotencyCache:
+    """LRU-with-TTL of create results, with single-flight for duplicates."""
+
+    def __init__(
+        self,
+        ttl: float | None = None,
+        max_entries: int | None = None,
+        db_path: str | None = None,
+    ):
+        self.ttl = ttl if ttl is not None else float(
+            os.environ.get("CAPTURE_DEDUP_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+        )
+        self.max_entries = max_entries or int(
+            os.environ.get("CAPTURE_DEDUP_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        db_path = db_path or os.environ.get("CAPTURE_DEDUP_DB") or os.environ.get(
+            "CAPTURE_LOCAL_STORE_DB"
+        )
+        self._store = _SqliteStore(db_path) if db_path else None
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._in_flight: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> dict | None:
+        """Cached result for key, if still inside the dedup window."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+        if self._store is not None:
+            stored = self._store.get(key, now)
+            if stored is not None:
+                with self._lock:
+                    self._remember(key, *stored)
+                return stored[0]
+        return None
+
+    def put(self, key: str, value: dict) -> None:
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+        if self._store is not None:
+            self._store.put(key, value, expires)
+
+    def _remember(self, key: str, value: dict, expires: float) -> None:
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _claim(self, key: str) -> tuple[Future, bool]:
+        """Return (future, owner). Only the owner runs the create."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _settle(self, key: str, future: Future, result=None, error=None) -> None:
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run_once(self, key: str, fn) -> dict:
+        """Return the cached result for key, or call fn() and cache it."""
+        if self.ttl <= 0:
+            return fn()
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return {**cached, "deduplicated": True}
+        future, owner = self._claim(key)
+        if not owner:
+            self.hits += 1
+            return {**future.result(), "deduplicated": True}
+        self.misses += 1
+        try:
+            result = fn()
+        except BaseException as error:
+            self._settle(key, future, error=error)
+            raise
+        self.put(key, result)
+        self._settle(key, future, result=result)
+        return result
+
+    async def arun_once(self, key: str, coro_fn) -> dict:
+        """Async run_once: await coro_fn() unless key is cached or in flight."""
+        if self.ttl <= 0:
+            return await coro_fn()
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return {**cached, "deduplicated": True}
+        future, owner = self._claim(key)
+        if not owner:
+            self.hits += 1
+            return {**await asyncio.wrap_future(future), "deduplicated": True}
+        self.misses += 1
+        try:
+            result = await coro_fn()
+        except BaseException as error:
+            self._settle(key, future, error=error)
+            raise
+        self.put(key, result)
+        self._settle(key, future, result=result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache: IdempotencyCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> IdempotencyCache:
+    """Return the process-wide idempotency cache, built on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = IdempotencyCache()
+        return _cache
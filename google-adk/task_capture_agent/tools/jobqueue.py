@@ -0,0 +1,406 @@
+"""Durable routing job queue shared by agent replicas and worker processes.
+
+With write-behind routing, each replica finishes its own captures, so a
+stalled replica's routing stalls with it and nothing limits how many
+Notion calls all replicas make at once. Pointing CAPTURE_JOB_QUEUE_DB at
+a SQLite file (WAL mode, on a disk the replicas share) makes the
+capture pipeline publish the routing steps — topic entry, then master
+link — as a job instead, and a pool of worker processes drains it:
+
+    python -m task_capture_agent.tools.jobqueue --workers 4
+
+Workers lease jobs for a visibility timeout. A job whose worker dies is
+leased again once its lease expires, so work moves to whichever worker
+is free. Failed jobs are retried with exponential backoff; after
+max_attempts they are dead-lettered: marked dead and written to the
+fallback log, naming the master record left Pending. Workers stop
+leasing while their Notion circuit breaker is open.
+
+The rate limit is per process: the pool splits its NOTION_RATE_PER_SECOND
+across its own workers, but each agent replica still creates master
+records at its own NOTION_RATE_PER_SECOND, and so does any other pool.
+Nothing coordinates them through the queue, so give each process its
+share of Notion's limit, e.g. with NOTION_RATE_PER_SECOND=1 on two
+replicas and --rate 1 on the pool to stay within 3 requests/second.
+
+Usage:
+    python -m task_capture_agent.tools.jobqueue --workers 4 [--db jobs.sqlite] [--rate N]
+    python -m task_capture_agent.tools.jobqueue --stats
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from task_capture_agent.tools import breaker
+from task_capture_agent.tools.ratelimit import DEFAULT_RATE_PER_SECOND
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_SECONDS = 2.0
+MAX_RETRY_DELAY_SECONDS = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at);
+"""
+
+_JOB_COLUMNS = "id, kind, payload, state, attempts, last_error"
+
+
+def queue_path() -> str | None:
+    """The shared queue file from CAPTURE_JOB_QUEUE_DB, if configured."""
+    return os.environ.get("CAPTURE_JOB_QUEUE_DB") or None
+
+
+def _job(row) -> dict:
+    return {
+        "id": row[0],
+        "kind": row[1],
+        "payload": json.loads(row[2]),
+        "state": json.loads(row[3]),
+        "attempts": row[4],
+        "last_error": row[5],
+    }
+
+
+class JobQueue:
+    """SQLite-backed queue with leases, retries and a dead-letter state.
+
+    Settings are read from the environment unless passed explicitly:
+        CAPTURE_JOB_LEASE_SECONDS: Visibility timeout of a lease (default 60).
+        CAPTURE_JOB_MAX_ATTEMPTS: Attempts before dead-lettering (default 5).
+
+    Every method is safe to call from several threads and processes;
+    each thread gets its own connection.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float | None = None,
+        max_attempts: int | None = None,
+        retry_base: float = DEFAULT_RETRY_BASE_SECONDS,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds or float(
+            os.environ.get("CAPTURE_JOB_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)
+        )
+        self.max_attempts = max_attempts or int(
+            os.environ.get("CAPTURE_JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+        )
+        self.retry_base = retry_base
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def publish(self, kind: str, payload: dict, key: str | None = None) -> int | None:
+        """Add a job. Returns its id, or None if a job with key already exists."""
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                "INSERT OR IGNORE INTO jobs "
+                "(key, kind, payload, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) RETURNING id",
+                (key, kind, json.dumps(payload), now, now, now),
+            ).fetchone()
+        return row[0] if row else None
+
+    def lease(self, owner: str, limit: int = 1) -> list[dict]:
+        """Claim up to limit ready jobs for owner.
+
+        Ready means queued and due, or leased with an expired lease and
+        attempts to spare. Each lease counts as an attempt.
+        """
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? "
+                "WHERE id IN (SELECT id FROM jobs WHERE "
+                "(status = 'queued' AND available_at <= ?) OR "
+                "(status = 'leased' AND lease_expires <= ? AND attempts < ?) "
+                "ORDER BY available_at, id LIMIT ?) "
+                f"RETURNING {_JOB_COLUMNS}",
+                (owner, now + self.lease_seconds, now, now, now, self.max_attempts, limit),
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def reap(self) -> list[dict]:
+        """Dead-letter leased jobs that expired on their last attempt.
+
+        Their workers died or hung, so nothing else will fail them.
+        Returns the jobs, for the caller to hand to the fallback path.
+        """
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute(
+                "UPDATE jobs SET status = 'dead', lease_owner = NULL, updated_at = ?, "
+                "last_error = COALESCE(last_error, 'lease expired') "
+                "WHERE status = 'leased' AND lease_expires <= ? AND attempts >= ? "
+                f"RETURNING {_JOB_COLUMNS}",
+                (now, now, self.max_attempts),
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def _update_lease(self, job: dict, owner: str, sql: str, params: tuple) -> bool:
+        with self._connect() as db:
+            cursor = db.execute(
+                f"UPDATE jobs SET {sql}, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (*params, time.time(), job["id"], owner),
+            )
+        return cursor.rowcount == 1
+
+    def checkpoint(self, job: dict, owner: str) -> bool:
+        """Save job["state"] and extend the lease. False if the lease was lost.
+
+        The state is saved even when the lease was lost (unless the job
+        is finished), so whichever worker holds the job now sees the
+        work already done instead of repeating it.
+        """
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? AND status != 'done'",
+                (json.dumps(job["state"]), time.time(), job["id"]),
+            )
+        return self._update_lease(
+            job, owner, "lease_expires = ?", (time.time() + self.lease_seconds,)
+        )
+
+    def saved_state(self, job: dict) -> dict:
+        """The job's latest checkpointed state, which may be newer than its lease's."""
+        row = self._connect().execute(
+            "SELECT state FROM jobs WHERE id = ?", (job["id"],)
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def complete(self, job: dict, owner: str) -> bool:
+        """Mark a leased job done. False if the lease was lost."""
+        return self._update_lease(job, owner, "status = 'done', lease_owner = NULL", ())
+
+    def fail(self, job: dict, owner: str, error: str) -> str | None:
+        """Record a failed attempt; requeue with backoff or dead-letter.
+
+        Returns the job's new status ("queued" or "dead"), or None if
+        the lease was lost.
+        """
+        if job["attempts"] >= self.max_attempts:
+            status, available_at = "dead", time.time()
+        else:
+            delay = min(MAX_RETRY_DELAY_SECONDS, self.retry_base * 2 ** (job["attempts"] - 1))
+            status, available_at = "queued", time.time() + delay
+        updated = self._update_lease(
+            job, owner,
+            "status = ?, lease_owner = NULL, available_at = ?, last_error = ?, state = ?",
+            (status, available_at, error, json.dumps(job["state"])),
+        )
+        return status if updated else None
+
+    def stats(self) -> dict:
+        """Job counts by status, and the age of the oldest ready job."""
+        db = self._connect()
+        counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        oldest = db.execute(
+            "SELECT MIN(created_at) FROM jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+        return {
+            **{status: counts.get(status, 0) for status in ("queued", "leased", "done", "dead")},
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+        }
+
+    def dead_letters(self, limit: int = 100) -> list[dict]:
+        """Most recent dead jobs, newest first."""
+        rows = self._connect().execute(
+            f"SELECT {_JOB_COLUMNS} FROM jobs WHERE status = 'dead' "
+            "ORDER BY updated_at DESC LIMIT ?", (limit,),
+        ).fetchall()
+        return [_job(row) for row in rows]
+
+
+# --- job handlers ---
+
+def _route(queue: JobQueue, job: dict, owner: str) -> None:
+    """Create the topic entry, then link the master record to it.
+
+    Runs in the capturing session, so the topic create is deduplicated
+    per session as it would be inline. The topic entry is checkpointed
+    before the link update and the checkpoint is re-read before creating
+    it, so neither a retry after a failed link nor a worker that took
+    over an expired lease creates the entry twice.
+    """
+    from task_capture_agent.tools import idempotency, notion
+
+    payload, state = job["payload"], job["state"]
+    state.update(queue.saved_state(job))
+    with idempotency.session_scope(payload.get("session_id", "")):
+        if "topic_url" not in state:
+            topic = notion.create_topic_entry(
+                payload["category"], payload["title"], payload["priority"],
+                payload["notes"], **payload["extra_fields"],
+            )
+            state.update(topic_page_id=topic["page_id"], topic_url=topic["url"])
+            if not queue.checkpoint(job, owner):
+                raise RuntimeError("lease expired; another worker has the job")
+        notion.update_master_record(
+            payload["master_page_id"], payload["status"], payload["category"],
+            state["topic_url"], payload["confidence"],
+        )
+    if payload["status"] == "Routed":
+        from task_capture_agent import memo
+
+        memo.get_memo().remember(
+            payload["title"], payload["category"], payload["confidence"],
+            payload["priority"], payload["extra_fields"],
+        )
+
+
+def _dead_letter_route(job: dict) -> None:
+    from task_capture_agent.tools import fallback
+
+    payload = job["payload"]
+    fallback.log_fallback(
+        payload["title"], payload["category"], payload["priority"],
+        error_message=(
+            f"Routing job {job['id']} dead after {job['attempts']} attempts, "
+            f"master record {payload['master_page_id']} left Pending: {job['last_error']}"
+        ),
+    )
+
+
+HANDLERS = {"route": (_route, _dead_letter_route)}
+
+
+def publish_route(payload: dict, path: str | None = None) -> int | None:
+    """Queue the routing steps of one capture. payload is as _route expects."""
+    return get_queue(path).publish(
+        "route", payload, key=f"route:{payload['master_page_id']}"
+    )
+
+
+def process_one(queue: JobQueue, owner: str) -> bool:
+    """Lease and run one job. Returns False if none was ready."""
+    for job in queue.reap():
+        HANDLERS[job["kind"]][1](job)
+    jobs = queue.lease(owner)
+    if not jobs:
+        return False
+    job = jobs[0]
+    handle, dead_letter = HANDLERS[job["kind"]]
+    try:
+        handle(queue, job, owner)
+    except Exception as error:
+        job["last_error"] = str(error)
+        if queue.fail(job, owner, str(error)) == "dead":
+            dead_letter(job)
+    else:
+        queue.complete(job, owner)
+    return True
+
+
+def run_worker(path: str, owner: str, stop, poll_interval: float = 0.5) -> None:
+    """Process jobs until stop (a threading or multiprocessing Event) is set."""
+    queue = JobQueue(path)
+    while not stop.is_set():
+        # While Notion is down, jobs wait in the queue instead of using up attempts.
+        if not breaker.get_breaker().available() or not process_one(queue, owner):
+            stop.wait(poll_interval)
+
+
+def _worker_process(path: str, owner: str, stop) -> None:
+    import signal
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The pool parent handles Ctrl-C.
+    run_worker(path, owner, stop)
+
+
+def run_pool(path: str, workers: int, rate: float | None = None) -> None:
+    """Run worker processes until SIGINT/SIGTERM, then let them finish their job.
+
+    rate (default NOTION_RATE_PER_SECOND) is this pool's Notion budget,
+    split across its workers. Other processes calling Notion have their
+    own; see the module docstring.
+    """
+    # Imported here, not at module level: the agent imports this module.
+    import multiprocessing
+    import signal
+    import socket
+
+    # Children inherit the environment: give each its share of the pool's rate.
+    total_rate = rate or float(os.environ.get("NOTION_RATE_PER_SECOND", DEFAULT_RATE_PER_SECOND))
+    os.environ["NOTION_RATE_PER_SECOND"] = str(total_rate / workers)
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    processes = [
+        context.Process(
+            target=_worker_process,
+            args=(path, f"{socket.gethostname()}:{os.getpid()}:{n}", stop),
+            name=f"routing-worker-{n}",
+        )
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for process in processes:
+            process.join()
+
+
+_queues: dict[str, JobQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(path: str | None = None) -> JobQueue:
+    """Return the process-wide queue for path (default CAPTURE_JOB_QUEUE_DB)."""
+    path = os.path.abspath(path or queue_path())
+    with _queues_lock:
+        queue = _queues.get(path)
+        if queue is None:
+            queue = _queues[path] = JobQueue(path)
+        return queue
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=queue_path(), help="Queue file (default CAPTURE_JOB_QUEUE_DB)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--rate", type=float, help="Notion requests/second for the whole pool (default NOTION_RATE_PER_SECOND)"
+    )
+    parser.add_argument("--stats", action="store_true", help="Print queue stats and exit")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("set CAPTURE_JOB_QUEUE_DB or pass --db")
+    if args.stats:
+        print(json.dumps(get_queue(args.db).stats(), indent=2))
+    else:
+        run_pool(args.db, args.workers, args.rate)
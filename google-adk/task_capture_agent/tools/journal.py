@@ -0,0 +1,390 @@
+"""Segmented, append-only local fallback log.
+
+The local fallback log must survive crashes and concurrent writers from
+several worker processes, and must not grow without bound. Entries are
+appended to numbered segment files in a log directory:
+
+    00000001.jsonl   one JSON entry per line
+    00000001.idx     8-byte creation time, then 12 bytes per entry:
+                     byte offset (u64) + length (u32)
+    00000001.done    8 bytes per replayed entry: its byte offset (u64)
+
+Writers hold an advisory lock (flock on the directory's .lock file)
+while appending, so lines from different processes never interleave.
+Durability uses group commit: each writer waits until its entry has
+been fsynced, but one fsync covers every entry written before it, so a
+burst of writers shares a few fsyncs instead of paying one each. Replay
+marks are committed the same way.
+
+The active segment is rotated once it reaches max_segment_bytes or
+max_segment_age seconds. Readers compare the .idx and .done sizes to
+skip fully replayed segments without opening them, and read pending
+entries by offset instead of rescanning the whole log. Each process
+keeps the replayed offsets it has seen per segment in memory and only
+reads marks appended since, so marking an entry doesn't reread the
+segment's .done file. compact() deletes sealed segments once everything
+in them has been replayed.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use only.
+    fcntl = None
+
+DEFAULT_MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_SEGMENT_SECONDS = 24 * 60 * 60
+
+_INDEX_HEADER = struct.Struct("<d")
+_INDEX_RECORD = struct.Struct("<QI")
+_DONE_RECORD = struct.Struct("<Q")
+
+
+def default_log_dir() -> str:
+    """Directory of the local fallback log, from FALLBACK_LOG_DIR if set."""
+    return os.environ.get("FALLBACK_LOG_DIR") or os.path.join(
+        os.path.dirname(__file__), "..", "..", "fallback_log"
+    )
+
+
+class FallbackJournal:
+    """Segmented append-only log of fallback entries.
+
+    Safe to share between threads, and between processes pointing at the
+    same directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES,
+        max_segment_age: float = DEFAULT_MAX_SEGMENT_SECONDS,
+        fsync: bool = True,
+    ):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self._write_lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._segment: int | None = None
+        self._segment_created = 0.0
+        self._data_fd: int | None = None
+        self._index_fd: int | None = None
+
+        # Replay marks: open .done fds, offsets seen so far and bytes read, per segment.
+        self._done_fds: dict[int, int] = {}
+        self._done: dict[int, set[int]] = {}
+        self._done_read: dict[int, int] = {}
+        self._dirty_fds: set[int] = set()
+
+        # Group commit state: sequence numbers of written and synced batches.
+        self._sync_cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+
+    # --- locking and segment files ---
+
+    @contextmanager
+    def _locked(self):
+        """Hold the in-process lock and the cross-process advisory lock."""
+        with self._write_lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _path(self, segment: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{segment:08d}.{suffix}")
+
+    def segments(self) -> list[int]:
+        """Segment numbers on disk, oldest first."""
+        return sorted(
+            int(name[:-6]) for name in os.listdir(self.directory)
+            if name.endswith(".jsonl") and name[:-6].isdigit()
+        )
+
+    def _close_segment(self) -> None:
+        for fd in (self._data_fd, self._index_fd):
+            if fd is not None:
+                if self.fsync:
+                    os.fsync(fd)
+                os.close(fd)
+        self._data_fd = self._index_fd = None
+        self._segment = None
+
+    def _open_segment(self, segment: int) -> None:
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        self._data_fd = os.open(self._path(segment, "jsonl"), flags, 0o644)
+        self._index_fd = os.open(self._path(segment, "idx"), flags, 0o644)
+        self._segment = segment
+        if os.fstat(self._index_fd).st_size < _INDEX_HEADER.size:
+            os.ftruncate(self._index_fd, 0)
+            os.write(self._index_fd, _INDEX_HEADER.pack(time.time()))
+        with open(self._path(segment, "idx"), "rb") as f:
+            (self._segment_created,) = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+        self._repair(segment)
+
+    def _repair(self, segment: int) -> None:
+        """Bring a segment back to a consistent state after a crash.
+
+        A torn index record is dropped, complete lines written after the
+        last index record are indexed, and a torn trailing line is cut
+        off so the next append starts on a fresh line.
+        """
+        index_size = os.fstat(self._index_fd).st_size
+        torn = (index_size - _INDEX_HEADER.size) % _INDEX_RECORD.size
+        if torn:
+            index_size -= torn
+            os.ftruncate(self._index_fd, index_size)
+        indexed_end = 0
+        if index_size > _INDEX_HEADER.size:
+            with open(self._path(segment, "idx"), "rb") as f:
+                f.seek(index_size - _INDEX_RECORD.size)
+                offset, length = _INDEX_RECORD.unpack(f.read(_INDEX_RECORD.size))
+                indexed_end = offset + length
+        with open(self._path(segment, "jsonl"), "rb") as f:
+            f.seek(indexed_end)
+            offset = indexed_end
+            while (line := f.readline()).endswith(b"\n"):
+                os.write(self._index_fd, _INDEX_RECORD.pack(offset, len(line)))
+                offset += len(line)
+        if os.fstat(self._data_fd).st_size > offset:
+            os.ftruncate(self._data_fd, offset)
+
+    def _active_segment(self) -> None:
+        """Make sure the writer holds the newest segment, rotating if due.
+
+        Must be called with the locks held. Another process may have
+        rotated since our last write, so the directory is checked.
+        """
+        latest = max(self.segments(), default=0)
+        if self._segment != latest or latest == 0:
+            self._close_segment()
+            self._open_segment(latest or 1)
+        size = os.fstat(self._data_fd).st_size
+        age = time.time() - self._segment_created
+        if size >= self.max_segment_bytes or (size and age >= self.max_segment_age):
+            next_segment = self._segment + 1
+            self._close_segment()
+            self._open_segment(next_segment)
+
+    # --- writing ---
+
+    def append(self, entry: dict) -> tuple[int, int]:
+        """Durably append one entry. Returns its (segment, offset)."""
+        return self.append_many([entry])[0]
+
+    def append_many(self, entries: list[dict]) -> list[tuple[int, int]]:
+        """Durably append entries as one batch. Returns their locations."""
+        payloads = [(json.dumps(entry) + "\n").encode() for entry in entries]
+        with self._locked():
+            self._active_segment()
+            offset = os.fstat(self._data_fd).st_size
+            locations, index = [], []
+            for payload in payloads:
+                locations.append((self._segment, offset))
+                index.append(_INDEX_RECORD.pack(offset, len(payload)))
+                offset += len(payload)
+            os.write(self._data_fd, b"".join(payloads))
+            os.write(self._index_fd, b"".join(index))
+            sequence = self._next_sequence()
+        if self.fsync:
+            self._commit(sequence)
+        return locations
+
+    def _next_sequence(self) -> int:
+        with self._sync_cond:
+            self._written += 1
+            return self._written
+
+    def _commit(self, sequence: int) -> None:
+        """Wait until batch `sequence` is on disk, fsyncing as leader if needed."""
+        with self._sync_cond:
+            while self._synced < sequence:
+                if self._syncing:
+                    self._sync_cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                self._sync_cond.release()
+                try:
+                    with self._write_lock:
+                        # A rotation closes (and fsyncs) old fds; sync the current ones.
+                        fds = [fd for fd in (self._data_fd, self._index_fd) if fd is not None]
+                        fds += self._dirty_fds
+                        self._dirty_fds = set()
+                    for fd in fds:
+                        try:
+                            os.fsync(fd)
+                        except OSError:
+                            pass  # Closed by a concurrent rotation, which synced it.
+                finally:
+                    self._sync_cond.acquire()
+                    self._syncing = False
+                    self._synced = max(self._synced, target)
+                    self._sync_cond.notify_all()
+
+    # --- reading and replay bookkeeping ---
+
+    def _counts(self, segment: int) -> tuple[int, int]:
+        """(entries, replayed) for a segment, from index and done file sizes."""
+        def size(suffix):
+            try:
+                return os.path.getsize(self._path(segment, suffix))
+            except FileNotFoundError:
+                return 0
+        entries = max(0, size("idx") - _INDEX_HEADER.size) // _INDEX_RECORD.size
+        return entries, size("done") // _DONE_RECORD.size
+
+    def _replayed_offsets(self, segment: int) -> set[int]:
+        try:
+            with open(self._path(segment, "done"), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return set()
+        usable = len(data) - len(data) % _DONE_RECORD.size
+        return {offset for (offset,) in _DONE_RECORD.iter_unpack(data[:usable])}
+
+    def pending(self):
+        """Yield (segment, offset, entry) for every entry not yet replayed.
+
+        Fully replayed segments are skipped from their file sizes alone.
+        """
+        for segment in self.segments():
+            entries, replayed = self._counts(segment)
+            if replayed >= entries:
+                continue
+            done = self._replayed_offsets(segment)
+            with open(self._path(segment, "idx"), "rb") as index, \
+                    open(self._path(segment, "jsonl"), "rb") as data:
+                index.seek(_INDEX_HEADER.size)
+                raw = index.read(entries * _INDEX_RECORD.size)
+                for offset, length in _INDEX_RECORD.iter_unpack(raw):
+                    if offset in done:
+                        continue
+                    data.seek(offset)
+                    yield segment, offset, json.loads(data.read(length))
+
+    def _seen_replayed(self, segment: int) -> set[int]:
+        """Replayed offsets of a segment, reading only marks added since last time.
+
+        Must be called with the locks held, so no mark is half-written.
+        """
+        done = self._done.setdefault(segment, set())
+        read = self._done_read.setdefault(segment, 0)
+        try:
+            with open(self._path(segment, "done"), "rb") as f:
+                f.seek(read)
+                data = f.read()
+        except FileNotFoundError:
+            return done
+        usable = len(data) - len(data) % _DONE_RECORD.size
+        done.update(offset for (offset,) in _DONE_RECORD.iter_unpack(data[:usable]))
+        self._done_read[segment] = read + usable
+        return done
+
+    def mark_replayed(self, segment: int, offset: int) -> None:
+        """Record that the entry at (segment, offset) has been replayed.
+
+        Returns once the mark is durable; concurrent marks share an fsync.
+        """
+        self.mark_replayed_many([(segment, offset)])
+
+    def mark_replayed_many(self, locations: list[tuple[int, int]]) -> None:
+        """Record several entries as replayed, with one write per segment."""
+        by_segment: dict[int, list[int]] = {}
+        for segment, offset in locations:
+            by_segment.setdefault(segment, []).append(offset)
+        with self._locked():
+            for segment, offsets in by_segment.items():
+                done = self._seen_replayed(segment)
+                new = [offset for offset in dict.fromkeys(offsets) if offset not in done]
+                if not new:
+                    continue
+                fd = self._done_fds.get(segment)
+                if fd is None:
+                    fd = self._done_fds[segment] = os.open(
+                        self._path(segment, "done"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+                    )
+                os.write(fd, b"".join(_DONE_RECORD.pack(offset) for offset in new))
+                done.update(new)
+                self._done_read[segment] += len(new) * _DONE_RECORD.size
+                self._dirty_fds.add(fd)
+            sequence = self._next_sequence()
+        if self.fsync:
+            self._commit(sequence)
+
+    def _forget_segment(self, segment: int) -> None:
+        """Drop a deleted segment's replay state; must hold the locks."""
+        fd = self._done_fds.pop(segment, None)
+        if fd is not None:
+            self._dirty_fds.discard(fd)
+            os.close(fd)
+        self._done.pop(segment, None)
+        self._done_read.pop(segment, None)
+
+    def stats(self) -> dict:
+        """Segment, entry and pending counts, from index sizes only."""
+        segments = self.segments()
+        entries = replayed = 0
+        for segment in segments:
+            seg_entries, seg_replayed = self._counts(segment)
+            entries += seg_entries
+            replayed += seg_replayed
+        return {"segments": len(segments), "entries": entries, "pending": entries - replayed}
+
+    def compact(self) -> int:
+        """Delete sealed segments whose entries have all been replayed.
+
+        The newest segment is never deleted. Returns segments removed.
+        """
+        removed = 0
+        with self._locked():
+            segments = self.segments()
+            for segment in segments[:-1]:
+                entries, replayed = self._counts(segment)
+                if replayed < entries:
+                    continue
+                for suffix in ("jsonl", "idx", "done"):
+                    try:
+                        os.remove(self._path(segment, suffix))
+                    except FileNotFoundError:
+                        pass
+                self._forget_segment(segment)
+                removed += 1
+        return removed
+
+    def close(self) -> None:
+        with self._locked():
+            self._close_segment()
+            for segment, fd in list(self._done_fds.items()):
+                if self.fsync and fd in self._dirty_fds:
+                    os.fsync(fd)
+                self._forget_segment(segment)
+
+
+_journals: dict[str, FallbackJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(directory: str | None = None) -> FallbackJournal:
+    """Return the process-wide journal for a directory (default log dir)."""
+    directory = os.path.abspath(directory or default_log_dir())
+    with _journals_lock:
+        journal = _journals.get(directory)
+        if journal is None:
+            journal = _journals[directory] = FallbackJournal(directory)
+        return journal
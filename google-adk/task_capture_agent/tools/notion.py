@@ -2,17 +2,27 @@
 
 These functions are registered as ADK agent tools. Each function's
 docstring and type annotations tell the LLM when and how to call them.
+All Notion calls go through the shared rate limiter in ratelimit.py,
+creates are deduplicated per session by idempotency.py, and properties
+are encoded against each database's real schema from schema.py.
+Databases and field names come from the hot-reloadable routing config
+(config/loader.py).
 """
 
-import os
-from notion_client import Client
+from typing import TYPE_CHECKING
 
-from task_capture_agent.config.databases import MASTER_DB_ID, TOPIC_DATABASES
+from task_capture_agent import telemetry
+from task_capture_agent.config.loader import TopicRoute, get_config
+from task_capture_agent.tools import idempotency, ratelimit, schema
+from task_capture_agent.tools.client import get_client
 
+if TYPE_CHECKING:
+    from notion_client import Client
 
-def _get_client() -> Client:
-    """Return a Notion client using the NOTION_API_KEY env var."""
-    return Client(auth=os.environ["NOTION_API_KEY"])
+
+def _get_client() -> "Client":
+    """Return the shared, connection-pooled Notion client."""
+    return get_client()
 
 
 def _build_properties(fields: dict) -> dict:
@@ -37,6 +47,95 @@ def _build_properties(fields: dict) -> dict:
     return props
 
 
+def _encode_properties(data_source_id: str, fields: dict) -> dict:
+    """Encode fields with the database's compiled schema if it is loaded.
+
+    Falls back to the _build_properties heuristic when the schema is
+    unavailable. Raises schema.SchemaError for values that don't fit.
+    """
+    encoder = schema.get_registry().cached_encoder(data_source_id)
+    return encoder.encode(fields) if encoder else _build_properties(fields)
+
+
+def _topic_route(category: str) -> TopicRoute:
+    """Resolve a category to its topic database route, defaulting to Needs Sorting."""
+    return get_config().route(category)
+
+
+def _master_record_request(title: str, priority: str, routing: dict | None = None) -> dict:
+    """Build the pages.create arguments for a master record.
+
+    The record is Pending unless routing (from _master_routing_fields)
+    gives it its final status and link, as in single-phase captures.
+    """
+    master_db_id = get_config().master_db_id
+    return {
+        "parent": {"data_source_id": master_db_id},
+        "properties": _encode_properties(master_db_id, {
+            "Task": title,
+            "Source": "Google ADK",
+            "Status": "Pending",
+            "Priority": priority,
+            **(routing or {}),
+        }),
+    }
+
+
+def _master_routing_fields(
+    status: str,
+    category: str,
+    topic_link: str,
+    confidence: str,
+) -> dict:
+    """Master record properties that record where a task was routed."""
+    return {
+        "Status": status,
+        "Category": category,
+        "Topic Link": topic_link,
+        "Confidence": confidence,
+    }
+
+
+def _topic_entry_request(
+    category: str,
+    title: str,
+    priority: str,
+    notes: str,
+    extra_fields: dict,
+) -> tuple[TopicRoute, dict]:
+    """Resolve the topic database and build its pages.create arguments.
+
+    Unknown categories are routed to Needs Sorting. Returns the route
+    alongside the request so callers can report where it went.
+    """
+    route = _topic_route(category)
+    request = {
+        "parent": {"data_source_id": route.data_source_id},
+        "properties": _encode_properties(
+            route.data_source_id, route.fields(title, priority, notes, extra_fields)
+        ),
+    }
+    return route, request
+
+
+def _master_update_request(
+    page_id: str,
+    status: str,
+    category: str,
+    topic_link: str,
+    confidence: str,
+) -> dict:
+    """Build the pages.update arguments that link a routed master record."""
+    return {
+        "page_id": page_id,
+        "properties": _encode_properties(
+            get_config().master_db_id,
+            _master_routing_fields(status, category, topic_link, confidence),
+        ),
+    }
+
+
+@telemetry.traced_tool
 def create_master_record(title: str, priority: str = "Medium") -> dict:
     """Create a record in the master intake database with status Pending.
 
@@ -50,19 +149,20 @@ def create_master_record(title: str, priority: str = "Medium") -> dict:
     Returns:
         A dict with page_id and url of the created master record.
     """
-    client = _get_client()
-    response = client.pages.create(
-        parent={"data_source_id": MASTER_DB_ID},
-        properties=_build_properties({
-            "Task": title,
-            "Source": "Google ADK",
-            "Status": "Pending",
-            "Priority": priority,
-        }),
-    )
-    return {"page_id": response["id"], "url": response["url"]}
+    def create() -> dict:
+        client = _get_client()
+        schema.get_registry().load(get_config().master_db_id, client)
+        response = ratelimit.call(
+            client.pages.create, idempotent=False,
+            **_master_record_request(title, priority),
+        )
+        return {"page_id": response["id"], "url": response["url"]}
 
+    key = idempotency.fingerprint("master", title)
+    return idempotency.get_cache().run_once(key, create)
 
+
+@telemetry.traced_tool
 def create_topic_entry(
     category: str,
     title: str,
@@ -94,54 +194,26 @@ def create_topic_entry(
     Returns:
         A dict with page_id, url, and the database_name it was routed to.
     """
-    db_config = TOPIC_DATABASES.get(category)
-    if not db_config:
-        db_config = TOPIC_DATABASES["Needs Sorting"]
-        category = "Needs Sorting"
-
-    fields = {**db_config["defaults"], "Task": title}
-
-    if category != "Needs Sorting":
-        fields["Priority"] = priority
-
-    if notes:
-        fields["Notes"] = notes
-
-    # Map snake_case extra_fields to Notion property names
-    field_map = {
-        "location": "Location",
-        "cost_estimate": "Cost Estimate",
-        "project": "Project",
-        "repo": "Repo",
-        "class_name": "Class",
-        "topic": "Topic",
-        "platform": "Platform",
-        "company": "Company",
-        "contact": "Contact",
-        "area": "Area",
-        "workflow": "Workflow",
-        "type": "Type",
-        "event_or_group": "Event / Group",
-        "suggested_category": "Suggested Category",
-        "reason": "Reason",
-    }
-    for key, value in extra_fields.items():
-        notion_key = field_map.get(key)
-        if notion_key and value:
-            fields[notion_key] = value
-
-    client = _get_client()
-    response = client.pages.create(
-        parent={"data_source_id": db_config["data_source_id"]},
-        properties=_build_properties(fields),
-    )
-    return {
-        "page_id": response["id"],
-        "url": response["url"],
-        "database_name": db_config["name"],
-    }
-
-
+    route = _topic_route(category)
+
+    def create() -> dict:
+        client = _get_client()
+        schema.get_registry().load(route.data_source_id, client)
+        _, request = _topic_entry_request(
+            category, title, priority, notes, extra_fields
+        )
+        response = ratelimit.call(client.pages.create, idempotent=False, **request)
+        return {
+            "page_id": response["id"],
+            "url": response["url"],
+            "database_name": route.name,
+        }
+
+    key = idempotency.fingerprint("topic", route.name, title)
+    return idempotency.get_cache().run_once(key, create)
+
+
+@telemetry.traced_tool
 def update_master_record(
     page_id: str,
     status: str,
@@ -165,13 +237,10 @@ def update_master_record(
         A dict confirming the update succeeded.
     """
     client = _get_client()
-    client.pages.update(
-        page_id=page_id,
-        properties=_build_properties({
-            "Status": status,
-            "Category": category,
-            "Topic Link": topic_link,
-            "Confidence": confidence,
-        }),
+    schema.get_registry().load(get_config().master_db_id, client)
+    ratelimit.call(
+        client.pages.update,
+        priority=ratelimit.PRIORITY_UPDATE,
+        **_master_update_request(page_id, status, category, topic_link, confidence),
     )
     return {"updated": True, "page_id": page_id, "status": status}
@@ -0,0 +1,331 @@
+"""Process-wide rate limiting and retries for Notion API calls.
+
+Notion allows roughly three requests per second per integration. Every
+Notion call made by the tools goes through one shared token bucket so
+bursts queue up at the API ceiling instead of turning into 429s and
+fallback writes. Waiters are served in priority order: updates that
+finish an in-flight capture go ahead of new creates.
+
+A 429 pauses the whole bucket for the server's Retry-After, since the
+limit applies to the integration, not to one request. 429s, 5xx
+responses and failed connections are retried with jittered exponential
+backoff. Creates are not idempotent on Notion's side, so they are only
+retried when the request cannot have been applied: a 429, or a
+connection that failed before the request was sent. Every attempt
+also passes the shared circuit breaker (breaker.py), which fails it
+at once while Notion is down instead of letting it wait for a timeout.
+
+Each call gets one telemetry span covering queueing and retries, and
+each attempt is timed separately, so limiter waits don't show up as
+Notion latency.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from task_capture_agent import telemetry
+from task_capture_agent.tools import breaker
+
+PRIORITY_UPDATE = 0
+PRIORITY_CREATE = 1
+
+DEFAULT_RATE_PER_SECOND = 3.0
+DEFAULT_BURST = 3
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY_SECONDS = 0.5
+DEFAULT_MAX_DELAY_SECONDS = 30.0
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# Statuses and errors that mean Notion never applied the request, so even
+# a create can safely be sent again.
+UNSENT_STATUSES = (429,)
+UNSENT_ERRORS = (httpx.ConnectError,)
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    """Parse a Retry-After header (seconds or HTTP date) off an API error."""
+    headers = getattr(error, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _operation(fn) -> str:
+    """Telemetry name for a client method, e.g. "data_sources.retrieve"."""
+    endpoint = type(getattr(fn, "__self__", None)).__name__
+    name = getattr(fn, "__name__", "call")
+    if not endpoint.endswith("Endpoint"):
+        return name
+    endpoint = re.sub(r"(?<!^)(?=[A-Z])", "_", endpoint[: -len("Endpoint")]).lower()
+    return f"{endpoint}.{name}"
+
+
+class NotionRateLimiter:
+    """Priority-ordered token bucket shared by all Notion calls.
+
+    Settings are read from the environment unless passed explicitly:
+        NOTION_RATE_PER_SECOND: Sustained request rate (default 3).
+        NOTION_RATE_BURST: Bucket size (default 3).
+        NOTION_MAX_RETRIES: Retries for 429/5xx responses (default 5).
+
+    Both threads and coroutines can wait on the same bucket. Only the
+    highest-priority waiter may take a token, so lower-priority callers
+    never jump the queue. Waiters behind the head of the line sleep
+    until a token is taken or a waiter leaves, rather than polling.
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        burst: int | None = None,
+        max_retries: int | None = None,
+        base_delay: float = DEFAULT_BASE_DELAY_SECONDS,
+        max_delay: float = DEFAULT_MAX_DELAY_SECONDS,
+    ):
+        self.rate = rate or float(
+            os.environ.get("NOTION_RATE_PER_SECOND", DEFAULT_RATE_PER_SECOND)
+        )
+        self.burst = burst or int(os.environ.get("NOTION_RATE_BURST", DEFAULT_BURST))
+        self.max_retries = (
+            max_retries if max_retries is not None
+            else int(os.environ.get("NOTION_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        )
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int]] = []
+        # Coroutines can't wait on the condition; each gets an event set
+        # from whichever thread moves the line.
+        self._async_waiters: dict[tuple[int, int], tuple] = {}
+        self._sequence = itertools.count()
+        self.retries = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls currently waiting for a token."""
+        with self._cond:
+            return len(self._waiters)
+
+    def stats(self) -> dict:
+        """Snapshot of the limiter for logging and health checks."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "queue_depth": len(self._waiters),
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - now), 2),
+                "retries": self.retries,
+            }
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the given number of seconds."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _grant(self, ticket: tuple[int, int]) -> float | None:
+        """Take a token for ticket if it is first in line.
+
+        Must be called with the lock held. Returns 0 when granted, None
+        when ticket is not first in line and must wait to be woken,
+        otherwise the number of seconds worth waiting before retrying.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._waiters[0] != ticket:
+            return None
+        if self._tokens < 1.0:
+            return (1.0 - self._tokens) / self.rate
+        self._tokens -= 1.0
+        heapq.heappop(self._waiters)
+        self._wake()
+        return 0.0
+
+    def _wake(self) -> None:
+        """Wake every waiter to recheck its place in line. Lock held."""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # The waiter's loop has closed.
+
+    def _enqueue(self, priority: int) -> tuple[int, int]:
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(self._waiters, ticket)
+        return ticket
+
+    def _abandon(self, ticket: tuple[int, int]) -> None:
+        with self._cond:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._wake()
+
+    def acquire(self, priority: int = PRIORITY_CREATE) -> None:
+        """Block the calling thread until a token is available."""
+        with self._cond:
+            ticket = self._enqueue(priority)
+        try:
+            with self._cond:
+                while (wait := self._grant(ticket)) != 0:
+                    self._cond.wait(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def acquire_async(self, priority: int = PRIORITY_CREATE) -> None:
+        """Wait on the event loop until a token is available."""
+        event = asyncio.Event()
+        with self._cond:
+            ticket = self._enqueue(priority)
+            self._async_waiters[ticket] = (asyncio.get_running_loop(), event)
+        try:
+            while True:
+                with self._cond:
+                    # Cleared under the lock, so a wake-up after this
+                    # check is never lost.
+                    event.clear()
+                    wait = self._grant(ticket)
+                if wait == 0:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.pop(ticket, None)
+
+    def _retry_delay(
+        self, error: Exception, attempt: int, idempotent: bool = True
+    ) -> float | None:
+        """Seconds to wait before retrying error, or None if it is final.
+
+        A non-idempotent call (a create) that failed after reaching
+        Notion may have been applied, so only unsent failures retry it.
+        """
+        status = getattr(error, "status", None)
+        if isinstance(error, UNSENT_ERRORS):
+            retryable = True
+        elif idempotent:
+            retryable = status in RETRYABLE_STATUSES
+        else:
+            retryable = status in UNSENT_STATUSES
+        if not retryable or attempt >= self.max_retries:
+            return None
+        self.retries += 1
+        if status == 429:
+            retry_after = _retry_after_seconds(error)
+            if retry_after is not None:
+                # The pause holds every caller back; acquire() does the waiting.
+                self.pause(retry_after)
+                return 0.0
+            self.pause(self._backoff(attempt))
+            return 0.0
+        return self._backoff(attempt)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(
+        self, fn, /, *args, priority: int = PRIORITY_CREATE, idempotent: bool = True, **kwargs
+    ):
+        """Call fn under the rate limit, retrying 429s and 5xx responses.
+
+        Pass idempotent=False for calls that must not run twice, such as
+        pages.create; see _retry_delay.
+        """
+        operation = _operation(fn)
+        with telemetry.span(f"notion {operation}", operation=operation):
+            for attempt in itertools.count():
+                self.acquire(priority)
+                try:
+                    with breaker.get_breaker().guard(), \
+                            telemetry.timed("notion_duration", operation=operation):
+                        return fn(*args, **kwargs)
+                except Exception as error:
+                    delay = self._retry_delay(error, attempt, idempotent)
+                    if delay is None:
+                        raise
+                    telemetry.record_retry(operation, getattr(error, "status", None) or type(error).__name__)
+                    time.sleep(delay)
+
+    async def acall(
+        self, fn, /, *args, priority: int = PRIORITY_CREATE, idempotent: bool = True, **kwargs
+    ):
+        """Await fn under the rate limit, retrying 429s and 5xx responses."""
+        operation = _operation(fn)
+        with telemetry.span(f"notion {operation}", operation=operation):
+            for attempt in itertools.count():
+                await self.acquire_async(priority)
+                try:
+                    with breaker.get_breaker().guard(), \
+                            telemetry.timed("notion_duration", operation=operation):
+                        return await fn(*args, **kwargs)
+                except Exception as error:
+                    delay = self._retry_delay(error, attempt, idempotent)
+                    if delay is None:
+                        raise
+                    telemetry.record_retry(operation, getattr(error, "status", None) or type(error).__name__)
+                    await asyncio.sleep(delay)
+
+
+_limiter = NotionRateLimiter()
+
+
+def get_rate_limiter() -> NotionRateLimiter:
+    """Return the process-wide Notion rate limiter."""
+    return _limiter
+
+
+def call(fn, /, *args, priority: int = PRIORITY_CREATE, idempotent: bool = True, **kwargs):
+    """Call a Notion client method through the shared rate limiter."""
+    return _limiter.call(
+        fn, *args, priority=priority, idempotent=idempotent, **kwargs
+    )
+
+
+async def acall(fn, /, *args, priority: int = PRIORITY_CREATE, idempotent: bool = True, **kwargs):
+    """Await a Notion async client method through the shared rate limiter."""
+    return await _limiter.acall(
+        fn, *args, priority=priority, idempotent=idempotent, **kwargs
+    )
+
+
+def queue_depth() -> int:
+    """Number of Notion calls currently waiting on the shared limiter."""
+    return _limiter.queue_depth
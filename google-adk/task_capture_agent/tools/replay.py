@@ -0,0 +1,368 @@
+"""Replay fallback log entries back into Notion.
+
+log_fallback writes tasks to fallback_log.jsonl or the fallback Google
+Sheet with status "Pending" when Notion is down. This drains those
+entries through the normal master → topic → link pipeline once Notion
+is back, with bounded concurrency and the shared Notion rate limiter.
+
+Progress is recorded as it goes, so an interrupted replay resumes where
+it stopped and no entry is submitted twice:
+    - Local log: each replayed entry is marked in the journal's
+      per-segment .done file, and drained segments are compacted away.
+      Entries bound for the fallback Sheet are left alone for
+      SHEETS_HANDOFF_SECONDS, while their row may still be in a sink
+      buffer; one still pending after that never reached the Sheet.
+    - Google Sheet: replayed rows have their Status set to "Replayed",
+      in batches to stay inside the Sheets write quota. Until its batch
+      is written, each replayed row is also recorded (and fsynced) in a
+      local marks file next to the journal, so a crash in between
+      doesn't replay the row again.
+
+A legacy single-file fallback_log.jsonl from before the journal is
+imported into the journal first (skipping lines its old checkpoint file
+marks as replayed) and renamed to fallback_log.jsonl.imported.
+
+Usage:
+    python -m task_capture_agent.tools.replay [--source local|sheets|all]
+        [--concurrency N] [--limit N]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from task_capture_agent import telemetry
+from task_capture_agent.config.loader import get_config
+from task_capture_agent.tools import capture, fallback, sheets
+from task_capture_agent.tools.client import aclose_clients
+from task_capture_agent.tools.journal import default_log_dir, get_journal
+
+DEFAULT_MAX_CONCURRENCY = 10
+SHEET_MARK_BATCH = 25
+REPLAYED_STATUS = "Replayed"
+# How long a journal entry bound for the Sheet is left to its sink's flush.
+SHEETS_HANDOFF_SECONDS = 60.0
+
+
+class ReplayCheckpoint:
+    """Tracks which byte offsets of a JSONL log have been replayed.
+
+    Everything before `offset` is done. Entries finished out of order
+    (concurrency means later lines can finish first) are kept in `done`
+    as start → end offsets until the gap before them closes.
+
+    Progress is saved on every mark unless save_interval (seconds) is
+    set, in which case at most that often; call save() when finished.
+    """
+
+    def __init__(self, path: str, save_interval: float = 0.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._saved_at = time.monotonic()
+        self.offset = 0
+        self.done: dict[int, int] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.offset = state["offset"]
+            self.done = {int(k): v for k, v in state["done"].items()}
+
+    def is_done(self, start: int) -> bool:
+        return start < self.offset or start in self.done
+
+    def mark(self, start: int, end: int) -> None:
+        """Record the entry spanning [start, end) as replayed and persist."""
+        self.done[start] = end
+        while self.offset in self.done:
+            self.offset = self.done.pop(self.offset)
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def save(self) -> None:
+        self._saved_at = time.monotonic()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"offset": self.offset, "done": self.done}, f)
+        os.replace(tmp_path, self.path)
+
+
+class SheetReplayMarks:
+    """Sheet rows replayed into Notion whose "Replayed" mark may not be written yet.
+
+    Rows are keyed on their content minus the Status column. Each key is
+    appended and fsynced as soon as the row's replay succeeds; clear()
+    empties the file once every mark has reached the Sheet.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.keys: set[str] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.keys = {line.strip() for line in f if line.strip()}
+
+    @staticmethod
+    def key(row: list[str]) -> str:
+        status_index = sheets.SHEET_STATUS_COLUMN - 1
+        content = [value for index, value in enumerate(row) if index != status_index]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()[:32]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def add(self, key: str) -> None:
+        self.keys.add(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(key + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        self.keys.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _iter_pending_lines(path: str, checkpoint: ReplayCheckpoint):
+    """Yield (start, end, line) for each entry not yet replayed.
+
+    Reads one line at a time from the checkpoint offset, so the log is
+    never loaded into memory.
+    """
+    with open(path, "rb") as f:
+        f.seek(checkpoint.offset)
+        start = checkpoint.offset
+        while line := f.readline():
+            end = start + len(line)
+            if not line.endswith(b"\n"):
+                return  # Partially written last line; replay it next time.
+            if not checkpoint.is_done(start):
+                yield start, end, line
+            start = end
+
+
+async def _replay_entry(title: str, category: str, priority: str, error: str) -> dict:
+    """Send one fallback entry through the capture pipeline, raising on error."""
+    if category in get_config().routes:
+        confidence = "Medium"
+    else:
+        category, confidence = "Needs Sorting", "Low"
+    return await capture._capture_one(
+        title,
+        category,
+        priority or "Medium",
+        confidence,
+        notes=f"Replayed from fallback log (original error: {error})" if error else "",
+        fallback=False,
+    )
+
+
+class _Replayer:
+    """Runs replays with at most max_concurrency entries in flight."""
+
+    def __init__(self, max_concurrency: int, limit: int):
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.limit = limit
+        self.started = 0
+        self.tasks: set[asyncio.Task] = set()
+        self.stats = {"replayed": 0, "failed": 0, "skipped": 0, "errors": []}
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.limit) and self.started >= self.limit
+
+    async def submit(self, entry: dict, on_success) -> None:
+        """Start replaying entry once a concurrency slot is free."""
+        await self.semaphore.acquire()
+        self.started += 1
+        task = asyncio.create_task(self._run(entry, on_success))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, entry: dict, on_success) -> None:
+        try:
+            await _replay_entry(
+                entry["title"], entry.get("category", ""),
+                entry.get("priority", ""), entry.get("error", ""),
+            )
+        except Exception as error:
+            self.stats["failed"] += 1
+            if len(self.stats["errors"]) < 10:
+                self.stats["errors"].append(f"{entry['title']}: {error}")
+        else:
+            self.stats["replayed"] += 1
+            await on_success()
+        finally:
+            self.semaphore.release()
+
+    async def drain(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+
+def import_legacy_log(path: str, journal) -> int:
+    """Move unreplayed entries of a legacy fallback_log.jsonl into the journal.
+
+    Returns the number of entries imported.
+    """
+    if not os.path.exists(path):
+        return 0
+    checkpoint = ReplayCheckpoint(path + ".replay.json")
+    entries = []
+    for _, _, line in _iter_pending_lines(path, checkpoint):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    if entries:
+        journal.append_many(entries)
+    os.replace(path, path + ".imported")
+    if os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    return len(entries)
+
+
+def _awaiting_sheet(entry: dict) -> bool:
+    """Whether entry's row may still be on its way to the fallback Sheet."""
+    if "sheet_id" not in entry:
+        return False
+    try:
+        written = datetime.fromisoformat(entry["timestamp"])
+    except (KeyError, ValueError):
+        return False
+    return (datetime.now(timezone.utc) - written).total_seconds() < SHEETS_HANDOFF_SECONDS
+
+
+async def _replay_local(replayer: _Replayer, journal) -> None:
+    # Journal reads, marks and their fsyncs block, so they run in the executor.
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, import_legacy_log, fallback.local_log_path(), journal)
+
+    async def mark(segment: int, offset: int) -> None:
+        await loop.run_in_executor(None, journal.mark_replayed, segment, offset)
+
+    pending = journal.pending()
+    while not replayer.exhausted:
+        item = await loop.run_in_executor(None, next, pending, None)
+        if item is None:
+            break
+        segment, offset, entry = item
+        if _awaiting_sheet(entry):
+            continue
+        if "title" not in entry:
+            replayer.stats["skipped"] += 1
+            await mark(segment, offset)
+            continue
+        await replayer.submit(
+            entry, lambda segment=segment, offset=offset: mark(segment, offset)
+        )
+    pending.close()
+    await replayer.drain()
+    await loop.run_in_executor(None, journal.compact)
+
+
+async def _replay_sheet(replayer: _Replayer, creds_path: str, sheet_id: str) -> None:
+    loop = asyncio.get_running_loop()
+    sink = sheets.get_sheets_sink(creds_path, sheet_id, written=fallback._rows_written)
+    # Write out anything still buffered so it is replayed in this pass.
+    await loop.run_in_executor(None, sink.flush)
+    sheet = await loop.run_in_executor(None, sink.worksheet)
+    rows = await loop.run_in_executor(None, sheet.get_all_values)
+    status_index = sheets.SHEET_STATUS_COLUMN - 1
+    pending_marks: list[int] = []
+    marks = SheetReplayMarks(os.path.join(default_log_dir(), f"sheet-{sheet_id}.replayed"))
+
+    async def replayed(row_number: int, key: str) -> None:
+        await loop.run_in_executor(None, marks.add, key)
+        pending_marks.append(row_number)
+
+    async def flush_marks() -> None:
+        if not pending_marks:
+            return
+        updates = [
+            {"range": _cell(row_number), "values": [[REPLAYED_STATUS]]}
+            for row_number in pending_marks
+        ]
+        pending_marks.clear()
+        await loop.run_in_executor(None, sheet.batch_update, updates)
+
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            if replayer.exhausted:
+                break
+            if len(row) <= status_index or row[status_index] != "Pending":
+                continue
+            key = SheetReplayMarks.key(row)
+            if key in marks:
+                # Replayed before an interruption; only its mark is missing.
+                pending_marks.append(row_number)
+                continue
+            entry = {
+                name.lower(): value for name, value in zip(sheets.SHEET_COLUMNS, row)
+            }
+            await replayer.submit(
+                entry, lambda row_number=row_number, key=key: replayed(row_number, key)
+            )
+            if len(pending_marks) >= SHEET_MARK_BATCH:
+                await flush_marks()
+        await replayer.drain()
+    finally:
+        await flush_marks()
+    marks.clear()
+
+
+def _cell(row_number: int) -> str:
+    """A1 reference of the Status cell in the given row."""
+    return f"{chr(ord('A') + sheets.SHEET_STATUS_COLUMN - 1)}{row_number}"
+
+
+@telemetry.traced_tool
+async def replay_fallback(
+    source: str = "all",
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    limit: int = 0,
+) -> dict:
+    """Replay tasks from the fallback log into Notion.
+
+    Call this when the user asks to retry, replay, or recover tasks that
+    were captured to the fallback log while Notion was unavailable.
+    Entries already replayed are skipped, so it is safe to call again.
+
+    Args:
+        source: "local" for fallback_log.jsonl, "sheets" for the fallback
+            Google Sheet, or "all" for both. Defaults to "all".
+        max_concurrency: Maximum entries replayed at once. Defaults to 10.
+        limit: Stop after this many entries (0 means no limit).
+
+    Returns:
+        A dict with counts of replayed, failed, and skipped entries and
+        up to ten error messages for failures.
+    """
+    replayer = _Replayer(max_concurrency, limit)
+    if source in ("local", "all"):
+        await _replay_local(replayer, get_journal())
+    creds_path = os.environ.get("GOOGLE_SHEETS_CREDENTIALS_PATH")
+    sheet_id = os.environ.get("GOOGLE_SHEETS_FALLBACK_ID")
+    if source in ("sheets", "all") and creds_path and sheet_id:
+        await _replay_sheet(replayer, creds_path, sheet_id)
+    return replayer.stats
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    try:
+        return await replay_fallback(args.source, args.concurrency, args.limit)
+    finally:
+        await aclose_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", choices=("local", "sheets", "all"), default="all")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--limit", type=int, default=0)
+    print(json.dumps(asyncio.run(_main(parser.parse_args())), indent=2))
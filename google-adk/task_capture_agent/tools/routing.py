@@ -0,0 +1,169 @@
+"""Write-behind routing for captures.
+
+A capture makes three Notion calls — master record, topic entry, master
+update — and the user waits for all of them. The master record alone
+is the durable audit trail, so in write-behind mode capture_task and
+capture_batch confirm as soon as it exists and hand the topic entry and
+link update to this worker.
+
+The worker runs its own event loop on a daemon thread, so routing
+outlives the tool call that queued it. The queue is bounded: when it is
+full, submit() returns False and the caller routes inline, which slows
+captures down instead of dropping them. On shutdown the worker stops
+accepting jobs, gives queued ones a grace period to finish, and sends
+anything still unrouted to the fallback log.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import os
+import threading
+
+from task_capture_agent.tools.client import aclose_clients
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_CONCURRENCY = 5
+DEFAULT_DRAIN_SECONDS = 10.0
+
+
+def write_behind_enabled() -> bool:
+    """Whether routing is deferred: CAPTURE_WRITE_BEHIND or a shared job queue."""
+    if os.environ.get("CAPTURE_JOB_QUEUE_DB"):
+        return True
+    return os.environ.get("CAPTURE_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+
+
+class RoutingWorker:
+    """Background event loop that finishes queued captures.
+
+    Settings are read from the environment unless passed explicitly:
+        CAPTURE_ROUTING_QUEUE_SIZE: Max queued and in-flight jobs (default 100).
+        CAPTURE_ROUTING_CONCURRENCY: Jobs routed at once (default 5).
+        CAPTURE_ROUTING_DRAIN_SECONDS: Shutdown grace period (default 10).
+    """
+
+    def __init__(
+        self,
+        queue_size: int | None = None,
+        concurrency: int | None = None,
+        drain_timeout: float | None = None,
+    ):
+        self.queue_size = queue_size or int(
+            os.environ.get("CAPTURE_ROUTING_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)
+        )
+        self.concurrency = concurrency or int(
+            os.environ.get("CAPTURE_ROUTING_CONCURRENCY", DEFAULT_CONCURRENCY)
+        )
+        self.drain_timeout = drain_timeout if drain_timeout is not None else float(
+            os.environ.get("CAPTURE_ROUTING_DRAIN_SECONDS", DEFAULT_DRAIN_SECONDS)
+        )
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        """Jobs queued or being routed."""
+        with self._cond:
+            return self._pending
+
+    def _start(self) -> None:
+        """Start the worker thread and its loop. Must hold the lock."""
+        loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        self._thread = threading.Thread(
+            target=loop.run_forever, name="capture-routing", daemon=True
+        )
+        self._thread.start()
+        self._loop = loop
+
+    def submit(self, route, on_failure) -> bool:
+        """Queue route() to run in the background.
+
+        route is a coroutine function taking no arguments. If it raises,
+        or is still unfinished when the worker shuts down, on_failure is
+        awaited with the exception (CancelledError for the latter). It
+        runs on the worker's loop, so it must not block either. The
+        caller's context variables, such as the dedup session, carry
+        over to the job.
+
+        Returns False without queueing if the queue is full or the
+        worker is closed.
+        """
+        context = contextvars.copy_context()
+        with self._cond:
+            if self._closed or self._pending >= self.queue_size:
+                return False
+            if self._loop is None:
+                self._start()
+            self._pending += 1
+            loop = self._loop
+            loop.call_soon_threadsafe(
+                lambda: self._track(loop.create_task(
+                    self._run(route, on_failure), context=context
+                ))
+            )
+        return True
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, route, on_failure) -> None:
+        try:
+            async with self._semaphore:
+                await route()
+        except BaseException as error:
+            await on_failure(error)
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """Wait until every queued job has finished. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Stop accepting jobs, drain, and fail over what is left.
+
+        Jobs still unfinished after timeout (default drain_timeout) are
+        cancelled, which hands them to their on_failure callback.
+        """
+        with self._cond:
+            self._closed = True
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if not self.drain(self.drain_timeout if timeout is None else timeout):
+            asyncio.run_coroutine_threadsafe(self._cancel_all(), loop).result()
+        asyncio.run_coroutine_threadsafe(aclose_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+    async def _cancel_all(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_worker: RoutingWorker | None = None
+_worker_lock = threading.Lock()
+
+
+def get_routing_worker() -> RoutingWorker:
+    """Return the process-wide routing worker, creating it once."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = RoutingWorker()
+            atexit.register(_worker.close)
+        return _worker
@@ -0,0 +1,425 @@
+"""Notion data source schemas and the property encoders compiled from them.
+
+_build_properties guesses each property's type from its name and the
+Python value type. When the guess is wrong — "Status" is a status
+property rather than a select, "Topic Link" is a URL, "Cost Estimate"
+arrives as "$25" — Notion rejects the whole request and the task goes
+to the fallback log after a wasted round trip.
+
+The registry fetches each data source's schema once, keeps it in a JSON
+file on disk for a TTL, and compiles it into a DatabaseEncoder: one
+encoder function per property, chosen from the property's real type.
+Fields are then validated and encoded locally before any request goes
+out. If a schema cannot be loaded, callers fall back to the heuristic.
+Schemas baked into the startup snapshot (snapshot.py) are used when the
+disk cache has none, so a fresh container needn't fetch them.
+
+Settings are read from the environment:
+    NOTION_SCHEMA_CACHE: Path of the on-disk schema cache
+        (default google-adk/.notion_schema_cache.json).
+    NOTION_SCHEMA_TTL_SECONDS: How long a cached schema is trusted
+        (default 86400).
+
+Usage:
+    python -m task_capture_agent.tools.schema [--refresh]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from task_capture_agent.config.loader import get_config
+from task_capture_agent.snapshot import load_snapshot
+from task_capture_agent.tools import ratelimit
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+# After Notion refuses a fetch (a 4xx other than 429), use the heuristic
+# for this long before trying again. Outages and timeouts don't back off:
+# the heuristic's guesses would be rejected by a database whose types it
+# gets wrong, so the next call tries the fetch again.
+FAILED_FETCH_BACKOFF_SECONDS = 60.0
+# Notion caps each rich text object at 2000 characters.
+MAX_TEXT_CHUNK = 2000
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_PAGE_ID = re.compile(r"([0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12})$")
+_TRUE = {"true", "yes", "y", "1", "done", "x"}
+_FALSE = {"false", "no", "n", "0", ""}
+
+
+class SchemaError(ValueError):
+    """A field value does not fit its Notion property."""
+
+
+def _refused(error: Exception) -> bool:
+    """Whether a failed fetch was Notion refusing it, rather than an outage."""
+    status = getattr(error, "status", None)
+    return status is not None and status not in ratelimit.RETRYABLE_STATUSES
+
+
+def default_cache_path() -> str:
+    """Path of the schema cache, from NOTION_SCHEMA_CACHE if set."""
+    return os.environ.get("NOTION_SCHEMA_CACHE") or os.path.join(
+        os.path.dirname(__file__), "..", "..", ".notion_schema_cache.json"
+    )
+
+
+# --- per-type encoders ---
+
+def _text_chunks(value) -> list[dict]:
+    text = str(value)
+    return [
+        {"text": {"content": text[i:i + MAX_TEXT_CHUNK]}}
+        for i in range(0, max(len(text), 1), MAX_TEXT_CHUNK)
+    ]
+
+
+def _compile_title(name, options):
+    return lambda value: {"title": _text_chunks(value)}
+
+
+def _compile_rich_text(name, options):
+    return lambda value: {"rich_text": _text_chunks(value)}
+
+
+def _compile_number(name, options):
+    def encode(value):
+        if isinstance(value, bool):
+            raise SchemaError(f"{name} expects a number, got {value!r}")
+        if isinstance(value, (int, float)):
+            return {"number": value}
+        match = _NUMBER.search(str(value).replace(",", ""))
+        if not match:
+            raise SchemaError(f"{name} expects a number, got {value!r}")
+        number = float(match.group())
+        return {"number": int(number) if number.is_integer() else number}
+    return encode
+
+
+def _compile_select(name, options):
+    def encode(value):
+        value = str(value)
+        if "," in value:
+            raise SchemaError(f"{name} select options cannot contain commas: {value!r}")
+        return {"select": {"name": value}}
+    return encode
+
+
+def _compile_multi_select(name, options):
+    def encode(value):
+        values = value if isinstance(value, (list, tuple)) else str(value).split(",")
+        return {"multi_select": [{"name": str(v).strip()} for v in values if str(v).strip()]}
+    return encode
+
+
+def _compile_status(name, options):
+    # Unlike selects, Notion won't create new status options on write.
+    allowed = {option.lower(): option for option in options}
+
+    def encode(value):
+        option = allowed.get(str(value).lower()) if allowed else str(value)
+        if option is None:
+            raise SchemaError(f"{name} must be one of {sorted(allowed.values())}, got {value!r}")
+        return {"status": {"name": option}}
+    return encode
+
+
+def _compile_checkbox(name, options):
+    def encode(value):
+        if isinstance(value, bool):
+            return {"checkbox": value}
+        text = str(value).strip().lower()
+        if text not in _TRUE | _FALSE:
+            raise SchemaError(f"{name} expects true/false, got {value!r}")
+        return {"checkbox": text in _TRUE}
+    return encode
+
+
+def _compile_date(name, options):
+    def encode(value):
+        text = value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else str(value)
+        try:
+            datetime.datetime.fromisoformat(text)
+        except ValueError:
+            raise SchemaError(f"{name} expects an ISO date, got {value!r}") from None
+        return {"date": {"start": text}}
+    return encode
+
+
+def _compile_relation(name, options):
+    def encode(value):
+        match = _PAGE_ID.search(str(value).split("?")[0].rstrip("/"))
+        if not match:
+            raise SchemaError(f"{name} expects a Notion page ID or URL, got {value!r}")
+        return {"relation": [{"id": match.group(1)}]}
+    return encode
+
+
+def _compile_plain(kind):
+    def compile_(name, options):
+        return lambda value: {kind: str(value)}
+    return compile_
+
+
+_COMPILERS = {
+    "title": _compile_title,
+    "rich_text": _compile_rich_text,
+    "number": _compile_number,
+    "select": _compile_select,
+    "multi_select": _compile_multi_select,
+    "status": _compile_status,
+    "checkbox": _compile_checkbox,
+    "date": _compile_date,
+    "relation": _compile_relation,
+    "url": _compile_plain("url"),
+    "email": _compile_plain("email"),
+    "phone_number": _compile_plain("phone_number"),
+}
+
+
+def _compile_read_only(name, kind):
+    def encode(value):
+        raise SchemaError(f"{name} is a {kind} property and cannot be written")
+    return encode
+
+
+class DatabaseEncoder:
+    """Encodes a flat field dict into one data source's property format."""
+
+    def __init__(self, data_source_id: str, properties: dict):
+        self.data_source_id = data_source_id
+        self.types = {name: prop["type"] for name, prop in properties.items()}
+        self._encoders = {}
+        for name, prop in properties.items():
+            compile_ = _COMPILERS.get(prop["type"])
+            self._encoders[name] = (
+                compile_(name, prop.get("options", []))
+                if compile_ else _compile_read_only(name, prop["type"])
+            )
+
+    def encode(self, fields: dict) -> dict:
+        """Validate and encode fields, raising SchemaError on a bad value.
+
+        None values are skipped, as are fields the database doesn't have
+        (Notion would reject the whole request for them).
+        """
+        props = {}
+        for key, value in fields.items():
+            encoder = self._encoders.get(key)
+            if value is None or encoder is None:
+                continue
+            props[key] = encoder(value)
+        return props
+
+
+def _compact_schema(response: dict) -> dict:
+    """Keep only what the encoders need from a data source response."""
+    properties = {}
+    for name, prop in response["properties"].items():
+        kind = prop["type"]
+        options = (prop.get(kind) or {}).get("options", []) if kind in ("select", "multi_select", "status") else []
+        properties[name] = {"type": kind, "options": [o["name"] for o in options]}
+    return properties
+
+
+class SchemaRegistry:
+    """Loads, caches and compiles data source schemas.
+
+    Schemas are kept in memory and in a JSON file shared by every worker
+    on the host. Loading is single-flight: concurrent callers for the
+    same data source share one fetch.
+
+    The disk cache and the snapshot's schemas are read once, on the
+    first miss, and kept in memory; a config reload drops that copy so
+    the next miss reads them again.
+    """
+
+    def __init__(self, cache_path: str | None = None, ttl: float | None = None, fetch: bool = True):
+        self.cache_path = cache_path or default_cache_path()
+        self.ttl = ttl if ttl is not None else float(
+            os.environ.get("NOTION_SCHEMA_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+        )
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        self._encoders: dict[str, tuple[DatabaseEncoder, float]] = {}
+        self._loading: dict[str, Future] = {}
+        self._failed_until: dict[str, float] = {}
+        self._stored: dict | None = None
+        self._stored_version: str | None = None
+
+    # --- disk cache ---
+
+    def _read_disk(self) -> dict:
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _dump_disk(self, cache: dict) -> None:
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
+
+    def _write_disk(self, data_source_id: str, properties: dict, fetched_at: float) -> None:
+        entry = {"fetched_at": fetched_at, "properties": properties}
+        with self._lock:
+            cache = self._read_disk()
+            cache[data_source_id] = entry
+            self._dump_disk(cache)
+            if self._stored is not None:
+                self._stored[data_source_id] = entry
+
+    def _stored_schemas(self) -> dict:
+        """Disk cache over snapshot schemas, read once per config version."""
+        version = get_config().version
+        with self._lock:
+            if self._stored is None or version != self._stored_version:
+                self._stored = {**load_snapshot().get("schemas", {}), **self._read_disk()}
+                self._stored_version = version
+            return self._stored
+
+    def export(self) -> dict:
+        """Every cached schema, as stored on disk."""
+        return self._read_disk()
+
+    # --- lookup ---
+
+    def cached_encoder(self, data_source_id: str) -> DatabaseEncoder | None:
+        """Encoder from memory or the disk cache, without any network call."""
+        now = time.time()
+        with self._lock:
+            entry = self._encoders.get(data_source_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+        stored = self._stored_schemas().get(data_source_id)
+        if stored is None or now - stored["fetched_at"] >= self.ttl:
+            return None
+        return self._install(data_source_id, stored["properties"], stored["fetched_at"])
+
+    def _install(self, data_source_id: str, properties: dict, fetched_at: float) -> DatabaseEncoder:
+        encoder = DatabaseEncoder(data_source_id, properties)
+        with self._lock:
+            self._encoders[data_source_id] = (encoder, fetched_at)
+        return encoder
+
+    def _claim(self, data_source_id: str) -> tuple[Future | None, bool]:
+        """Return (future, owner); (None, False) if fetching is off or backing off."""
+        with self._lock:
+            if not self.fetch or self._failed_until.get(data_source_id, 0) > time.time():
+                return None, False
+            future = self._loading.get(data_source_id)
+            if future is not None:
+                return future, False
+            future = self._loading[data_source_id] = Future()
+            return future, True
+
+    def _settle(
+        self, data_source_id: str, future: Future, response, backoff: bool = True
+    ) -> DatabaseEncoder | None:
+        encoder = None
+        if response is not None:
+            try:
+                properties = _compact_schema(response)
+            except (KeyError, TypeError, AttributeError):
+                properties = None
+            if properties is not None:
+                fetched_at = time.time()
+                self._write_disk(data_source_id, properties, fetched_at)
+                encoder = self._install(data_source_id, properties, fetched_at)
+        with self._lock:
+            self._loading.pop(data_source_id, None)
+            if encoder is None and backoff:
+                self._failed_until[data_source_id] = time.time() + FAILED_FETCH_BACKOFF_SECONDS
+        future.set_result(encoder)
+        return encoder
+
+    def load(self, data_source_id: str, client) -> DatabaseEncoder | None:
+        """Return the encoder for a data source, fetching its schema if needed.
+
+        Returns None if the schema is unavailable; callers then use the
+        heuristic encoding.
+        """
+        encoder = self.cached_encoder(data_source_id)
+        if encoder is not None:
+            return encoder
+        future, owner = self._claim(data_source_id)
+        if future is None:
+            return None
+        if not owner:
+            return future.result()
+        try:
+            response = ratelimit.call(client.data_sources.retrieve, data_source_id=data_source_id)
+        except Exception as error:
+            return self._settle(data_source_id, future, None, backoff=_refused(error))
+        return self._settle(data_source_id, future, response)
+
+    async def aload(self, data_source_id: str, client) -> DatabaseEncoder | None:
+        """Async load, using the async Notion client."""
+        encoder = self.cached_encoder(data_source_id)
+        if encoder is not None:
+            return encoder
+        future, owner = self._claim(data_source_id)
+        if future is None:
+            return None
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            response = await ratelimit.acall(client.data_sources.retrieve, data_source_id=data_source_id)
+        except Exception as error:
+            return self._settle(data_source_id, future, None, backoff=_refused(error))
+        return self._settle(data_source_id, future, response)
+
+    def invalidate(self, data_source_id: str | None = None) -> None:
+        """Forget one cached schema (or all of them), in memory and on disk."""
+        with self._lock:
+            cache = self._read_disk()
+            for key in [data_source_id] if data_source_id else list(cache):
+                cache.pop(key, None)
+            for key in [data_source_id] if data_source_id else list(self._encoders):
+                self._encoders.pop(key, None)
+                self._failed_until.pop(key, None)
+            if os.path.exists(self.cache_path):
+                self._dump_disk(cache)
+            self._stored = None
+
+
+def data_source_ids() -> list[str]:
+    """Every data source the tools write to."""
+    return get_config().data_source_ids()
+
+
+_registry: SchemaRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SchemaRegistry:
+    """Return the process-wide schema registry, built on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SchemaRegistry()
+        return _registry
+
+
+if __name__ == "__main__":
+    from task_capture_agent.tools.client import get_client
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached schemas")
+    args = parser.parse_args()
+    registry = get_registry()
+    if args.refresh:
+        registry.invalidate()
+    report = {}
+    for data_source_id in data_source_ids():
+        encoder = registry.load(data_source_id, get_client())
+        report[data_source_id] = encoder.types if encoder else "unavailable"
+    print(json.dumps(report, indent=2))
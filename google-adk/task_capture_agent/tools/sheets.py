@@ -0,0 +1,172 @@
+"""Buffered Google Sheets sink for the fallback log.
+
+Fallback writes arrive in bursts — exactly when Notion is down. Opening
+the sheet costs several round trips (read credentials, authorize, open
+by key), so the sink does that once, keeps the worksheet handle, and
+coalesces rows into append_rows batches. A batch is flushed when it
+reaches batch_size rows or has waited flush_interval seconds, whichever
+comes first.
+
+The buffer itself is not durable, so callers make each row durable
+first and pass a reference to it: log_fallback appends the row to the
+local journal and passes its journal location. Once a batch reaches the
+sheet, the written callback receives the batch's references (and the
+journal entries are marked as handed off). If the process dies or a
+flush fails, the rows are still pending in the journal and are replayed
+from there.
+"""
+
+import atexit
+import os
+import threading
+
+from task_capture_agent import telemetry
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_SECONDS = 2.0
+
+# Column layout of the fallback sheet rows written by log_fallback.
+SHEET_COLUMNS = ("Timestamp", "Title", "Category", "Priority", "Source", "Status", "Error")
+# 1-based, as the Sheets API counts columns.
+SHEET_STATUS_COLUMN = SHEET_COLUMNS.index("Status") + 1
+
+
+def open_fallback_sheet(creds_path: str, sheet_id: str):
+    """Authorize with the service account and return the fallback worksheet."""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+    creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
+    gc = gspread.authorize(creds)
+    return gc.open_by_key(sheet_id).sheet1
+
+
+class SheetsSink:
+    """Long-lived, batching writer for one fallback spreadsheet.
+
+    Settings are read from the environment unless passed explicitly:
+        FALLBACK_SHEETS_BATCH_SIZE: Rows per append_rows call (default 50).
+        FALLBACK_SHEETS_FLUSH_SECONDS: Max time a row waits (default 2).
+    """
+
+    def __init__(
+        self,
+        creds_path: str,
+        sheet_id: str,
+        written=None,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+    ):
+        self.creds_path = creds_path
+        self.sheet_id = sheet_id
+        self.written = written
+        self.batch_size = batch_size or int(
+            os.environ.get("FALLBACK_SHEETS_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        )
+        self.flush_interval = flush_interval or float(
+            os.environ.get("FALLBACK_SHEETS_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS)
+        )
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: list[tuple[list, object]] = []
+        self._sheet = None
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher: threading.Thread | None = None
+
+    def worksheet(self):
+        """Return the cached worksheet, authorizing on first use."""
+        if self._sheet is None:
+            with telemetry.span("sheets open", sheet_id=self.sheet_id), \
+                    telemetry.timed("sheets_duration", operation="open"):
+                self._sheet = open_fallback_sheet(self.creds_path, self.sheet_id)
+        return self._sheet
+
+    @property
+    def pending(self) -> int:
+        """Rows buffered but not yet written."""
+        with self._lock:
+            return len(self._buffer)
+
+    def append(self, row: list, ref=None) -> None:
+        """Buffer a row; flush now if the batch is full.
+
+        ref identifies the durable copy of the row and is passed to the
+        written callback once the row is in the sheet.
+        """
+        with self._lock:
+            self._buffer.append((row, ref))
+            full = len(self._buffer) >= self.batch_size
+            if self._flusher is None and not self._closed:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name="sheets-flush", daemon=True
+                )
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all buffered rows in one append_rows call.
+
+        Returns the number of rows written to the sheet. On failure the
+        rows are dropped from the buffer (their durable copies stay
+        pending) and the cached worksheet is dropped so the next flush
+        re-authorizes.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            rows = [row for row, _ in batch]
+            try:
+                sheet = self.worksheet()
+                with telemetry.span("sheets append_rows", rows=len(rows)), \
+                        telemetry.timed("sheets_duration", operation="append_rows"):
+                    sheet.append_rows(rows, value_input_option="RAW")
+            except Exception:
+                self._sheet = None
+                return 0
+            if self.written is not None:
+                self.written([ref for _, ref in batch if ref is not None])
+            return len(rows)
+
+    def _flush_periodically(self) -> None:
+        while not self._wakeup.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # The rows stay pending in the journal; keep flushing.
+
+    def close(self) -> None:
+        """Stop the background flusher and write out anything buffered."""
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+
+_sinks: dict[tuple[str, str], SheetsSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sheets_sink(creds_path: str, sheet_id: str, written=None) -> SheetsSink:
+    """Return the process-wide sink for a spreadsheet, creating it once."""
+    key = (creds_path, sheet_id)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = _sinks[key] = SheetsSink(creds_path, sheet_id, written=written)
+        return sink
+
+
+def close_sinks() -> None:
+    """Flush and close every open sink."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
+
+
+atexit.register(close_sinks)
@@ -0,0 +1,215 @@
+"""Offline-first local store of captured tasks.
+
+With CAPTURE_LOCAL_STORE_DB set, this SQLite file — not Notion — is the
+system of record. capture_task and capture_batch write each task as one
+row holding everything the agent worked out (title, category,
+confidence, priority, notes, topic fields and routing status) and
+confirm straight away; sync.py pushes pending rows to the Notion
+databases in config/databases.py in the background. A Notion outage
+delays the sync, never the capture, and nothing goes to the fallback
+log for it.
+
+Each row records how far its sync got, so a retry resumes from the last
+completed step instead of creating pages twice:
+    pending → master (master record created) → topic (topic entry
+    created) → synced (master record linked to the topic entry)
+
+Rows are claimed with a lease, so an agent and a separate sync process
+can share one store file without pushing the same row twice.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_RETRY_BASE_SECONDS = 2.0
+MAX_RETRY_DELAY_SECONDS = 300.0
+SYNC_STATES = ("pending", "master", "topic", "synced")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    category TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    confidence TEXT NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    fields TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL,
+    sync_state TEXT NOT NULL DEFAULT 'pending',
+    master_page_id TEXT,
+    topic_page_id TEXT,
+    topic_url TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_sync_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_unsynced ON tasks (sync_state, next_sync_at);
+"""
+
+_ROW_COLUMNS = (
+    "id", "title", "category", "priority", "confidence", "notes", "fields",
+    "status", "sync_state", "master_page_id", "topic_page_id", "topic_url",
+    "attempts", "last_error",
+)
+# Columns a sync step may write back.
+_PROGRESS_COLUMNS = ("sync_state", "master_page_id", "topic_page_id", "topic_url")
+
+
+def store_path() -> str | None:
+    """The local store file from CAPTURE_LOCAL_STORE_DB, if configured."""
+    return os.environ.get("CAPTURE_LOCAL_STORE_DB") or None
+
+
+def _row(values) -> dict:
+    row = dict(zip(_ROW_COLUMNS, values))
+    row["fields"] = json.loads(row["fields"])
+    return row
+
+
+class TaskStore:
+    """SQLite-backed task rows with per-row sync state and leases.
+
+    Safe to call from several threads and processes; each thread gets
+    its own connection.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        retry_base: float = DEFAULT_RETRY_BASE_SECONDS,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.retry_base = retry_base
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def add(
+        self,
+        title: str,
+        category: str,
+        priority: str,
+        confidence: str,
+        status: str,
+        notes: str = "",
+        fields: dict | None = None,
+    ) -> int:
+        """Store a captured task as pending sync. Returns its row id."""
+        now = time.time()
+        with self._connect() as db:
+            (row_id,) = db.execute(
+                "INSERT INTO tasks (title, category, priority, confidence, notes, "
+                "fields, status, next_sync_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                (title, category, priority, confidence, notes,
+                 json.dumps(fields or {}), status, now, now, now),
+            ).fetchone()
+        return row_id
+
+    def get(self, row_id: int) -> dict | None:
+        values = self._connect().execute(
+            f"SELECT {', '.join(_ROW_COLUMNS)} FROM tasks WHERE id = ?", (row_id,)
+        ).fetchone()
+        return _row(values) if values else None
+
+    def claim(self, owner: str, limit: int) -> list[dict]:
+        """Lease up to limit unsynced rows that are due, oldest first."""
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute(
+                "UPDATE tasks SET lease_owner = ?, lease_expires = ?, updated_at = ? "
+                "WHERE id IN (SELECT id FROM tasks WHERE sync_state != 'synced' "
+                "AND next_sync_at <= ? AND (lease_expires IS NULL OR lease_expires <= ?) "
+                "ORDER BY next_sync_at, id LIMIT ?) "
+                f"RETURNING {', '.join(_ROW_COLUMNS)}",
+                (owner, now + self.lease_seconds, now, now, now, limit),
+            ).fetchall()
+        return sorted((_row(values) for values in rows), key=lambda row: row["id"])
+
+    def _update_lease(self, row: dict, owner: str, sql: str, params: tuple) -> bool:
+        with self._connect() as db:
+            cursor = db.execute(
+                f"UPDATE tasks SET {sql}, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (*params, time.time(), row["id"], owner),
+            )
+        return cursor.rowcount == 1
+
+    def checkpoint(self, row: dict, owner: str) -> bool:
+        """Save the row's sync progress and extend the lease.
+
+        Releases the lease once the row is synced. False if the lease
+        was lost.
+        """
+        released = row["sync_state"] == "synced"
+        return self._update_lease(
+            row, owner,
+            ", ".join(f"{column} = ?" for column in _PROGRESS_COLUMNS)
+            + ", lease_owner = ?, lease_expires = ?",
+            (*(row[column] for column in _PROGRESS_COLUMNS),
+             None if released else owner,
+             None if released else time.time() + self.lease_seconds),
+        )
+
+    def fail(self, row: dict, owner: str, error: str) -> bool:
+        """Record a failed sync attempt and retry the row later with backoff."""
+        delay = min(MAX_RETRY_DELAY_SECONDS, self.retry_base * 2 ** row["attempts"])
+        return self._update_lease(
+            row, owner,
+            "attempts = attempts + 1, last_error = ?, next_sync_at = ?, "
+            "lease_owner = NULL, lease_expires = NULL",
+            (error, time.time() + delay),
+        )
+
+    def stats(self) -> dict:
+        """Row counts by sync state, failing rows, and the oldest unsynced age."""
+        db = self._connect()
+        counts = dict(db.execute("SELECT sync_state, COUNT(*) FROM tasks GROUP BY sync_state"))
+        failing, oldest = db.execute(
+            "SELECT COUNT(*) FILTER (WHERE attempts > 0), MIN(created_at) "
+            "FROM tasks WHERE sync_state != 'synced'"
+        ).fetchone()
+        return {
+            **{state: counts.get(state, 0) for state in SYNC_STATES},
+            "failing": failing,
+            "oldest_unsynced_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+        }
+
+    def failing(self, limit: int = 100) -> list[dict]:
+        """Unsynced rows whose last attempt failed, most attempts first."""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(_ROW_COLUMNS)} FROM tasks "
+            "WHERE sync_state != 'synced' AND attempts > 0 "
+            "ORDER BY attempts DESC, id LIMIT ?", (limit,),
+        ).fetchall()
+        return [_row(values) for values in rows]
+
+
+_stores: dict[str, TaskStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str | None = None) -> TaskStore:
+    """Return the process-wide store for path (default CAPTURE_LOCAL_STORE_DB)."""
+    path = os.path.abspath(path or store_path())
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = TaskStore(path)
+        return store
@@ -0,0 +1,232 @@
+"""Incremental sync of the local task store to Notion.
+
+The engine claims unsynced rows of the local store (see store.py) in
+batches and pushes each one to Notion with bounded concurrency and the
+shared rate limiter: master record, then topic entry, then the link
+update, checkpointing the row after every step. A failed row is retried
+later with exponential backoff and stays in the store meanwhile, so an
+outage only lengthens the backlog.
+
+In the agent, the engine runs on a background thread that syncs every
+CAPTURE_SYNC_INTERVAL_SECONDS and straight after each capture. The CLI
+syncs from a separate process, e.g. on a host that outlives the agent.
+
+Usage:
+    python -m task_capture_agent.tools.sync [--db tasks.sqlite] [--watch]
+    python -m task_capture_agent.tools.sync --stats
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import threading
+
+from task_capture_agent.tools import aio, breaker, idempotency
+from task_capture_agent.tools.client import aclose_clients
+from task_capture_agent.tools.store import TaskStore, get_store, store_path
+
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_CONCURRENCY = 5
+DEFAULT_INTERVAL_SECONDS = 5.0
+DEFAULT_DRAIN_SECONDS = 10.0
+
+
+class LeaseLost(Exception):
+    """Another syncer took over the row; this one must stop touching it."""
+
+
+class SyncEngine:
+    """Pushes unsynced rows of a TaskStore to Notion.
+
+    Settings are read from the environment unless passed explicitly:
+        CAPTURE_SYNC_BATCH_SIZE: Rows claimed per batch (default 25).
+        CAPTURE_SYNC_CONCURRENCY: Rows synced at once (default 5).
+        CAPTURE_SYNC_INTERVAL_SECONDS: Background sync period (default 5).
+    """
+
+    def __init__(
+        self,
+        store: TaskStore,
+        batch_size: int | None = None,
+        concurrency: int | None = None,
+        interval: float | None = None,
+    ):
+        self.store = store
+        self.batch_size = batch_size or int(
+            os.environ.get("CAPTURE_SYNC_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        )
+        self.concurrency = concurrency or int(
+            os.environ.get("CAPTURE_SYNC_CONCURRENCY", DEFAULT_CONCURRENCY)
+        )
+        self.interval = interval if interval is not None else float(
+            os.environ.get("CAPTURE_SYNC_INTERVAL_SECONDS", DEFAULT_INTERVAL_SECONDS)
+        )
+        # Imported here, not at module level: the capture pipeline imports this module.
+        import socket
+
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    async def sync_batch(self) -> dict:
+        """Claim and push one batch. Returns counts of synced and failed rows.
+
+        Claims nothing while the Notion circuit breaker is open, so rows
+        don't use up retries on calls that would fail fast.
+        """
+        if not breaker.get_breaker().available():
+            return {"synced": 0, "failed": 0}
+        rows = self.store.claim(self.owner, self.batch_size)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        stats = {"synced": 0, "failed": 0}
+
+        async def sync(row: dict) -> None:
+            async with semaphore:
+                try:
+                    await self._sync_row(row)
+                except LeaseLost:
+                    return
+                except Exception as error:
+                    stats["failed"] += 1
+                    self.store.fail(row, self.owner, str(error))
+                else:
+                    stats["synced"] += 1
+
+        await asyncio.gather(*(sync(row) for row in rows))
+        return stats
+
+    async def sync_all(self) -> dict:
+        """Push batches until none is due or one has a failure.
+
+        A failure usually means Notion is down, so its retries are left
+        to a later pass instead of hammering it. Returns total synced
+        and failed rows.
+        """
+        totals = {"synced": 0, "failed": 0}
+        while not self._stop.is_set():
+            stats = await self.sync_batch()
+            totals = {key: totals[key] + stats[key] for key in totals}
+            if stats["failed"] or not stats["synced"]:
+                break
+        return totals
+
+    async def _sync_row(self, row: dict) -> None:
+        """Run the steps the row hasn't completed yet, checkpointing each."""
+        # Per-row dedup session: a create retried after a crash between
+        # the Notion call and the checkpoint returns the original page,
+        # because with a local store the dedup cache is kept in the store
+        # file (see idempotency.py). That holds while the retry comes
+        # within CAPTURE_DEDUP_TTL_SECONDS; a later one creates a duplicate.
+        with idempotency.session_scope(f"local-store:{row['id']}"):
+            if row["sync_state"] == "pending":
+                master = await aio.create_master_record(row["title"], row["priority"])
+                self._advance(row, sync_state="master", master_page_id=master["page_id"])
+            if row["sync_state"] == "master":
+                topic = await aio.create_topic_entry(
+                    row["category"], row["title"], row["priority"], row["notes"],
+                    **row["fields"],
+                )
+                self._advance(
+                    row, sync_state="topic", topic_page_id=topic["page_id"],
+                    topic_url=topic["url"],
+                )
+            if row["sync_state"] == "topic":
+                await aio.update_master_record(
+                    row["master_page_id"], row["status"], row["category"],
+                    row["topic_url"], row["confidence"],
+                )
+                self._advance(row, sync_state="synced")
+        if row["status"] == "Routed":
+            from task_capture_agent import memo
+
+            memo.get_memo().remember(
+                row["title"], row["category"], row["confidence"], row["priority"],
+                row["fields"],
+            )
+
+    def _advance(self, row: dict, **progress) -> None:
+        row.update(progress)
+        if not self.store.checkpoint(row, self.owner):
+            raise LeaseLost(row["id"])
+
+    # --- background thread ---
+
+    def nudge(self) -> None:
+        """Sync soon: start the background thread if needed and wake it."""
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name="capture-sync", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    loop.run_until_complete(self.sync_all())
+                except sqlite3.Error:
+                    pass  # Store busy or unavailable; the rows are retried next pass.
+                self._wake.wait(self.interval)
+            loop.run_until_complete(aclose_clients())
+        finally:
+            loop.close()
+
+    def close(self, timeout: float = DEFAULT_DRAIN_SECONDS) -> None:
+        """Stop after the current batch. Unsynced rows stay in the store."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_engine: SyncEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_sync_engine() -> SyncEngine:
+    """Return the process-wide engine for CAPTURE_LOCAL_STORE_DB, creating it once."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SyncEngine(get_store())
+            atexit.register(_engine.close)
+        return _engine
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    engine = SyncEngine(get_store(args.db))
+    try:
+        while True:
+            stats = await engine.sync_all()
+            if not args.watch:
+                return {**stats, **engine.store.stats()}
+            await asyncio.sleep(engine.interval)
+    finally:
+        await aclose_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=store_path(), help="Store file (default CAPTURE_LOCAL_STORE_DB)")
+    parser.add_argument("--watch", action="store_true", help="Keep syncing every interval")
+    parser.add_argument("--stats", action="store_true", help="Print sync state counts and exit")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("set CAPTURE_LOCAL_STORE_DB or pass --db")
+    if args.stats:
+        store = get_store(args.db)
+        print(json.dumps({**store.stats(), "failing_rows": store.failing(20)}, indent=2))
+    else:
+        try:
+            print(json.dumps(asyncio.run(_main(args)), indent=2))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,167 @@
+"""Fixtures for the capture pipeline benchmarks.
+
+Notion is replaced by a fake client that sleeps for an injected latency
+before answering, so end-to-end numbers reflect the pipeline's own
+overhead and concurrency rather than the network.
+
+Each benchmark's p50/p99 is compared with its entry in baselines.json
+and fails if either regresses beyond the allowed threshold. Baselines
+are absolute timings from the machine that recorded them, so the
+benchmarks are skipped in a plain test run; pass --benchmark-only or
+-m benchmark to run them.
+
+Settings are read from the environment:
+    BENCHMARK_NOTION_LATENCY_MS: Simulated Notion latency (default 20).
+    BENCHMARK_MAX_REGRESSION: Allowed slowdown vs baseline, as a
+        fraction (default 0.5, i.e. 50% slower fails).
+    BENCHMARK_UPDATE_BASELINES: Set to 1 to rewrite baselines.json
+        from this run instead of checking against it.
+"""
+
+import asyncio
+import gc
+import itertools
+import json
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_LATENCY_MS = 20.0
+DEFAULT_MAX_REGRESSION = 0.5
+# Absolute slack so microsecond-level benchmarks don't fail on timer noise.
+NOISE_FLOOR_MS = 0.02
+
+_baselines_lock = threading.Lock()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(config, items):
+    """Mark the benchmarks, and skip them unless they were asked for."""
+    here = os.path.dirname(os.path.abspath(__file__)) + os.sep
+    benchmarks = [item for item in items if str(item.path).startswith(here)]
+    for item in benchmarks:
+        item.add_marker(pytest.mark.benchmark)
+    if config.getoption("benchmark_only", False) or "benchmark" in config.option.markexpr:
+        return
+    skip = pytest.mark.skip(reason="benchmarks are opt-in: pass --benchmark-only or -m benchmark")
+    for item in benchmarks:
+        item.add_marker(skip)
+
+
+def notion_latency() -> float:
+    """Simulated Notion latency in seconds."""
+    return float(os.environ.get("BENCHMARK_NOTION_LATENCY_MS", DEFAULT_LATENCY_MS)) / 1000
+
+
+def _percentile(data: list[float], q: float) -> float:
+    ordered = sorted(data)
+    index = min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class _FakePages:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._ids = itertools.count()
+
+    def _page(self) -> dict:
+        page_id = f"page-{next(self._ids)}"
+        return {"id": page_id, "url": f"https://notion.so/{page_id}"}
+
+    def create(self, **kwargs) -> dict:
+        time.sleep(self.latency)
+        return self._page()
+
+    def update(self, **kwargs) -> dict:
+        time.sleep(self.latency)
+        return {}
+
+
+class _FakeAsyncPages(_FakePages):
+    async def create(self, **kwargs) -> dict:
+        await asyncio.sleep(self.latency)
+        return self._page()
+
+    async def update(self, **kwargs) -> dict:
+        await asyncio.sleep(self.latency)
+        return {}
+
+
+@pytest.fixture
+def fake_notion(monkeypatch):
+    """Patch the sync and async Notion clients with latency-injecting fakes."""
+    latency = notion_latency()
+    sync_client, async_client = MagicMock(), MagicMock()
+    sync_client.pages = _FakePages(latency)
+    async_client.pages = _FakeAsyncPages(latency)
+    monkeypatch.setattr("task_capture_agent.tools.notion._get_client", lambda: sync_client)
+    monkeypatch.setattr("task_capture_agent.tools.aio._get_async_client", lambda: async_client)
+    return latency
+
+
+@pytest.fixture
+def unique_titles():
+    """Distinct task titles, so the idempotency cache never short-circuits."""
+    counter = itertools.count()
+    return lambda prefix="Benchmark task": f"{prefix} {next(counter)}"
+
+
+@pytest.fixture
+def perf_gate(request, benchmark):
+    """Run a benchmark, then check its p50/p99 against the stored baseline.
+
+    Use as perf_gate(fn) or perf_gate(fn, rounds=N) for slow calls.
+    Benchmarks that depend on the simulated latency only compare with a
+    baseline recorded at the same latency.
+    """
+    name = request.node.name
+
+    def run(fn, rounds: int | None = None, latency_bound: bool = False):
+        # Start from a clean heap so a full collection of whatever the rest
+        # of the suite imported doesn't land in a measured round.
+        gc.collect()
+        if rounds:
+            result = benchmark.pedantic(fn, rounds=rounds, iterations=1, warmup_rounds=1)
+        else:
+            result = benchmark(fn)
+        data = benchmark.stats.stats.data
+        measured = {
+            "p50_ms": round(_percentile(data, 50) * 1000, 4),
+            "p99_ms": round(_percentile(data, 99) * 1000, 4),
+        }
+        if latency_bound:
+            measured["latency_ms"] = notion_latency() * 1000
+        _check(name, measured)
+        return result
+
+    return run
+
+
+def _check(name: str, measured: dict) -> None:
+    with _baselines_lock:
+        try:
+            with open(BASELINES_PATH) as f:
+                baselines = json.load(f)
+        except FileNotFoundError:
+            baselines = {}
+        if os.environ.get("BENCHMARK_UPDATE_BASELINES") == "1":
+            baselines[name] = measured
+            with open(BASELINES_PATH, "w") as f:
+                json.dump(baselines, f, indent=2, sort_keys=True)
+                f.write("\n")
+            return
+
+    baseline = baselines.get(name)
+    if baseline is None or baseline.get("latency_ms") != measured.get("latency_ms"):
+        pytest.skip(f"no baseline for {name} at this latency; run with BENCHMARK_UPDATE_BASELINES=1")
+    threshold = float(os.environ.get("BENCHMARK_MAX_REGRESSION", DEFAULT_MAX_REGRESSION))
+    for key in ("p50_ms", "p99_ms"):
+        limit = baseline[key] * (1 + threshold) + NOISE_FLOOR_MS
+        assert measured[key] <= limit, (
+            f"{name} {key} regressed: {measured[key]:.4f} ms vs baseline "
+            f"{baseline[key]:.4f} ms (limit {limit:.4f} ms)"
+        )
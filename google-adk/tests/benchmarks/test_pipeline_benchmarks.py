@@ -0,0 +1,124 @@
+"""Benchmarks for the capture pipeline's hot paths.
+
+Run on their own with:
+    pytest tests/benchmarks --benchmark-only
+"""
+
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from task_capture_agent.config.databases import TOPIC_DATABASES
+from task_capture_agent.tools import journal, notion, routing
+from task_capture_agent.tools.capture import capture_batch, capture_task
+from task_capture_agent.tools.fallback import log_fallback
+from task_capture_agent.tools.journal import FallbackJournal
+from task_capture_agent.tools.routing import RoutingWorker
+from task_capture_agent.tools.schema import DatabaseEncoder
+
+SHOPPING_FIELDS = {
+    "location": "Trader Joe's",
+    "cost_estimate": 42.5,
+    "suggested_category": "ignored outside Needs Sorting",
+}
+
+FALLBACK_BATCH = 20
+
+SHOPPING_SCHEMA = {
+    "Task": {"type": "title", "options": []},
+    "Priority": {"type": "select", "options": []},
+    "Status": {"type": "status", "options": ["To Do", "Done"]},
+    "Location": {"type": "rich_text", "options": []},
+    "Cost Estimate": {"type": "number", "options": []},
+    "Notes": {"type": "rich_text", "options": []},
+}
+
+
+class TestEncodingBenchmarks:
+    def test_build_properties(self, perf_gate):
+        fields = {
+            "Task": "Pick up dry cleaning", "Status": "Pending", "Priority": "High",
+            "Notes": "Before Friday", "Cost Estimate": 18.0, "Location": "Main St",
+        }
+        perf_gate(lambda: notion._build_properties(fields))
+
+    def test_topic_entry_field_mapping(self, perf_gate):
+        perf_gate(lambda: notion._topic_entry_request(
+            "Shopping / Errands", "Buy a lamp", "Medium", "For the desk", SHOPPING_FIELDS,
+        ))
+
+    def test_schema_encoder(self, perf_gate):
+        encoder = DatabaseEncoder(
+            TOPIC_DATABASES["Shopping / Errands"]["data_source_id"], SHOPPING_SCHEMA,
+        )
+        fields = {
+            "Task": "Buy a lamp", "Priority": "Medium", "Status": "to do",
+            "Location": "IKEA", "Cost Estimate": "$42.50", "Notes": "For the desk",
+        }
+        perf_gate(lambda: encoder.encode(fields))
+
+
+class TestFallbackBenchmarks:
+    def test_log_fallback_local(self, perf_gate, monkeypatch, unique_titles, isolated_fallback_log):
+        monkeypatch.delenv("GOOGLE_SHEETS_CREDENTIALS_PATH", raising=False)
+        monkeypatch.delenv("GOOGLE_SHEETS_FALLBACK_ID", raising=False)
+        # fsync time depends on the disk, not the code; measure everything else.
+        monkeypatch.setitem(
+            journal._journals, os.path.abspath(str(isolated_fallback_log)),
+            FallbackJournal(str(isolated_fallback_log), fsync=False),
+        )
+
+        # Batches of writes, so one slow fsync doesn't dominate the p99.
+        def write_batch():
+            for _ in range(FALLBACK_BATCH):
+                log_fallback(unique_titles(), "Personal", "Low", "timeout")
+
+        perf_gate(write_batch, rounds=30)
+
+
+class TestNotionLatencyBenchmarks:
+    def test_create_topic_entry(self, perf_gate, fake_notion, unique_titles):
+        perf_gate(
+            lambda: notion.create_topic_entry(
+                "Shopping / Errands", unique_titles(), **SHOPPING_FIELDS
+            ),
+            rounds=20, latency_bound=True,
+        )
+
+    def test_capture_task_end_to_end(self, perf_gate, fake_notion, unique_titles):
+        def capture():
+            result = asyncio.run(capture_task(
+                unique_titles(), "Technical / Dev", extra_fields={"project": "api"},
+            ))
+            assert result["status"] == "Routed"
+
+        # Master and topic creates overlap, so this should stay near 2x latency, not 3x.
+        perf_gate(capture, rounds=20, latency_bound=True)
+
+    def test_capture_task_write_behind(self, perf_gate, fake_notion, unique_titles, monkeypatch):
+        worker = RoutingWorker(queue_size=100, concurrency=5)
+        monkeypatch.setattr(routing, "_worker", worker)
+        monkeypatch.setenv("CAPTURE_WRITE_BEHIND", "1")
+
+        def capture():
+            result = asyncio.run(capture_task(
+                unique_titles(), "Technical / Dev", extra_fields={"project": "api"},
+            ))
+            assert result["routing"] == "queued"
+
+        # Only the master create is on the caller's path: ~1x latency, not 2x.
+        try:
+            perf_gate(capture, rounds=20, latency_bound=True)
+        finally:
+            worker.close()
+
+    def test_capture_batch_of_ten(self, perf_gate, fake_notion, unique_titles):
+        def capture():
+            tasks = [{"title": unique_titles(), "category": "Personal"} for _ in range(10)]
+            result = asyncio.run(capture_batch(tasks))
+            assert result["captured"] == 10
+
+        perf_gate(capture, rounds=10, latency_bound=True)
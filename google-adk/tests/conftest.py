@@ -0,0 +1,72 @@
+"""Shared fixtures for the task capture tests."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from task_capture_agent import memo
+from task_capture_agent.config import loader
+from task_capture_agent.tools import breaker, idempotency, ratelimit, schema
+
+
+@pytest.fixture(autouse=True)
+def fast_rate_limiter(monkeypatch):
+    """Give each test its own limiter that won't throttle mocked calls."""
+    limiter = ratelimit.NotionRateLimiter(rate=10_000, burst=10_000, base_delay=0.001)
+    monkeypatch.setattr(ratelimit, "_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_breaker(monkeypatch):
+    """Give each test a closed circuit breaker whose probe never calls Notion."""
+    circuit = breaker.CircuitBreaker(probe=lambda: None)
+    monkeypatch.setattr(breaker, "_breaker", circuit)
+    yield circuit
+    circuit.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_fallback_log(monkeypatch, tmp_path):
+    """Point the local fallback journal at a per-test directory."""
+    log_dir = tmp_path / "fallback_log"
+    monkeypatch.setenv("FALLBACK_LOG_DIR", str(log_dir))
+    return log_dir
+
+
+@pytest.fixture(autouse=True)
+def fresh_dedup_cache(monkeypatch):
+    """Start each test with an empty in-memory idempotency cache."""
+    cache = idempotency.IdempotencyCache(ttl=600, db_path="")
+    monkeypatch.setattr(idempotency, "_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def offline_schema_registry(monkeypatch, tmp_path):
+    """Use a per-test schema cache that never fetches from (mocked) Notion."""
+    registry = schema.SchemaRegistry(cache_path=str(tmp_path / "schemas.json"), fetch=False)
+    monkeypatch.setattr(schema, "_registry", registry)
+    return registry
+
+
+@pytest.fixture(autouse=True)
+def isolated_memo(monkeypatch, tmp_path):
+    """Give each test an empty classification memo of its own."""
+    classification_memo = memo.ClassificationMemo(path=str(tmp_path / "memo.sqlite"))
+    monkeypatch.setattr(memo, "_memo", classification_memo)
+    return classification_memo
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    """Load routing config from a per-test copy of the built-in config, checked on every call."""
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(loader.default_config_data()))
+    monkeypatch.setenv("TASK_CAPTURE_CONFIG", str(path))
+    monkeypatch.setattr(loader, "_watcher", loader.ConfigWatcher(check_seconds=0))
+    return path
@@ -0,0 +1,222 @@
+"""Tests for the agent's static prompt prefix, token budget and model cascade."""
+
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from task_capture_agent import agent
+from task_capture_agent.cascade import CascadeLlm, parse_cascade
+from task_capture_agent.prompt_budget import STATIC_PREFIX_TOKEN_BUDGET, token_report
+
+
+class TestStaticInstruction:
+    def test_instruction_is_sent_as_static_prefix(self):
+        assert agent.root_agent.static_instruction == agent.INSTRUCTION
+        assert not agent.root_agent.instruction
+
+    def test_instruction_has_no_state_placeholders(self):
+        # static_instruction is sent literally; {var} templating would not be filled.
+        assert "{" not in agent.INSTRUCTION
+
+    def test_app_enables_context_caching(self):
+        assert agent.app.root_agent is agent.root_agent
+        assert agent.app.context_cache_config is not None
+        assert agent.app.context_cache_config.ttl_seconds > 0
+
+    def test_instruction_rerendered_once_after_config_reload(self, monkeypatch, config_file):
+        monkeypatch.setattr(agent, "INSTRUCTION", agent.INSTRUCTION)
+        monkeypatch.setattr(agent, "_instruction_version", agent._instruction_version)
+        monkeypatch.setattr(agent.root_agent, "static_instruction", agent.INSTRUCTION)
+        data = json.loads(config_file.read_text())
+        data["categories"]["Travel"] = {"description": "Trips and bookings", "examples": ["Book flights"]}
+        data["topic_databases"]["Travel"] = {"data_source_id": "travel-ds", "name": "Travel"}
+        config_file.write_text(json.dumps(data))
+
+        agent._refresh_instruction(MagicMock())
+        rendered = agent.root_agent.static_instruction
+        assert "| **Travel** | Trips and bookings |" in rendered
+        assert rendered == agent.INSTRUCTION
+        agent._refresh_instruction(MagicMock())
+        assert agent.root_agent.static_instruction is rendered
+
+
+class TestTokenBudget:
+    def test_static_prefix_within_budget(self):
+        report = token_report()
+        assert report["within_budget"], (
+            f"Static prompt prefix is ~{report['static_prefix']} tokens, over the "
+            f"{STATIC_PREFIX_TOKEN_BUDGET} budget: {report}"
+        )
+
+    def test_report_covers_every_tool(self):
+        report = token_report()
+        assert set(report["tools"]) == {tool.__name__ for tool in agent.root_agent.tools}
+        assert report["static_prefix"] == report["static_instruction"] + sum(report["tools"].values())
+
+
+class StubLlm(BaseLlm):
+    """A model that returns a fixed reply (or raises it) and counts its calls."""
+
+    reply: object
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        assert llm_request.model == self.model
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        yield self.reply
+
+
+def _call(name, **args):
+    return LlmResponse(content=types.Content(role="model", parts=[
+        types.Part(function_call=types.FunctionCall(name=name, args=args)),
+    ]))
+
+
+def _text(text):
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _request(*contents):
+    return LlmRequest(model="gemini-2.5-flash", contents=list(contents) or [
+        types.Content(role="user", parts=[types.Part(text="Fix auth bug")]),
+    ])
+
+
+class TestModelCascade:
+    def _run(self, cheap_reply, request=None):
+        cheap = StubLlm(model="small", reply=cheap_reply)
+        full = StubLlm(model="full", reply=_text("Logged to Technical / Dev"))
+        cascade = CascadeLlm(model="full", stages=[cheap, full])
+
+        async def collect():
+            return [r async for r in cascade.generate_content_async(request or _request())]
+
+        return asyncio.run(collect()), cheap, full
+
+    def test_parse_cascade(self, monkeypatch):
+        monkeypatch.delenv("CAPTURE_MODEL_CASCADE", raising=False)
+        assert parse_cascade() == (None, ["gemini-2.5-flash"])
+        assert parse_cascade("local, small, full") == (0.8, ["small", "full"])
+        assert parse_cascade("local:0.9,full") == (0.9, ["full"])
+        for spec in ("local", "small,local,full"):
+            with pytest.raises(ValueError):
+                parse_cascade(spec)
+
+    def test_confident_capture_stays_on_cheap_model(self):
+        reply = _call("capture_task", title="Fix auth bug", category="Technical / Dev",
+                      confidence="High")
+        responses, cheap, full = self._run(reply)
+        assert responses == [reply]
+        assert (cheap.calls, full.calls) == (1, 0)
+
+    @pytest.mark.parametrize("reply", [
+        _call("capture_task", title="Fix auth bug", category="Technical / Dev",
+              confidence="Medium"),
+        _call("capture_batch", tasks=[
+            {"title": "Fix auth bug", "category": "Technical / Dev"},
+            {"title": "Mystery", "category": "Needs Sorting"},
+        ]),
+        _text("Is this for work or for your side project?"),
+        RuntimeError("model overloaded"),
+    ])
+    def test_unsure_question_or_error_escalates(self, reply):
+        responses, cheap, full = self._run(reply)
+        assert responses == [full.reply]
+        assert (cheap.calls, full.calls) == (1, 1)
+
+    def test_confirmation_after_tool_result_is_kept(self):
+        request = _request(
+            types.Content(role="user", parts=[types.Part(text="Fix auth bug")]),
+            _call("capture_task", title="Fix auth bug").content,
+            types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+                name="capture_task", response={"status": "Routed"},
+            ))]),
+        )
+        responses, _, full = self._run(_text("Logged to Technical / Dev"), request)
+        assert full.calls == 0 and len(responses) == 1
+
+    def test_default_agent_uses_one_model(self):
+        assert agent.root_agent.model == agent.CASCADE_MODELS[-1]
+
+
+class TestPreclassifyRoundTrip:
+    def test_no_note_after_tool_result(self, monkeypatch):
+        from google.adk.runners import InMemoryRunner
+
+        class RecordingLlm(BaseLlm):
+            requests: list = []
+
+            async def generate_content_async(self, llm_request, stream=False):
+                self.requests.append(list(llm_request.contents))
+                if len(self.requests) == 1:
+                    yield _call("capture_task", title="Pay electric bill",
+                                category="Personal", confidence="High")
+                else:
+                    yield _text("Logged to Personal")
+
+        model = RecordingLlm(model="recording")
+        monkeypatch.setattr(agent.root_agent, "model", model)
+        client = MagicMock()
+        client.pages.create = AsyncMock(return_value={"id": "page-1", "url": "https://notion.so/page-1"})
+        client.pages.update = AsyncMock(return_value={})
+        runner = InMemoryRunner(agent=agent.root_agent, app_name="round_trip")
+
+        async def run():
+            session = await runner.session_service.create_session(app_name="round_trip", user_id="u")
+            message = types.Content(role="user", parts=[types.Part(text="Pay electric bill")])
+            return [event async for event in runner.run_async(
+                user_id="u", session_id=session.id, new_message=message,
+            )]
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            asyncio.run(run())
+
+        first, second = model.requests
+        assert "Local pre-classification" in first[-1].parts[0].text
+        assert first[-2].parts[0].text == "Pay electric bill"
+        # After the tool result the model sees no new user turn.
+        assert second[-1].parts[0].function_response.name == "capture_task"
+        assert not any(
+            "Local pre-classification" in (part.text or "")
+            for content in second for part in content.parts or []
+        )
+        assert client.pages.create.await_count == 2
+
+
+class TestLocalStage:
+    def _context(self, text):
+        context = MagicMock()
+        context.user_content = types.Content(role="user", parts=[types.Part(text=text)])
+        return context
+
+    @pytest.mark.parametrize("threshold,text,captured", [
+        (0.8, "Fix login bug in auth service", True),
+        (0.8, "Remind me to fix login bug in auth service.", True),
+        (None, "Fix login bug in auth service", False),
+        (0.8, "high priority: fix CI pipeline", False),
+        (0.8, "Fix login bug in the Acme repo", False),
+        (0.8, "Fix login bug by 5pm", False),
+        (0.8, "Fix login bug, then update docs", False),
+        (0.8, "Buy milk", False),
+    ])
+    def test_captures_confident_tasks_without_a_model(self, monkeypatch, threshold, text, captured):
+        monkeypatch.setattr(agent, "LOCAL_THRESHOLD", threshold)
+        capture = AsyncMock(return_value={"status": "Routed"})
+        with patch.object(agent, "capture_task", capture):
+            reply = asyncio.run(agent._route_locally(self._context(text)))
+
+        assert (reply is not None) == captured == capture.called
+        if captured:
+            title = "Fix login bug in auth service"
+            assert capture.await_args.args == (title, "Technical / Dev", "High", "Medium")
+            assert reply.parts[0].text == f'Logged to Technical / Dev: "{title}"'
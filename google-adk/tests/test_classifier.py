@@ -0,0 +1,229 @@
+"""Tests for the local pre-classifier and its agent hook.
+
+Accuracy is measured against a held-out labelled fixture set so changes
+to categories or features that hurt classification show up here. The
+calibration is fitted on a separate split, and neither split contains
+the config's category examples, which are the classifier's prototypes.
+"""
+
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from task_capture_agent import classifier as classifier_module
+from task_capture_agent.classifier import (
+    LocalClassifier, classify, evaluate, fit_calibration, get_classifier,
+)
+from task_capture_agent.config.categories import CATEGORIES
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+CALIBRATION_SPLIT = os.path.join(FIXTURES, "calibration_tasks.jsonl")
+HELDOUT_SPLIT = os.path.join(FIXTURES, "heldout_tasks.jsonl")
+
+
+def _titles(path):
+    with open(path) as f:
+        return {json.loads(line)["title"] for line in f if line.strip()}
+
+
+class TestLocalClassifier:
+    def test_obvious_task_is_confident(self):
+        result = classify("Get groceries")
+        assert result["category"] == "Shopping / Errands"
+        assert result["confidence"] >= 0.8
+
+    def test_unrelated_text_is_not_confident(self):
+        assert not classify("xyzzy")["confident"]
+
+    def test_threshold_is_configurable(self):
+        strict = LocalClassifier(threshold=1.01)
+        assert not strict.classify("Get groceries")["confident"]
+
+    def test_rebuilt_when_config_reloads(self, config_file):
+        before = get_classifier()
+        assert get_classifier() is before
+        data = json.loads(config_file.read_text())
+        data["categories"]["Travel"] = {"description": "Trips, flights and hotels",
+                                        "examples": ["Book flights to Lisbon"]}
+        data["topic_databases"]["Travel"] = {"data_source_id": "travel-ds", "name": "Travel"}
+        config_file.write_text(json.dumps(data))
+        assert get_classifier() is not before
+        assert classify("Book flights to Lisbon")["category"] == "Travel"
+
+    def test_batch_matches_single(self):
+        classifier = LocalClassifier()
+        texts = ["Pay electric bill", "Fix auth bug in login flow", "xyzzy"]
+        assert classifier.classify_many(texts) == [classifier.classify(t) for t in texts]
+        assert classifier.classify_many([]) == []
+
+
+class TestAccuracyReport:
+    def test_splits_exclude_prototypes_and_each_other(self):
+        examples = {e for info in CATEGORIES.values() for e in info["examples"]}
+        calibration, heldout = _titles(CALIBRATION_SPLIT), _titles(HELDOUT_SPLIT)
+        assert not calibration & examples
+        assert not heldout & examples
+        assert not calibration & heldout
+
+    def test_calibration_is_fitted_on_calibration_split(self):
+        assert fit_calibration(CALIBRATION_SPLIT, LocalClassifier()) == (
+            classifier_module.CALIBRATION_SLOPE, classifier_module.CALIBRATION_INTERCEPT,
+        )
+
+    def test_heldout_accuracy(self):
+        report = evaluate(HELDOUT_SPLIT)
+        assert report["total"] >= 40
+        assert report["accuracy"] >= 0.75
+        # Confident predictions skip the LLM, so they must not be wrong.
+        assert report["confident_accuracy"] == 1.0
+        assert report["confident_coverage"] >= 0.25
+
+    def test_heldout_latency(self):
+        report = evaluate(HELDOUT_SPLIT)
+        assert report["latency_ms_p50"] < 5.0
+
+
+class TestPreclassifyCallback:
+    def _context(self, text):
+        from google.genai import types
+        context = MagicMock()
+        context.user_content = types.Content(role="user", parts=[types.Part(text=text)])
+        return context
+
+    def test_confident_task_adds_note(self):
+        from google.adk.models import LlmRequest
+        from task_capture_agent.agent import _preclassify
+
+        context = self._context("Pay electric bill")
+        request = LlmRequest(contents=[context.user_content])
+        assert _preclassify(context, request) is None
+        assert request.contents[0] is context.user_content
+        assert 'Local pre-classification: "Personal"' in request.contents[-1].parts[0].text
+        # The static, cached system instruction must not change per request.
+        assert not request.config.system_instruction
+
+    @pytest.mark.parametrize("text", ["xyzzy", "Get groceries\nFix CI"])
+    def test_uncertain_or_multi_task_left_to_model(self, text):
+        from google.adk.models import LlmRequest
+        from task_capture_agent.agent import _preclassify
+
+        context = self._context(text)
+        request = LlmRequest(contents=[context.user_content])
+        _preclassify(context, request)
+        assert request.contents == [context.user_content]
+
+
+class TestClassificationMemo:
+    def _context(self, text):
+        from google.genai import types
+        context = MagicMock()
+        context.session.id = "session-1"
+        context.user_content = types.Content(role="user", parts=[types.Part(text=text)])
+        return context
+
+    def _mock_client(self):
+        from unittest.mock import AsyncMock
+
+        client = MagicMock()
+        client.pages.create = AsyncMock(return_value={"id": "page-1", "url": "https://notion.so/page-1"})
+        client.pages.update = AsyncMock(return_value={})
+        return client
+
+    def test_lookup_is_normalized_and_counted(self, isolated_memo):
+        isolated_memo.put(["Pay electric bill"], {"category": "Personal"})
+        assert isolated_memo.get("  pay ELECTRIC bill ") == {"category": "Personal"}
+        assert isolated_memo.get("Pay water bill") is None
+        stats = isolated_memo.stats()
+        assert (stats["entries"], stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        from task_capture_agent.memo import ClassificationMemo
+
+        memo = ClassificationMemo(path=str(tmp_path / "lru.sqlite"), max_entries=2)
+        memo.put(["a"], {"n": 1})
+        memo.put(["b"], {"n": 2})
+        memo.get("a")
+        memo.put(["c"], {"n": 3})
+        assert memo.get("b") is None
+        assert memo.get("a") == {"n": 1}
+        assert memo.stats()["entries"] == 2
+
+    def test_routed_capture_is_remembered_under_title_only(self, isolated_memo):
+        import asyncio
+        from unittest.mock import patch
+        from task_capture_agent.tools.capture import capture_task
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=self._mock_client()):
+            asyncio.run(capture_task(
+                "Buy milk", "Shopping / Errands", priority="Low",
+                tool_context=self._context("grab some milk on the way home"),
+                extra_fields={"location": "Corner shop"},
+            ))
+            # A clarification answer is the message when the task is captured.
+            asyncio.run(capture_task(
+                "Renew Acme contract", "Business / Sales", tool_context=self._context("yes"),
+            ))
+            asyncio.run(capture_task("Something odd", "Needs Sorting"))
+
+        entry = isolated_memo.get("Buy milk")
+        assert entry["category"] == "Shopping / Errands"
+        assert isolated_memo.get("grab some milk on the way home") is None
+        assert isolated_memo.get("yes") is None
+        assert isolated_memo.get("Renew Acme contract")["category"] == "Business / Sales"
+        assert entry["fields"] == {"location": "Corner shop"}
+        assert isolated_memo.get("Something odd") is None
+
+    @pytest.mark.parametrize("message,title", [
+        ("Pay electric bill", "pay electric bill"),
+        ("Remind me to pay electric bill.", "pay electric bill"),
+        ("todo: Get groceries!", "get groceries"),
+        ("Pay electric bill?", None),
+        ("Get groceries, fix CI", None),
+        ("Get groceries\nFix CI", None),
+        ("Pay electric bill, high priority", None),
+        ("", None),
+    ])
+    def test_task_title(self, message, title):
+        from task_capture_agent.memo import task_title
+
+        assert task_title(message) == title
+
+    def test_memo_lookup_uses_the_title_key_space(self, isolated_memo):
+        import asyncio
+        from unittest.mock import AsyncMock, patch
+        from task_capture_agent import agent
+
+        isolated_memo.remember("Pay electric bill", "Personal", "High", "Medium")
+        capture = AsyncMock(return_value={"status": "Routed"})
+        with patch.object(agent, "capture_task", capture):
+            hit = asyncio.run(agent._route_from_memo(self._context("Remind me to pay electric bill")))
+            question = asyncio.run(agent._route_from_memo(self._context("Pay electric bill?")))
+
+        assert hit.parts[0].text == 'Logged to Personal: "Pay electric bill"'
+        assert question is None
+        assert capture.await_count == 1
+
+    def test_memo_hit_captures_without_the_model(self, isolated_memo):
+        import asyncio
+        from unittest.mock import AsyncMock, patch
+        from task_capture_agent import agent
+
+        isolated_memo.put(["Pay electric bill"], {
+            "title": "Pay electric bill", "category": "Personal",
+            "confidence": "High", "priority": "High", "fields": {"area": "Home"},
+        })
+        capture = AsyncMock(return_value={"status": "Routed"})
+        with patch.object(agent, "capture_task", capture):
+            reply = asyncio.run(agent._route_from_memo(self._context("pay electric bill")))
+            missed = asyncio.run(agent._route_from_memo(self._context("Fix CI")))
+
+        assert reply.parts[0].text == 'Logged to Personal: "Pay electric bill"'
+        assert capture.await_args.args == ("Pay electric bill", "Personal", "High", "High")
+        assert capture.await_args.kwargs["extra_fields"] == {"area": "Home"}
+        assert missed is None
+        assert capture.await_count == 1
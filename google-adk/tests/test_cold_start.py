@@ -0,0 +1,108 @@
+"""Cold-start tests: import cost of the agent module and the startup snapshot.
+
+The import benchmark runs `python -X importtime` in a fresh interpreter
+with google.adk already loaded, as it is under `adk api_server`, so it
+measures only what this package adds to startup.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from task_capture_agent import snapshot
+from task_capture_agent.classifier import LocalClassifier
+from task_capture_agent.tools.schema import SchemaRegistry
+
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+# Cumulative import time of task_capture_agent.agent on top of google.adk.
+IMPORT_BUDGET_MS = 80
+
+_PRELOAD_ADK = (
+    "from google.adk.agents import Agent; "
+    "import google.adk.apps, google.adk.models, google.adk.agents.context_cache_config; "
+)
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", code],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+    )
+
+
+def agent_import_ms() -> float:
+    """Cumulative import time of task_capture_agent.agent, from -X importtime."""
+    stderr = _run(_PRELOAD_ADK + "import task_capture_agent.agent").stderr
+    for line in stderr.splitlines():
+        if line.rstrip().endswith("| task_capture_agent.agent"):
+            return int(line.split("|")[1]) / 1000
+    raise AssertionError(f"task_capture_agent.agent not in importtime output:\n{stderr[-2000:]}")
+
+
+class TestImportTime:
+    def test_heavy_dependencies_are_deferred(self):
+        result = _run(
+            _PRELOAD_ADK + "import json, sys, task_capture_agent.agent; "
+            "print(json.dumps([m for m in ('numpy', 'notion_client', 'gspread', 'opentelemetry.sdk.metrics') if m in sys.modules]))"
+        )
+        assert json.loads(result.stdout) == []
+
+    def test_import_within_budget(self):
+        # Best of three, to keep scheduler noise out of the measurement.
+        best = min(agent_import_ms() for _ in range(3))
+        assert best <= IMPORT_BUDGET_MS, (
+            f"importing task_capture_agent.agent took {best:.1f} ms, "
+            f"budget is {IMPORT_BUDGET_MS} ms"
+        )
+
+
+class TestSnapshot:
+    @pytest.fixture
+    def snapshot_path(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "snapshot.json")
+        monkeypatch.setenv("TASK_CAPTURE_SNAPSHOT", path)
+        snapshot.load_snapshot.cache_clear()
+        yield path
+        snapshot.load_snapshot.cache_clear()
+
+    def test_round_trip(self, snapshot_path):
+        from task_capture_agent.agent import INSTRUCTION
+
+        snapshot.write_snapshot(snapshot_path)
+        loaded = snapshot.load_snapshot()
+        assert loaded["instruction"] == INSTRUCTION
+
+        restored = LocalClassifier.from_export(loaded["classifier"])
+        fresh = LocalClassifier()
+        for text in ("Get groceries", "Fix the login bug", "xyzzy"):
+            assert restored.classify(text) == fresh.classify(text)
+
+    def test_stale_snapshot_ignored(self, snapshot_path):
+        with open(snapshot_path, "w") as f:
+            json.dump({"fingerprint": "old-build", "instruction": "stale"}, f)
+        assert snapshot.load_snapshot() == {}
+
+    def test_missing_snapshot_ignored(self, snapshot_path):
+        assert snapshot.load_snapshot() == {}
+
+    def test_schemas_seed_the_registry(self, snapshot_path, tmp_path):
+        from task_capture_agent.config.databases import MASTER_DB_ID
+
+        with open(snapshot_path, "w") as f:
+            json.dump({
+                "fingerprint": snapshot.fingerprint(),
+                "schemas": {MASTER_DB_ID: {
+                    "fetched_at": time.time(),
+                    "properties": {"Status": {"type": "status", "options": ["Pending"]}},
+                }},
+            }, f)
+        registry = SchemaRegistry(cache_path=str(tmp_path / "empty.json"), ttl=600, fetch=False)
+        encoder = registry.cached_encoder(MASTER_DB_ID)
+        assert encoder.encode({"Status": "pending"}) == {"Status": {"status": {"name": "Pending"}}}
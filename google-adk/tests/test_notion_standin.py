@@ -0,0 +1,162 @@
+"""Tests for the local Notion stand-in server, driven through the real
+notion_client and the capture tools."""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from notion_client import APIResponseError
+
+from task_capture_agent.config.databases import MASTER_DB_ID, TOPIC_DATABASES
+from task_capture_agent.notion_standin import LatencyModel, NotionStandIn
+from task_capture_agent.tools import client as client_module
+from task_capture_agent.tools import schema
+from task_capture_agent.tools.capture import capture_batch, capture_task
+from task_capture_agent.tools.client import NotionClientManager
+from task_capture_agent.tools.notion import create_master_record
+
+
+@pytest.fixture
+def standin(request, monkeypatch, tmp_path):
+    """Start a stand-in (kwargs via indirect parametrize) and point the tools at it.
+
+    The tools fetch schemas from it, as they would from Notion, so
+    requests are built by the schema-driven encoders.
+    """
+    server = NotionStandIn(**getattr(request, "param", {})).start()
+    monkeypatch.setenv("NOTION_API_KEY", "secret_standin")
+    monkeypatch.setattr(schema, "_registry", schema.SchemaRegistry(cache_path=str(tmp_path / "schemas.json")))
+    monkeypatch.setattr(client_module, "_manager", NotionClientManager(base_url=server.url))
+    yield server
+    client_module._manager.close()
+    server.stop()
+
+
+def _stats(server):
+    return httpx.get(f"{server.url}/_standin/stats").json()
+
+
+class TestLatencyModel:
+    def test_distributions(self):
+        assert LatencyModel("constant:50").sample() == 0.05
+        uniform = LatencyModel("uniform:10,20")
+        assert all(0.01 <= uniform.sample() <= 0.02 for _ in range(100))
+        assert LatencyModel("normal:5,50").sample() >= 0
+
+    def test_lognormal_median(self):
+        import random
+        model = LatencyModel("lognormal:80,0.5", random.Random(1))
+        samples = sorted(model.sample() for _ in range(2001))
+        assert 0.07 < samples[1000] < 0.09
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            LatencyModel("pareto:1")
+
+
+class TestStandInApi:
+    def test_create_and_update_through_tools(self, standin):
+        result = asyncio.run(capture_task(
+            "Fix auth bug", "Technical / Dev", extra_fields={"project": "login"},
+        ))
+        assert result["status"] == "Routed"
+        stats = _stats(standin)
+        # Two schema fetches, two creates and the master update.
+        assert stats["200"] == 5
+        assert stats["pages"] == 2
+        (master,) = [
+            page for page in standin.pages.values()
+            if page["parent"]["data_source_id"] == MASTER_DB_ID
+        ]
+        assert master["properties"]["Status"] == {"status": {"name": "Routed"}}
+        assert master["properties"]["Topic Link"] == {"url": result["topic_url"]}
+        (topic,) = [page for page in standin.pages.values() if page is not master]
+        assert topic["properties"]["Status"] == {"status": {"name": "To Do"}}
+
+    def test_unknown_data_source_is_404(self, standin):
+        client = client_module.get_client()
+        with pytest.raises(APIResponseError) as error:
+            client.pages.create(parent={"data_source_id": "nope"}, properties={})
+        assert error.value.status == 404
+
+    def test_wrong_property_type_is_400(self, standin):
+        client = client_module.get_client()
+        with pytest.raises(APIResponseError) as error:
+            client.pages.create(
+                parent={"data_source_id": MASTER_DB_ID},
+                properties={"Status": {"rich_text": []}},
+            )
+        assert error.value.status == 400
+        assert error.value.code == "validation_error"
+
+    @pytest.mark.parametrize("status", [{"select": {"name": "Pending"}}, {"status": {"name": "Bogus"}}])
+    def test_status_must_be_a_known_status_option(self, standin, status):
+        client = client_module.get_client()
+        with pytest.raises(APIResponseError) as error:
+            client.pages.create(parent={"data_source_id": MASTER_DB_ID}, properties={"Status": status})
+        assert error.value.status == 400
+
+    def test_data_source_schema(self, standin):
+        data_source_id = TOPIC_DATABASES["Shopping / Errands"]["data_source_id"]
+        response = client_module.get_client().data_sources.retrieve(data_source_id=data_source_id)
+        assert response["properties"]["Cost Estimate"]["type"] == "number"
+        assert response["properties"]["Status"]["type"] == "status"
+        master = client_module.get_client().data_sources.retrieve(data_source_id=MASTER_DB_ID)
+        assert master["properties"]["Topic Link"]["type"] == "url"
+        assert [o["name"] for o in master["properties"]["Status"]["status"]["options"]] == [
+            "Pending", "Routed", "Needs Sorting",
+        ]
+
+    def test_requires_auth(self, standin):
+        response = httpx.post(f"{standin.url}/v1/pages", json={})
+        assert response.status_code == 401
+
+
+class TestFaultInjection:
+    @pytest.mark.parametrize("standin", [{"rate": 5, "burst": 1}], indirect=True)
+    def test_rate_limit_sends_retry_after(self, standin):
+        headers = {"Authorization": "Bearer x"}
+        responses = [
+            httpx.get(f"{standin.url}/v1/data_sources/{MASTER_DB_ID}", headers=headers)
+            for _ in range(3)
+        ]
+        limited = [r for r in responses if r.status_code == 429]
+        assert limited
+        assert limited[0].headers["Retry-After"] == "1"
+        assert limited[0].json()["code"] == "rate_limited"
+
+    @pytest.mark.parametrize("standin", [{"rate": 5, "burst": 1}], indirect=True)
+    def test_tools_recover_from_rate_limiting(self, standin):
+        first = create_master_record("Task one")
+        second = create_master_record("Task two")
+        assert first["page_id"] != second["page_id"]
+        assert _stats(standin)["429"] >= 1
+
+    @pytest.mark.parametrize("standin", [{"error_rate": 1.0, "seed": 7}], indirect=True)
+    def test_persistent_5xx_falls_back(self, standin, fast_rate_limiter):
+        fast_rate_limiter.max_retries = 1
+        result = asyncio.run(capture_task("Buy milk", "Shopping / Errands"))
+        assert result["status"] == "Fallback"
+        stats = _stats(standin)
+        assert sum(stats.get(code, 0) for code in ("500", "502", "503")) >= 2
+        assert stats["pages"] == 0
+
+    @pytest.mark.parametrize("standin", [{"outages": [(0.0, 0.3)]}], indirect=True)
+    def test_outage_window(self, standin, fast_rate_limiter, fresh_breaker):
+        fast_rate_limiter.max_retries = 0
+        # Failed schema fetches count too; keep the breaker out of this test.
+        fresh_breaker.min_calls = 100
+        result = asyncio.run(capture_batch([
+            {"title": "Call Dad", "category": "Personal"},
+            {"title": "Fix CI", "category": "Technical / Dev"},
+        ]))
+        assert result["fallback"] == 2
+        time.sleep(0.3)
+        assert not standin.in_outage()
+        assert asyncio.run(capture_task("Call Mom", "Personal"))["status"] == "Routed"
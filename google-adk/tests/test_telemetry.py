@@ -0,0 +1,215 @@
+"""Tests for tracing and the in-process Prometheus metrics."""
+
+import asyncio
+import inspect
+import os
+import sys
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from task_capture_agent import telemetry
+from task_capture_agent.notion_standin import NotionStandIn
+from task_capture_agent.tools import client as client_module
+from task_capture_agent.tools import ratelimit, schema
+from task_capture_agent.tools.capture import capture_task
+from task_capture_agent.tools.client import NotionClientManager
+from task_capture_agent.tools.fallback import log_fallback
+
+_exporter = InMemorySpanExporter()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def providers():
+    """Install an in-memory tracer provider and the metrics reader once."""
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(_exporter))
+        trace.set_tracer_provider(provider)
+    return telemetry.configure_metrics()
+
+
+@pytest.fixture
+def spans():
+    _exporter.clear()
+    yield _exporter.get_finished_spans
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    server = NotionStandIn().start()
+    monkeypatch.setenv("NOTION_API_KEY", "secret_standin")
+    monkeypatch.setattr(schema, "_registry", schema.SchemaRegistry(cache_path=str(tmp_path / "schemas.json")))
+    monkeypatch.setattr(client_module, "_manager", NotionClientManager(base_url=server.url))
+    yield server
+    client_module._manager.close()
+    server.stop()
+
+
+def sample(reader, line_prefix: str) -> float:
+    """Value of the first rendered sample starting with line_prefix, or 0."""
+    for line in reader.render().splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+class TestTracedTool:
+    def test_keeps_tool_signature(self):
+        assert inspect.iscoroutinefunction(capture_task)
+        assert "tool_context" in inspect.signature(capture_task).parameters
+        assert capture_task.__doc__.startswith("Capture one classified task")
+
+    def test_sync_tool_error_is_recorded(self, providers, spans):
+        @telemetry.traced_tool
+        def broken():
+            raise ValueError("boom")
+
+        before = sample(providers, 'task_capture_tool_duration_seconds_count{outcome="ValueError",tool="broken"}')
+        with pytest.raises(ValueError):
+            broken()
+        (span,) = spans()
+        assert span.name == "tool broken"
+        assert span.status.status_code == trace.StatusCode.ERROR
+        assert sample(providers, 'task_capture_tool_duration_seconds_count{outcome="ValueError",tool="broken"}') == before + 1
+
+
+class TestCaptureTelemetry:
+    def test_capture_spans_nest_notion_calls(self, standin, spans):
+        result = asyncio.run(capture_task("Fix auth bug", "Technical / Dev"))
+        assert result["status"] == "Routed"
+
+        by_name = {}
+        for span in spans():
+            by_name.setdefault(span.name, []).append(span)
+        (outer,) = by_name["tool capture_task"]
+        assert len(by_name["notion pages.create"]) == 2
+        (update,) = by_name["notion pages.update"]
+        (update_tool,) = by_name["tool update_master_record"]
+        assert update.parent.span_id == update_tool.context.span_id
+        assert update_tool.parent.span_id == outer.context.span_id
+
+    def test_routes_and_latency_metrics(self, providers, standin):
+        routed = 'task_capture_routes_total{status="Routed"}'
+        unsorted = 'task_capture_routes_total{status="Needs Sorting"}'
+        creates = 'task_capture_notion_duration_seconds_count{operation="pages.create",outcome="ok"}'
+        before = [sample(providers, key) for key in (routed, unsorted, creates)]
+
+        asyncio.run(capture_task("Buy milk", "Shopping / Errands"))
+        asyncio.run(capture_task("Something odd", "Needs Sorting"))
+
+        after = [sample(providers, key) for key in (routed, unsorted, creates)]
+        assert [b - a for a, b in zip(before, after)] == [1, 1, 4]
+        assert sample(providers, 'task_capture_capture_duration_seconds_count{status="Routed"}') >= 1
+
+    def test_fallback_counter(self, providers, monkeypatch):
+        monkeypatch.delenv("GOOGLE_SHEETS_CREDENTIALS_PATH", raising=False)
+        monkeypatch.delenv("GOOGLE_SHEETS_FALLBACK_ID", raising=False)
+        key = 'task_capture_fallbacks_total{sink="local_file"}'
+        before = sample(providers, key)
+        log_fallback("Call the bank", "Personal", "High", "503")
+        assert sample(providers, key) == before + 1
+
+
+class TestRetryTelemetry:
+    def test_retries_counted_and_marked_on_span(self, providers, spans):
+        class Unavailable(Exception):
+            status = 503
+            headers = {}
+
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise Unavailable()
+            return {"ok": True}
+
+        key = 'task_capture_notion_retries_total{operation="flaky",status="503"}'
+        before = sample(providers, key)
+        limiter = ratelimit.NotionRateLimiter(rate=1000, burst=10, max_retries=2, base_delay=0.001)
+        assert limiter.call(flaky) == {"ok": True}
+
+        assert sample(providers, key) == before + 1
+        (span,) = spans()
+        assert span.name == "notion flaky"
+        assert [event.name for event in span.events] == ["retry"]
+
+
+class TestAgentCallbacks:
+    def test_llm_and_run_latency(self, providers):
+        context = SimpleNamespace(invocation_id="inv-1", agent_name="task_capture_agent")
+        llm = 'task_capture_llm_duration_seconds_count{agent="task_capture_agent",outcome="ok"}'
+        run = 'task_capture_agent_run_duration_seconds_count{agent="task_capture_agent",outcome="ok"}'
+        before = sample(providers, llm), sample(providers, run)
+
+        telemetry.before_agent(context)
+        assert telemetry.before_model(context, None) is None
+        assert telemetry.after_model(context, None) is None
+        telemetry.after_agent(context)
+
+        assert (sample(providers, llm), sample(providers, run)) == (before[0] + 1, before[1] + 1)
+        assert telemetry._started == {}
+
+    def test_turn_answered_without_model_records_run(self, providers, monkeypatch):
+        from task_capture_agent import agent
+
+        async def fake_capture(*args, **kwargs):
+            return {"status": "Routed"}
+
+        monkeypatch.setattr(agent, "capture_task", fake_capture)
+        context = SimpleNamespace(invocation_id="inv-memo", agent_name="task_capture_agent")
+        run = 'task_capture_agent_run_duration_seconds_count{agent="task_capture_agent",outcome="ok"}'
+        before = sample(providers, run)
+
+        telemetry.before_agent(context)
+        asyncio.run(agent._capture_and_confirm(context, "Pay electric bill", "Personal", "High", "Medium", {}))
+
+        assert sample(providers, run) == before + 1
+        assert telemetry._started == {}
+
+    def test_agent_registers_callbacks(self):
+        from task_capture_agent.agent import root_agent
+
+        assert root_agent.before_agent_callback[0] is telemetry.before_agent
+        assert telemetry.before_model in root_agent.before_model_callback
+        assert root_agent.on_model_error_callback is telemetry.on_model_error
+
+
+class TestPrometheusExport:
+    def test_histogram_buckets_are_cumulative(self, providers):
+        @telemetry.traced_tool
+        def quick():
+            return None
+
+        quick()
+        lines = [
+            line for line in providers.render().splitlines()
+            if line.startswith("task_capture_tool_duration_seconds_bucket{")
+            and 'tool="quick"' in line
+        ]
+        counts = [float(line.rsplit(" ", 1)[1]) for line in lines]
+        assert counts == sorted(counts)
+        assert 'le="+Inf"' in lines[-1]
+        count = sample(providers, 'task_capture_tool_duration_seconds_count{outcome="ok",tool="quick"}')
+        assert counts[-1] == count
+
+    def test_metrics_endpoint(self, providers):
+        server = telemetry._serve(providers, "127.0.0.1", 0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                body = response.read().decode()
+                assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "# TYPE task_capture_tool_duration_seconds histogram" in body
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -6,8 +6,10 @@ requiring a live Notion connection.
 
 import os
 import json
+import asyncio
 import tempfile
-from unittest.mock import MagicMock, patch
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -23,6 +25,279 @@ from task_capture_agent.tools.notion import (
     _build_properties,
 )
 from task_capture_agent.tools.fallback import log_fallback
+from task_capture_agent.tools.client import NotionClientManager
+from task_capture_agent.tools import aio, breaker, idempotency, jobqueue, notion, routing, store, sync
+from task_capture_agent.tools.capture import capture_batch, capture_task
+from task_capture_agent.tools.replay import ReplayCheckpoint, replay_fallback
+from task_capture_agent.tools.bulk_import import bulk_import
+from task_capture_agent.tools.routing import RoutingWorker
+from task_capture_agent.tools.jobqueue import JobQueue
+from task_capture_agent.tools.store import TaskStore
+from task_capture_agent.tools.sync import SyncEngine
+from task_capture_agent.tools.sheets import SheetsSink
+from task_capture_agent.tools.journal import FallbackJournal
+from task_capture_agent.tools.idempotency import IdempotencyCache, session_scope
+from task_capture_agent.tools.schema import SchemaError, SchemaRegistry
+from task_capture_agent.tools.ratelimit import (
+    PRIORITY_CREATE,
+    PRIORITY_UPDATE,
+    NotionRateLimiter,
+)
+from task_capture_agent.tools.breaker import CircuitBreaker, CircuitOpenError
+from task_capture_agent.config.loader import ConfigError, compile_config, default_config_data, get_config
+
+
+# --- NotionClientManager tests ---
+
+class TestNotionClientManager:
+    def test_reuses_one_client(self, monkeypatch):
+        monkeypatch.setenv("NOTION_API_KEY", "secret-1")
+        manager = NotionClientManager()
+        try:
+            assert manager.get_client() is manager.get_client()
+        finally:
+            manager.close()
+
+    def test_shared_across_threads(self, monkeypatch):
+        from concurrent.futures import ThreadPoolExecutor
+        monkeypatch.setenv("NOTION_API_KEY", "secret-1")
+        manager = NotionClientManager()
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                clients = list(pool.map(lambda _: manager.get_client(), range(32)))
+            assert len({id(c) for c in clients}) == 1
+        finally:
+            manager.close()
+
+    def test_pool_settings_from_env(self, monkeypatch):
+        monkeypatch.setenv("NOTION_API_KEY", "secret-1")
+        monkeypatch.setenv("NOTION_POOL_SIZE", "4")
+        monkeypatch.setenv("NOTION_TIMEOUT_SECONDS", "5")
+        manager = NotionClientManager()
+        try:
+            client = manager.get_client()
+            assert manager.pool_size == 4
+            assert client.options.timeout_ms == 5000
+        finally:
+            manager.close()
+
+    def test_new_client_after_close_or_key_change(self, monkeypatch):
+        monkeypatch.setenv("NOTION_API_KEY", "secret-1")
+        manager = NotionClientManager()
+        first = manager.get_client()
+        manager.close()
+        second = manager.get_client()
+        assert second is not first
+        monkeypatch.setenv("NOTION_API_KEY", "secret-2")
+        assert manager.get_client() is not second
+        manager.close()
+
+
+# --- NotionRateLimiter tests ---
+
+class FakeAPIError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = {"retry-after": retry_after} if retry_after else {}
+
+
+class TestNotionRateLimiter:
+    def test_limits_to_rate(self):
+        import time
+        limiter = NotionRateLimiter(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        # One token up front, then four more at 20/s.
+        assert time.monotonic() - start >= 0.18
+
+    def test_updates_go_before_creates(self):
+        import threading
+        import time
+        limiter = NotionRateLimiter(rate=10, burst=1)
+        limiter.acquire()
+        order = []
+
+        def worker(priority, label):
+            limiter.acquire(priority)
+            order.append(label)
+
+        create = threading.Thread(target=worker, args=(PRIORITY_CREATE, "create"))
+        create.start()
+        time.sleep(0.02)
+        update = threading.Thread(target=worker, args=(PRIORITY_UPDATE, "update"))
+        update.start()
+        time.sleep(0.02)
+        assert limiter.queue_depth == 2
+        create.join()
+        update.join()
+        assert order == ["update", "create"]
+
+    def test_retries_5xx_then_succeeds(self):
+        limiter = NotionRateLimiter(rate=1000, burst=10, base_delay=0.001)
+        fn = MagicMock(side_effect=[FakeAPIError(503), FakeAPIError(502), "ok"])
+        assert limiter.call(fn, page_id="p") == "ok"
+        assert fn.call_count == 3
+        assert limiter.stats()["retries"] == 2
+
+    def test_429_pauses_whole_bucket_for_retry_after(self):
+        import time
+        limiter = NotionRateLimiter(rate=1000, burst=10)
+        fn = MagicMock(side_effect=[FakeAPIError(429, retry_after="1"), "ok"])
+        start = time.monotonic()
+        assert limiter.call(fn) == "ok"
+        assert time.monotonic() - start >= 0.95
+
+    def test_client_errors_not_retried(self):
+        limiter = NotionRateLimiter(rate=1000, burst=10)
+        fn = MagicMock(side_effect=FakeAPIError(400))
+        with pytest.raises(FakeAPIError):
+            limiter.call(fn)
+        assert fn.call_count == 1
+
+    def test_gives_up_after_max_retries(self):
+        limiter = NotionRateLimiter(rate=1000, burst=10, max_retries=2, base_delay=0.001)
+        fn = MagicMock(side_effect=FakeAPIError(500))
+        with pytest.raises(FakeAPIError):
+            limiter.call(fn)
+        assert fn.call_count == 3
+
+    def test_creates_not_retried_once_notion_may_have_applied_them(self):
+        limiter = NotionRateLimiter(rate=1000, burst=10, base_delay=0.001)
+        fn = MagicMock(side_effect=[FakeAPIError(503), "ok"])
+        with pytest.raises(FakeAPIError):
+            limiter.call(fn, idempotent=False)
+        assert fn.call_count == 1
+
+    def test_creates_retried_when_never_sent(self):
+        import httpx
+        limiter = NotionRateLimiter(rate=1000, burst=10, base_delay=0.001)
+        fn = MagicMock(side_effect=[
+            FakeAPIError(429, retry_after="0"), httpx.ConnectError("refused"), "ok",
+        ])
+        assert limiter.call(fn, idempotent=False) == "ok"
+        assert fn.call_count == 3
+
+    def test_async_waiter_woken_when_line_moves(self):
+        # At 0.1/s a polling waiter would recheck every ten seconds.
+        limiter = NotionRateLimiter(rate=0.1, burst=1)
+        with limiter._cond:
+            head = limiter._enqueue(PRIORITY_UPDATE)
+
+        async def run():
+            waiter = asyncio.create_task(limiter.acquire_async())
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+            limiter._abandon(head)
+            await asyncio.wait_for(waiter, 1.0)
+
+        asyncio.run(run())
+        assert limiter.queue_depth == 0
+
+    def test_async_callers_share_bucket(self):
+        limiter = NotionRateLimiter(rate=50, burst=1)
+
+        async def fn():
+            return "ok"
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            results = await asyncio.gather(*(limiter.acall(fn) for _ in range(6)))
+            return results, loop.time() - start
+
+        results, elapsed = asyncio.run(run())
+        assert results == ["ok"] * 6
+        assert elapsed >= 0.09
+
+
+# --- CircuitBreaker tests ---
+
+def _wait_for(predicate, timeout=2.0):
+    import time
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+class TestCircuitBreaker:
+    def test_opens_on_error_rate_and_fails_fast(self):
+        circuit = CircuitBreaker(min_calls=4, failure_rate=0.5, open_seconds=60)
+        circuit.record(0.1)
+        circuit.record(0.1, FakeAPIError(400))  # Notion answered: not a failure.
+        circuit.record(0.1, FakeAPIError(429))  # The rate limiter's business: not counted.
+        circuit.record(0.1, FakeAPIError(503))
+        assert circuit.state == breaker.CLOSED
+        circuit.record(0.1, TimeoutError("read timed out"))
+        assert circuit.state == breaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            circuit.check()
+        assert circuit.stats()["trips"] == 1
+        circuit.close()
+
+    def test_slow_calls_count_as_failures(self):
+        circuit = CircuitBreaker(min_calls=3, slow_call_seconds=1.0, open_seconds=60)
+        for _ in range(3):
+            circuit.record(2.5)
+        assert circuit.state == breaker.OPEN
+        circuit.close()
+
+    def test_background_probe_closes_once_healthy(self):
+        outcomes = [FakeAPIError(502), None]
+
+        def probe():
+            outcome = outcomes.pop(0)
+            if outcome:
+                raise outcome
+
+        circuit = CircuitBreaker(min_calls=1, open_seconds=0.01, probe=probe)
+        circuit.record(0.1, FakeAPIError(500))
+        assert _wait_for(lambda: circuit.available())
+        assert outcomes == [] and circuit.stats()["recent_calls"] == 0
+
+    def test_probes_again_after_close(self):
+        probes = []
+        circuit = CircuitBreaker(min_calls=1, open_seconds=0.01, probe=lambda: probes.append(1))
+        circuit.record(0.1, FakeAPIError(500))
+        circuit.close()
+        assert circuit.available()
+
+        circuit.record(0.1, FakeAPIError(500))
+        assert circuit.state == breaker.OPEN
+        assert _wait_for(lambda: circuit.available())
+        assert probes
+        circuit.close()
+
+    def test_limiter_stops_retrying_once_open(self, fresh_breaker):
+        fresh_breaker.min_calls = 2
+        fresh_breaker.open_seconds = 60
+        limiter = NotionRateLimiter(rate=1000, burst=10, base_delay=0.001)
+        fn = MagicMock(side_effect=FakeAPIError(503))
+        with pytest.raises(CircuitOpenError):
+            limiter.call(fn)
+        assert fn.call_count == 2
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(limiter.acall(AsyncMock()))
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_open_breaker_sends_captures_straight_to_fallback(
+        self, mock_get_client, fresh_breaker, monkeypatch
+    ):
+        fresh_breaker.min_calls = 1
+        fresh_breaker.open_seconds = 60
+        fresh_breaker.record(0.1, FakeAPIError(503))
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.log_fallback",
+            lambda *args, **kwargs: {"logged_to": "local_file"},
+        )
+
+        result = asyncio.run(capture_task("Pay rent", "Personal"))
+
+        assert result["status"] == "Fallback"
+        assert "circuit breaker open" in result["error"]
+        mock_get_client.assert_not_called()
 
 
 # --- _build_properties tests ---
@@ -50,6 +325,152 @@ class TestBuildProperties:
         assert "Task" in result
 
 
+# --- schema registry tests ---
+
+MASTER_SCHEMA = {"properties": {
+    "Task": {"type": "title", "title": {}},
+    "Status": {"type": "status", "status": {"options": [
+        {"name": "Pending"}, {"name": "Routed"}, {"name": "Needs Sorting"},
+    ]}},
+    "Priority": {"type": "select", "select": {"options": [{"name": "Medium"}]}},
+    "Source": {"type": "select", "select": {"options": []}},
+    "Category": {"type": "select", "select": {"options": []}},
+    "Topic Link": {"type": "url", "url": {}},
+    "Confidence": {"type": "select", "select": {"options": []}},
+    "Created": {"type": "created_time", "created_time": {}},
+}}
+
+SHOPPING_SCHEMA = {"properties": {
+    "Task": {"type": "title", "title": {}},
+    "Status": {"type": "select", "select": {"options": [{"name": "To Do"}]}},
+    "Priority": {"type": "select", "select": {"options": []}},
+    "Cost Estimate": {"type": "number", "number": {}},
+    "Location": {"type": "rich_text", "rich_text": {}},
+}}
+
+
+class TestSchemaRegistry:
+    @pytest.fixture
+    def registry(self, tmp_path, monkeypatch):
+        from task_capture_agent.tools import schema
+        registry = SchemaRegistry(cache_path=str(tmp_path / "schemas.json"), ttl=600)
+        monkeypatch.setattr(schema, "_registry", registry)
+        return registry
+
+    def _client(self):
+        client = MagicMock()
+        client.data_sources.retrieve.side_effect = lambda data_source_id: (
+            MASTER_SCHEMA if data_source_id == MASTER_DB_ID else SHOPPING_SCHEMA
+        )
+        client.pages.create.return_value = {"id": "p", "url": "u"}
+        return client
+
+    def test_encodes_with_real_property_types(self, registry):
+        encoder = registry.load(MASTER_DB_ID, self._client())
+        props = encoder.encode({
+            "Status": "routed",
+            "Topic Link": "https://notion.so/x",
+            "Unknown": "dropped",
+        })
+        assert props == {
+            "Status": {"status": {"name": "Routed"}},
+            "Topic Link": {"url": "https://notion.so/x"},
+        }
+
+    def test_number_strings_are_parsed(self, registry):
+        encoder = registry.load(TOPIC_DATABASES["Shopping / Errands"]["data_source_id"], self._client())
+        assert encoder.encode({"Cost Estimate": "$1,025.50"}) == {"Cost Estimate": {"number": 1025.5}}
+        with pytest.raises(SchemaError):
+            encoder.encode({"Cost Estimate": "about twenty"})
+
+    def test_invalid_values_rejected_before_request(self, registry):
+        client = self._client()
+        registry.load(MASTER_DB_ID, client)
+        with patch("task_capture_agent.tools.notion._get_client", return_value=client):
+            with pytest.raises(SchemaError):
+                update_master_record("page-1", "Bogus", "Personal", "https://notion.so/t")
+            with pytest.raises(SchemaError):
+                create_topic_entry("Shopping / Errands", "x", priority="High, urgent")
+        client.pages.update.assert_not_called()
+        client.pages.create.assert_not_called()
+
+    def test_read_only_properties_rejected(self, registry):
+        encoder = registry.load(MASTER_DB_ID, self._client())
+        with pytest.raises(SchemaError):
+            encoder.encode({"Created": "2026-01-01"})
+
+    def test_topic_entry_uses_database_schema(self, registry):
+        client = self._client()
+        with patch("task_capture_agent.tools.notion._get_client", return_value=client):
+            create_topic_entry("Shopping / Errands", "Buy a lamp", cost_estimate="$40")
+        props = client.pages.create.call_args[1]["properties"]
+        assert props["Cost Estimate"] == {"number": 40}
+        assert "Notes" not in props
+
+    def test_schema_fetched_once_and_cached_on_disk(self, registry):
+        client = self._client()
+        registry.load(MASTER_DB_ID, client)
+        registry.load(MASTER_DB_ID, client)
+        assert client.data_sources.retrieve.call_count == 1
+
+        other = SchemaRegistry(cache_path=registry.cache_path, ttl=600)
+        assert other.load(MASTER_DB_ID, MagicMock()).types["Status"] == "status"
+
+        expired = SchemaRegistry(cache_path=registry.cache_path, ttl=0)
+        expired.load(MASTER_DB_ID, client)
+        assert client.data_sources.retrieve.call_count == 2
+
+    def test_stored_schemas_read_once_until_config_reloads(self, registry, config_file, monkeypatch):
+        reads = []
+        read_disk = registry._read_disk
+        monkeypatch.setattr(registry, "_read_disk", lambda: reads.append(1) or read_disk())
+        for _ in range(3):
+            assert registry.cached_encoder(MASTER_DB_ID) is None
+        assert len(reads) == 1
+
+        data = json.loads(config_file.read_text())
+        data["confidence_threshold"] = 0.9
+        config_file.write_text(json.dumps(data))
+        registry.cached_encoder(MASTER_DB_ID)
+        assert len(reads) == 2
+
+    def test_fetch_failure_falls_back_to_heuristic(self, registry):
+        client = self._client()
+        client.data_sources.retrieve.side_effect = FakeAPIError(404)
+        with patch("task_capture_agent.tools.notion._get_client", return_value=client):
+            create_master_record("Test task")
+            create_master_record("Another task")
+        props = client.pages.create.call_args[1]["properties"]
+        assert props["Status"] == {"select": {"name": "Pending"}}
+        # Backs off instead of refetching on every call.
+        assert client.data_sources.retrieve.call_count == 1
+
+    def test_outage_does_not_back_off(self, registry, fast_rate_limiter):
+        fast_rate_limiter.max_retries = 0
+        client = self._client()
+        client.data_sources.retrieve.side_effect = [FakeAPIError(503), MASTER_SCHEMA]
+        assert registry.load(MASTER_DB_ID, client) is None
+        assert registry.load(MASTER_DB_ID, client).types["Status"] == "status"
+
+    def test_concurrent_async_loads_share_one_fetch(self, registry):
+        client = MagicMock()
+        calls = []
+
+        async def retrieve(data_source_id):
+            calls.append(data_source_id)
+            await asyncio.sleep(0.02)
+            return MASTER_SCHEMA
+
+        client.data_sources.retrieve = retrieve
+
+        async def run():
+            return await asyncio.gather(*(registry.aload(MASTER_DB_ID, client) for _ in range(5)))
+
+        encoders = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(encoder is encoders[0] for encoder in encoders)
+
+
 # --- create_master_record tests ---
 
 class TestCreateMasterRecord:
@@ -171,19 +592,10 @@ class TestUpdateMasterRecord:
 # --- log_fallback tests ---
 
 class TestLogFallback:
-    def test_logs_to_local_file_when_no_sheets(self, monkeypatch):
+    def test_logs_to_local_file_when_no_sheets(self, monkeypatch, isolated_fallback_log):
         monkeypatch.delenv("GOOGLE_SHEETS_CREDENTIALS_PATH", raising=False)
         monkeypatch.delenv("GOOGLE_SHEETS_FALLBACK_ID", raising=False)
 
-        # Point fallback to a temp file
-        import tempfile
-        tmp_dir = tempfile.mkdtemp()
-        fallback_file = os.path.join(tmp_dir, "fallback_log.jsonl")
-        monkeypatch.setattr(
-            "task_capture_agent.tools.fallback.os.path.join",
-            lambda *args: fallback_file,
-        )
-
         result = log_fallback(
             title="Test task",
             category="Personal",
@@ -191,12 +603,1299 @@ class TestLogFallback:
         )
 
         assert result["logged_to"] == "local_file"
-        with open(fallback_file) as f:
-            entry = json.loads(f.readline())
+        journal = FallbackJournal(str(isolated_fallback_log))
+        [(_, _, entry)] = list(journal.pending())
         assert entry["title"] == "Test task"
         assert entry["error"] == "Notion 503"
 
 
+# --- FallbackJournal tests ---
+
+class TestFallbackJournal:
+    def test_concurrent_writers_never_interleave(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+        journal = FallbackJournal(str(tmp_path), max_segment_bytes=4096)
+
+        def write(worker):
+            for i in range(25):
+                journal.append({"title": f"w{worker}-{i}", "pad": "x" * 40})
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(write, range(8)))
+
+        titles = [entry["title"] for _, _, entry in journal.pending()]
+        assert len(titles) == len(set(titles)) == 200
+        assert journal.stats()["segments"] > 1
+
+    def test_group_commit_shares_fsyncs(self, tmp_path, monkeypatch):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        journal = FallbackJournal(str(tmp_path))
+        real_fsync = os.fsync
+        fsyncs = []
+
+        def slow_fsync(fd):
+            fsyncs.append(fd)
+            threading.Event().wait(0.01)
+            real_fsync(fd)
+
+        monkeypatch.setattr("task_capture_agent.tools.journal.os.fsync", slow_fsync)
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(lambda i: journal.append({"title": str(i)}), range(64)))
+        # Two fds per commit; one fsync per entry would be 128.
+        assert len(fsyncs) < 64
+
+    def test_replayed_entries_skipped_and_compacted(self, tmp_path):
+        journal = FallbackJournal(str(tmp_path), max_segment_bytes=100)
+        for i in range(6):
+            journal.append({"title": f"task {i}", "pad": "x" * 40})
+        pending = list(journal.pending())
+        for segment, offset, _ in pending[:4]:
+            journal.mark_replayed(segment, offset)
+            journal.mark_replayed(segment, offset)  # idempotent
+
+        assert [e["title"] for _, _, e in journal.pending()] == ["task 4", "task 5"]
+        assert journal.stats()["pending"] == 2
+        removed = journal.compact()
+        assert removed == 2
+        assert journal.stats()["pending"] == 2
+
+    def test_marks_are_read_incrementally_and_shared(self, tmp_path):
+        journal = FallbackJournal(str(tmp_path), fsync=False)
+        journal.append_many([{"title": f"task {i}"} for i in range(50)])
+        other = FallbackJournal(str(tmp_path), fsync=False)
+        pending = list(journal.pending())
+        with patch.object(
+            FallbackJournal, "_replayed_offsets", side_effect=AssertionError("full reread")
+        ):
+            for segment, offset, _ in pending[:40]:
+                journal.mark_replayed(segment, offset)
+            # Marks written by another instance are picked up, not duplicated.
+            for segment, offset, _ in pending[30:45]:
+                other.mark_replayed(segment, offset)
+            journal.mark_replayed(*pending[44][:2])
+
+        done = os.path.join(str(tmp_path), "00000001.done")
+        assert os.path.getsize(done) == 45 * 8
+        assert [e["title"] for _, _, e in journal.pending()] == [f"task {i}" for i in range(45, 50)]
+
+    def test_recovers_from_torn_write(self, tmp_path):
+        journal = FallbackJournal(str(tmp_path))
+        journal.append({"title": "first"})
+        journal.close()
+        segment = os.path.join(str(tmp_path), "00000001.jsonl")
+        with open(segment, "ab") as f:
+            f.write(b'{"title": "second"}\n{"title": "torn')
+
+        reopened = FallbackJournal(str(tmp_path))
+        reopened.append({"title": "third"})
+        titles = [e["title"] for _, _, e in reopened.pending()]
+        assert titles == ["first", "second", "third"]
+
+
+# --- async tool tests ---
+
+class TestAsyncTools:
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_master_then_topic_then_update(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(return_value={"id": "p-1", "url": "u-1"})
+        mock_client.pages.update = AsyncMock(return_value={})
+        mock_get_client.return_value = mock_client
+
+        async def run():
+            master = await aio.create_master_record("Fix auth bug", priority="High")
+            topic = await aio.create_topic_entry(
+                category="Technical / Dev", title="Fix auth bug", project="login",
+            )
+            update = await aio.update_master_record(
+                master["page_id"], "Routed", "Technical / Dev", topic["url"],
+            )
+            return master, topic, update
+
+        master, topic, update = asyncio.run(run())
+
+        first_call = mock_client.pages.create.call_args_list[0][1]
+        assert first_call["parent"]["data_source_id"] == MASTER_DB_ID
+        topic_call = mock_client.pages.create.call_args_list[1][1]
+        assert "Project" in topic_call["properties"]
+        assert topic["database_name"] == "Technical Tasks"
+        assert update["updated"] is True
+
+    def test_concurrent_calls_overlap(self):
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.05)
+            return {"id": "p", "url": "u"}
+
+        mock_client = MagicMock()
+        mock_client.pages.create = slow_create
+
+        async def run():
+            with patch("task_capture_agent.tools.aio._get_async_client",
+                       return_value=mock_client):
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                await asyncio.gather(
+                    *(aio.create_master_record(f"task {i}") for i in range(10))
+                )
+                return loop.time() - start
+
+        assert asyncio.run(run()) < 0.3
+
+    def test_fallback_runs_off_loop(self, monkeypatch):
+        import threading
+        seen = {}
+
+        def fake_log_fallback(title, category, priority, error_message):
+            seen["thread"] = threading.current_thread().name
+            return {"logged_to": "local_file"}
+
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.log_fallback", fake_log_fallback
+        )
+        result = asyncio.run(aio.log_fallback("Test", error_message="503"))
+        assert result["logged_to"] == "local_file"
+        assert seen["thread"].startswith("fallback")
+
+    def test_tools_keep_sync_docstrings(self):
+        import inspect
+        from task_capture_agent.tools import notion
+        assert aio.create_topic_entry.__doc__ == notion.create_topic_entry.__doc__
+        assert aio.create_master_record.__doc__ == notion.create_master_record.__doc__
+        assert (
+            inspect.signature(aio.create_master_record).parameters.keys()
+            == inspect.signature(notion.create_master_record).parameters.keys()
+        )
+
+
+# --- capture_task tests ---
+
+class TestCaptureTask:
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_runs_full_pipeline_in_one_call(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(side_effect=[
+            {"id": "master-1", "url": "https://notion.so/master-1"},
+            {"id": "topic-1", "url": "https://notion.so/topic-1"},
+        ])
+        mock_client.pages.update = AsyncMock(return_value={})
+        mock_get_client.return_value = mock_client
+
+        result = asyncio.run(capture_task(
+            "Fix auth bug", "Technical / Dev", confidence="High",
+            priority="High", extra_fields={"project": "login-service"},
+        ))
+
+        assert result["status"] == "Routed"
+        assert result["database_name"] == "Technical Tasks"
+        assert result["topic_url"] == "https://notion.so/topic-1"
+        update_kwargs = mock_client.pages.update.call_args[1]
+        assert update_kwargs["page_id"] == "master-1"
+        props = update_kwargs["properties"]
+        assert props["Status"] == {"select": {"name": "Routed"}}
+        assert props["Topic Link"]["rich_text"][0]["text"]["content"] == (
+            "https://notion.so/topic-1"
+        )
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_needs_sorting_status(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(return_value={"id": "x", "url": "u"})
+        mock_client.pages.update = AsyncMock(return_value={})
+        mock_get_client.return_value = mock_client
+
+        result = asyncio.run(capture_task(
+            "Think about stuff", "Needs Sorting", confidence="Low",
+            extra_fields={"suggested_category": "Personal", "reason": "too vague"},
+        ))
+
+        assert result["status"] == "Needs Sorting"
+        props = mock_client.pages.update.call_args[1]["properties"]
+        assert props["Status"] == {"select": {"name": "Needs Sorting"}}
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_update_failure_falls_back(self, mock_get_client, monkeypatch):
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(return_value={"id": "x", "url": "u"})
+        mock_client.pages.update = AsyncMock(side_effect=RuntimeError("Notion 502"))
+        mock_get_client.return_value = mock_client
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.log_fallback",
+            lambda *args: {"logged_to": "local_file"},
+        )
+
+        result = asyncio.run(capture_task("Pay rent", "Personal"))
+
+        assert result["status"] == "Fallback"
+        assert result["error"] == "Notion 502"
+        assert result["fallback"] == {"logged_to": "local_file"}
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_domain_fields_reach_notion_through_the_adk_tool(self, mock_get_client):
+        from google.adk.tools import FunctionTool
+
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(return_value={"id": "x", "url": "u"})
+        mock_client.pages.update = AsyncMock(return_value={})
+        mock_get_client.return_value = mock_client
+        tool = FunctionTool(capture_task)
+        context = MagicMock()
+        context.session.id = "session-1"
+
+        assert "extra_fields" in tool._get_declaration().parameters_json_schema["properties"]
+        result = asyncio.run(tool.run_async(args={
+            "title": "Fix auth bug", "category": "Technical / Dev",
+            "extra_fields": {"project": "login-service", "repo": "auth"},
+        }, tool_context=context))
+
+        assert result["status"] == "Routed"
+        topic = next(
+            call[1]["properties"] for call in mock_client.pages.create.call_args_list
+            if "Project" in call[1]["properties"]
+        )
+        assert topic["Project"]["rich_text"][0]["text"]["content"] == "login-service"
+        assert "Repo" in topic
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_single_phase_creates_routed_master(self, mock_get_client, monkeypatch):
+        monkeypatch.setenv("CAPTURE_SINGLE_PHASE", "1")
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(side_effect=[
+            {"id": "topic-1", "url": "https://notion.so/topic-1"},
+            {"id": "master-1", "url": "https://notion.so/master-1"},
+        ])
+        mock_client.pages.update = AsyncMock(return_value={})
+        mock_get_client.return_value = mock_client
+
+        result = asyncio.run(capture_task("Fix auth bug", "Technical / Dev", "High"))
+
+        assert result["status"] == "Routed"
+        assert result["master_page_id"] == "master-1"
+        assert result["topic_url"] == "https://notion.so/topic-1"
+        assert result["saved_calls"] == 1
+        mock_client.pages.update.assert_not_called()
+        props = mock_client.pages.create.call_args_list[1][1]["properties"]
+        assert props["Status"] == {"select": {"name": "Routed"}}
+        assert props["Confidence"] == {"select": {"name": "High"}}
+        assert props["Topic Link"]["rich_text"][0]["text"]["content"] == (
+            "https://notion.so/topic-1"
+        )
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_single_phase_keeps_audit_trail_when_unsure(self, mock_get_client, monkeypatch):
+        monkeypatch.setenv("CAPTURE_SINGLE_PHASE", "1")
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(return_value={"id": "x", "url": "u"})
+        mock_client.pages.update = AsyncMock(return_value={})
+        mock_get_client.return_value = mock_client
+
+        medium = asyncio.run(capture_task("Fix auth bug", "Technical / Dev", "Medium"))
+        unsorted = asyncio.run(capture_task("Think about stuff", "Needs Sorting", "Low"))
+
+        assert "saved_calls" not in medium and "saved_calls" not in unsorted
+        assert mock_client.pages.update.call_count == 2
+
+
+# --- capture_batch tests ---
+
+class TestCaptureBatch:
+    def _mock_client(self, delay=0.0, fail_titles=()):
+        created = []
+
+        async def create(**kwargs):
+            await asyncio.sleep(delay)
+            title = kwargs["properties"]["Task"]["title"][0]["text"]["content"]
+            if title in fail_titles:
+                raise RuntimeError("Notion 503")
+            created.append(kwargs)
+            return {"id": f"id-{len(created)}", "url": f"https://notion.so/{len(created)}"}
+
+        async def update(**kwargs):
+            await asyncio.sleep(delay)
+            return {}
+
+        client = MagicMock()
+        client.pages.create = create
+        client.pages.update = AsyncMock(side_effect=update)
+        return client, created
+
+    def test_routes_every_task(self):
+        client, created = self._mock_client()
+        tasks = [
+            {"title": "Get groceries", "category": "Shopping / Errands",
+             "location": "Costco"},
+            {"title": "Fix CI", "category": "Technical / Dev", "priority": "High"},
+            {"title": "Mystery", "category": "Needs Sorting",
+             "suggested_category": "Personal", "reason": "vague"},
+        ]
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            result = asyncio.run(capture_batch(tasks))
+
+        assert result["captured"] == 3 and result["fallback"] == 0
+        assert [r["status"] for r in result["results"]] == [
+            "Routed", "Routed", "Needs Sorting",
+        ]
+        assert result["results"][0]["database_name"] == "Shopping & Errands"
+        assert len(created) == 6
+        assert client.pages.update.call_count == 3
+        shopping = [c for c in created if "Location" in c["properties"]]
+        assert len(shopping) == 1
+
+    def test_single_phase_reports_saved_calls(self, monkeypatch):
+        monkeypatch.setenv("CAPTURE_SINGLE_PHASE", "1")
+        client, created = self._mock_client()
+        tasks = [
+            {"title": "Get groceries", "category": "Shopping / Errands"},
+            {"title": "Fix CI", "category": "Technical / Dev", "confidence": "Medium"},
+            {"title": "Mystery", "category": "Needs Sorting"},
+        ]
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            result = asyncio.run(capture_batch(tasks))
+
+        assert result["captured"] == 3 and result["saved_calls"] == 1
+        assert len(created) == 6
+        assert client.pages.update.call_count == 2
+
+    def test_failures_go_to_fallback(self, monkeypatch):
+        client, _ = self._mock_client(fail_titles=("Broken",))
+        logged = []
+
+        def fake_log_fallback(title, category, priority, error_message):
+            logged.append((title, error_message))
+            return {"logged_to": "local_file"}
+
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.log_fallback", fake_log_fallback
+        )
+        tasks = [
+            {"title": "Works", "category": "Personal"},
+            {"title": "Broken", "category": "Personal"},
+        ]
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            result = asyncio.run(capture_batch(tasks))
+
+        assert result["captured"] == 1 and result["fallback"] == 1
+        assert result["results"][1]["status"] == "Fallback"
+        assert logged == [("Broken", "Notion 503")]
+
+    def test_batch_runs_concurrently(self):
+        client, _ = self._mock_client(delay=0.05)
+        tasks = [{"title": f"Task {i}", "category": "Personal"} for i in range(20)]
+
+        async def run():
+            with patch("task_capture_agent.tools.aio._get_async_client",
+                       return_value=client):
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                await capture_batch(tasks, max_concurrency=20)
+                return loop.time() - start
+
+        # Two round trips (create master+topic, then update), not 60.
+        assert asyncio.run(run()) < 0.5
+
+
+# --- write-behind routing tests ---
+
+class TestWriteBehindRouting:
+    @pytest.fixture
+    def worker(self, monkeypatch):
+        worker = RoutingWorker(queue_size=10, concurrency=2, drain_timeout=5)
+        monkeypatch.setattr(routing, "_worker", worker)
+        monkeypatch.setenv("CAPTURE_WRITE_BEHIND", "1")
+        yield worker
+        worker.close(timeout=1)
+
+    @pytest.fixture
+    def logged(self, monkeypatch):
+        logged = []
+
+        def fake_log_fallback(title, category, priority, error_message=""):
+            logged.append((title, error_message))
+            return {"logged_to": "local_file"}
+
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.log_fallback", fake_log_fallback
+        )
+        return logged
+
+    def _mock_client(self, topic_delay=0.0, update_error=None):
+        async def create(**kwargs):
+            if kwargs["parent"]["data_source_id"] != MASTER_DB_ID:
+                await asyncio.sleep(topic_delay)
+                return {"id": "topic-1", "url": "https://notion.so/topic-1"}
+            return {"id": "master-1", "url": "https://notion.so/master-1"}
+
+        client = MagicMock()
+        client.pages.create = AsyncMock(side_effect=create)
+        client.pages.update = AsyncMock(side_effect=update_error, return_value={})
+        return client
+
+    def test_returns_after_master_and_routes_in_background(self, worker):
+        client = self._mock_client(topic_delay=0.05)
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            result = asyncio.run(capture_task("Fix auth bug", "Technical / Dev"))
+            assert result["routing"] == "queued"
+            assert result["master_page_id"] == "master-1"
+            assert result["database_name"] == "Technical Tasks"
+            assert "topic_url" not in result
+            assert client.pages.update.call_count == 0
+            assert worker.drain(timeout=5)
+
+        update_kwargs = client.pages.update.call_args[1]
+        assert update_kwargs["page_id"] == "master-1"
+        assert update_kwargs["properties"]["Status"] == {"select": {"name": "Routed"}}
+
+    def test_background_failure_goes_to_fallback(self, worker, logged):
+        client = self._mock_client(update_error=RuntimeError("Notion 502"))
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            result = asyncio.run(capture_task("Pay rent", "Personal"))
+            assert result["status"] == "Routed" and result["routing"] == "queued"
+            assert worker.drain(timeout=5)
+
+        assert logged == [(
+            "Pay rent",
+            "Routing failed, master record master-1 left Pending: Notion 502",
+        )]
+
+    def test_fallback_write_runs_off_the_routing_loop(self, worker, monkeypatch):
+        import threading
+        threads = []
+
+        def fake_log_fallback(title, category, priority, error_message=""):
+            threads.append(threading.current_thread().name)
+            return {"logged_to": "local_file"}
+
+        monkeypatch.setattr("task_capture_agent.tools.fallback.log_fallback", fake_log_fallback)
+        client = self._mock_client(update_error=RuntimeError("Notion 502"))
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            asyncio.run(capture_task("Pay rent", "Personal"))
+            assert worker.drain(timeout=5)
+
+        assert len(threads) == 1 and threads[0] != "capture-routing"
+
+    def test_full_queue_routes_inline(self, monkeypatch):
+        worker = RoutingWorker(queue_size=1, drain_timeout=1)
+        monkeypatch.setattr(routing, "_worker", worker)
+        monkeypatch.setenv("CAPTURE_WRITE_BEHIND", "1")
+
+        async def never():
+            await asyncio.Event().wait()
+
+        assert worker.submit(never, AsyncMock())
+        client = self._mock_client()
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            result = asyncio.run(capture_task("Buy milk", "Shopping / Errands"))
+
+        assert "routing" not in result
+        assert result["topic_url"] == "https://notion.so/topic-1"
+        worker.close(timeout=0)
+
+    def test_close_fails_over_unrouted_jobs(self, worker, logged):
+        client = self._mock_client(topic_delay=60)
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            asyncio.run(capture_batch([
+                {"title": "Slow one", "category": "Personal"},
+                {"title": "Slow two", "category": "Personal"},
+            ]))
+            worker.close(timeout=0.05)
+
+        assert sorted(title for title, _ in logged) == ["Slow one", "Slow two"]
+        assert all("shutdown before routing finished" in message for _, message in logged)
+        assert not worker.submit(AsyncMock(), AsyncMock())
+
+
+# --- shared job queue tests ---
+
+class TestJobQueue:
+    @pytest.fixture
+    def queue(self, tmp_path, monkeypatch):
+        queue = JobQueue(str(tmp_path / "jobs.sqlite"), lease_seconds=30, max_attempts=3, retry_base=0)
+        monkeypatch.setattr(jobqueue, "_queues", {os.path.abspath(queue.path): queue})
+        return queue
+
+    @staticmethod
+    def _route_payload(master_page_id="master-1", title="Fix CI", session_id=""):
+        return {
+            "master_page_id": master_page_id, "title": title,
+            "category": "Technical / Dev", "priority": "High", "notes": "",
+            "extra_fields": {"project": "ci"}, "status": "Routed", "confidence": "High",
+            "session_id": session_id,
+        }
+
+    def test_lease_is_exclusive_until_completed(self, queue):
+        job_id = queue.publish("route", {"n": 1})
+        (job,) = queue.lease("worker-a")
+        assert job["id"] == job_id and job["attempts"] == 1
+        assert queue.lease("worker-b") == []
+        assert queue.complete(job, "worker-a")
+        assert queue.stats()["done"] == 1
+
+    def test_publish_is_idempotent_per_key(self, queue):
+        assert queue.publish("route", {}, key="route:m1") is not None
+        assert queue.publish("route", {}, key="route:m1") is None
+        assert queue.stats()["queued"] == 1
+
+    def test_expired_lease_moves_to_another_worker(self, queue, monkeypatch):
+        queue.publish("route", {})
+        monkeypatch.setattr(queue, "lease_seconds", -1)
+        (stale,) = queue.lease("worker-a")
+        (job,) = queue.lease("worker-b")
+        assert job["attempts"] == 2
+        assert not queue.complete(stale, "worker-a")
+        assert queue.complete(job, "worker-b")
+
+    def test_failures_retry_then_dead_letter(self, queue):
+        queue.publish("route", {})
+        for attempt in (1, 2):
+            (job,) = queue.lease("worker-a")
+            assert queue.fail(job, "worker-a", "Notion 503") == "queued"
+        (job,) = queue.lease("worker-a")
+        assert queue.fail(job, "worker-a", "Notion 503") == "dead"
+        assert queue.lease("worker-a") == []
+        (dead,) = queue.dead_letters()
+        assert dead["attempts"] == 3 and dead["last_error"] == "Notion 503"
+
+    def test_retry_backoff_hides_job(self, tmp_path):
+        queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=3, retry_base=60)
+        queue.publish("route", {})
+        (job,) = queue.lease("worker-a")
+        queue.fail(job, "worker-a", "Notion 503")
+        assert queue.lease("worker-a") == []
+        assert queue.stats()["queued"] == 1
+
+    def test_reap_dead_letters_abandoned_last_attempt(self, queue, monkeypatch):
+        queue.publish("route", {})
+        monkeypatch.setattr(queue, "lease_seconds", -1)
+        for _ in range(3):
+            assert queue.lease("crashing-worker")
+        (dead,) = queue.reap()
+        assert dead["last_error"] == "lease expired"
+        assert queue.stats()["dead"] == 1
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_capture_publishes_route_job(self, mock_get_async, queue, monkeypatch):
+        monkeypatch.setenv("CAPTURE_JOB_QUEUE_DB", queue.path)
+        async_client = MagicMock()
+        async_client.pages.create = AsyncMock(return_value={"id": "master-1", "url": "m"})
+        mock_get_async.return_value = async_client
+
+        result = asyncio.run(capture_task(
+            "Fix CI", "Technical / Dev", priority="High", extra_fields={"project": "ci"},
+        ))
+
+        assert result["routing"] == "queued"
+        assert async_client.pages.create.call_count == 1
+        (job,) = queue.lease("worker-a")
+        assert job["payload"] == self._route_payload()
+
+    @patch("task_capture_agent.tools.aio._get_async_client")
+    def test_capture_publishes_off_the_event_loop(self, mock_get_async, queue, monkeypatch):
+        monkeypatch.setenv("CAPTURE_JOB_QUEUE_DB", queue.path)
+        async_client = MagicMock()
+        async_client.pages.create = AsyncMock(return_value={"id": "master-1", "url": "m"})
+        mock_get_async.return_value = async_client
+        threads = []
+        publish = jobqueue.publish_route
+
+        def recording_publish(payload):
+            threads.append(threading.current_thread())
+            return publish(payload)
+
+        monkeypatch.setattr(jobqueue, "publish_route", recording_publish)
+        result = asyncio.run(capture_task("Fix CI", "Technical / Dev"))
+
+        assert result["routing"] == "queued"
+        assert threads and threads[0] is not threading.main_thread()
+
+    @patch("task_capture_agent.tools.notion._get_client")
+    def test_worker_routes_and_checkpoints_topic(self, mock_get_client, queue):
+        client = MagicMock()
+        client.pages.create.return_value = {"id": "topic-1", "url": "https://notion.so/topic-1"}
+        client.pages.update.side_effect = [RuntimeError("Notion 502"), {}]
+        mock_get_client.return_value = client
+        jobqueue.publish_route(self._route_payload(), path=queue.path)
+
+        assert jobqueue.process_one(queue, "worker-a")
+        assert jobqueue.process_one(queue, "worker-b")
+
+        # The retry reuses the checkpointed topic entry instead of creating another.
+        assert client.pages.create.call_count == 1
+        assert client.pages.update.call_args[1]["page_id"] == "master-1"
+        assert queue.stats()["done"] == 1
+
+    @patch("task_capture_agent.tools.notion._get_client")
+    def test_worker_routes_in_the_capturing_session(self, mock_get_client, queue):
+        client = MagicMock()
+        client.pages.create.side_effect = [
+            {"id": "topic-1", "url": "https://notion.so/topic-1"},
+            {"id": "topic-2", "url": "https://notion.so/topic-2"},
+        ]
+        mock_get_client.return_value = client
+        jobqueue.publish_route(self._route_payload("master-1", session_id="s1"), path=queue.path)
+        jobqueue.publish_route(self._route_payload("master-2", session_id="s2"), path=queue.path)
+
+        assert jobqueue.process_one(queue, "worker-a")
+        assert jobqueue.process_one(queue, "worker-a")
+
+        # Same title in two sessions: two topic entries, each linked to its own master.
+        assert client.pages.create.call_count == 2
+        links = {
+            call[1]["page_id"]: call[1]["properties"]["Topic Link"]["rich_text"][0]["text"]["content"]
+            for call in client.pages.update.call_args_list
+        }
+        assert links == {"master-1": "https://notion.so/topic-1", "master-2": "https://notion.so/topic-2"}
+
+    @patch("task_capture_agent.tools.notion._get_client")
+    def test_topic_survives_a_lost_lease(self, mock_get_client, queue, monkeypatch):
+        client = MagicMock()
+        client.pages.create.return_value = {"id": "topic-1", "url": "https://notion.so/topic-1"}
+        mock_get_client.return_value = client
+        queue.publish("route", self._route_payload())
+        monkeypatch.setattr(queue, "lease_seconds", -1)
+        (stale,) = queue.lease("worker-a")
+        (job,) = queue.lease("worker-b")
+
+        with pytest.raises(RuntimeError, match="lease expired"):
+            jobqueue._route(queue, stale, "worker-a")
+        jobqueue._route(queue, job, "worker-b")
+
+        assert client.pages.create.call_count == 1
+        assert job["state"]["topic_page_id"] == "topic-1"
+        assert client.pages.update.call_args[1]["page_id"] == "master-1"
+
+    @patch("task_capture_agent.tools.notion._get_client")
+    def test_dead_letter_goes_to_fallback(self, mock_get_client, queue, monkeypatch):
+        mock_get_client.return_value.pages.create.side_effect = RuntimeError("Notion 500")
+        logged = []
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.log_fallback",
+            lambda title, category, priority, error_message="": logged.append((title, error_message)),
+        )
+        queue.publish("route", self._route_payload())
+        for _ in range(3):
+            assert jobqueue.process_one(queue, "worker-a")
+
+        assert logged == [(
+            "Fix CI",
+            "Routing job 1 dead after 3 attempts, master record master-1 left Pending: Notion 500",
+        )]
+
+    def test_workers_share_the_queue(self, queue, monkeypatch):
+        import threading
+        import time
+        handled = []
+
+        def handle(q, job, owner):
+            time.sleep(0.005)
+            handled.append((job["id"], owner))
+
+        monkeypatch.setitem(jobqueue.HANDLERS, "count", (handle, lambda job: None))
+        for n in range(40):
+            queue.publish("count", {"n": n})
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=jobqueue.run_worker, args=(queue.path, f"w{n}", stop, 0.01))
+            for n in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        deadline = time.monotonic() + 10
+        while queue.stats()["done"] < 40 and time.monotonic() < deadline:
+            stop.wait(0.01)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+        assert sorted(job_id for job_id, _ in handled) == list(range(1, 41))
+        assert len({owner for _, owner in handled}) > 1
+
+
+# --- local store tests ---
+
+class TestLocalStore:
+    @pytest.fixture
+    def local(self, tmp_path, monkeypatch):
+        """Offline-first mode with a store and an engine that never auto-starts."""
+        task_store = TaskStore(str(tmp_path / "tasks.sqlite"), retry_base=0)
+        monkeypatch.setenv("CAPTURE_LOCAL_STORE_DB", task_store.path)
+        monkeypatch.setattr(store, "_stores", {os.path.abspath(task_store.path): task_store})
+        engine = SyncEngine(task_store, batch_size=2, concurrency=2)
+        monkeypatch.setattr(engine, "nudge", lambda: None)
+        monkeypatch.setattr(sync, "_engine", engine)
+        return engine
+
+    def _client(self, fail_topic=False):
+        calls = []
+
+        async def create(**kwargs):
+            is_master = kwargs["parent"]["data_source_id"] == MASTER_DB_ID
+            calls.append("master" if is_master else "topic")
+            if fail_topic and not is_master:
+                raise RuntimeError("Notion 503")
+            page_id = f"{calls[-1]}-{len(calls)}"
+            return {"id": page_id, "url": f"https://notion.so/{page_id}"}
+
+        async def update(**kwargs):
+            calls.append("update")
+            return {}
+
+        client = MagicMock()
+        client.pages.create = create
+        client.pages.update = update
+        return client, calls
+
+    def test_capture_is_a_local_write(self, local):
+        with patch("task_capture_agent.tools.aio._get_async_client") as get_client:
+            result = asyncio.run(capture_task(
+                "Fix auth bug", "Technical / Dev", confidence="High", extra_fields={"project": "auth"},
+            ))
+            again = asyncio.run(capture_task("Fix auth bug", "Technical / Dev"))
+        get_client.assert_not_called()
+        assert result["status"] == "Routed" and result["sync"] == "pending"
+        assert result["database_name"] == "Technical Tasks"
+        assert again["local_id"] == result["local_id"]
+        row = local.store.get(result["local_id"])
+        assert (row["sync_state"], row["confidence"], row["fields"]) == ("pending", "High", {"project": "auth"})
+
+    def test_sync_pushes_rows_in_batches(self, local):
+        for title in ("Buy milk", "Call mom", "Something odd"):
+            asyncio.run(capture_task(title, "Needs Sorting" if "odd" in title else "Personal"))
+        client, calls = self._client()
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            totals = asyncio.run(local.sync_all())
+
+        assert totals == {"synced": 3, "failed": 0}
+        assert calls.count("master") == 3 and calls.count("update") == 3
+        stats = local.store.stats()
+        assert (stats["synced"], stats["pending"], stats["failing"]) == (3, 0, 0)
+        row = local.store.get(1)
+        assert row["master_page_id"].startswith("master-") and row["topic_url"]
+
+    def test_failed_sync_resumes_from_last_step(self, local):
+        result = asyncio.run(capture_task("Pay rent", "Personal"))
+        client, calls = self._client(fail_topic=True)
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            assert asyncio.run(local.sync_all()) == {"synced": 0, "failed": 1}
+        row = local.store.get(result["local_id"])
+        assert (row["sync_state"], row["attempts"], row["last_error"]) == ("master", 1, "Notion 503")
+
+        client, calls = self._client()
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            assert asyncio.run(local.sync_all()) == {"synced": 1, "failed": 0}
+        assert calls == ["topic", "update"]
+        assert local.store.get(result["local_id"])["sync_state"] == "synced"
+
+    def test_create_retried_after_a_crash_reuses_the_page(self, local, monkeypatch):
+        result = asyncio.run(capture_task("Pay rent", "Personal"))
+        # A fresh process: the dedup cache defaults to the store file.
+        cache = idempotency.IdempotencyCache()
+        assert cache._store.path == local.store.path
+        monkeypatch.setattr(idempotency, "_cache", cache)
+        client, calls = self._client()
+
+        def crash(row, **progress):
+            raise KeyboardInterrupt  # Killed before the checkpoint.
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            with patch.object(local, "_advance", crash), pytest.raises(KeyboardInterrupt):
+                asyncio.run(local.sync_all())
+            monkeypatch.setattr(idempotency, "_cache", idempotency.IdempotencyCache())
+            with local.store._connect() as db:
+                db.execute("UPDATE tasks SET lease_expires = 0")  # The lease runs out.
+            restarted = SyncEngine(local.store)
+            assert asyncio.run(restarted.sync_all()) == {"synced": 1, "failed": 0}
+
+        assert calls == ["master", "topic", "update"]
+        assert local.store.get(result["local_id"])["master_page_id"] == "master-1"
+
+    def test_claimed_rows_are_not_synced_twice(self, local):
+        asyncio.run(capture_task("Pay rent", "Personal"))
+        (row,) = local.store.claim("other-syncer", 10)
+        assert local.store.claim(local.owner, 10) == []
+        row["sync_state"] = "master"
+        assert local.store.checkpoint(row, "other-syncer")
+        assert not local.store.checkpoint(row, local.owner)
+
+
+# --- replay_fallback tests ---
+
+class TestReplayFallback:
+    def _write_log(self, path, titles):
+        with open(path, "w") as f:
+            for title in titles:
+                f.write(json.dumps({
+                    "title": title, "category": "Personal",
+                    "priority": "Medium", "error": "Notion 503",
+                }) + "\n")
+
+    def _client(self, fail_titles=()):
+        created = []
+
+        async def create(**kwargs):
+            title = kwargs["properties"]["Task"]["title"][0]["text"]["content"]
+            if title in fail_titles:
+                raise RuntimeError("still down")
+            created.append(title)
+            return {"id": f"id-{len(created)}", "url": "u"}
+
+        client = MagicMock()
+        client.pages.create = create
+        client.pages.update = AsyncMock(return_value={})
+        return client, created
+
+    def _run(self, monkeypatch, log_path, client, **kwargs):
+        monkeypatch.delenv("GOOGLE_SHEETS_CREDENTIALS_PATH", raising=False)
+        monkeypatch.delenv("GOOGLE_SHEETS_FALLBACK_ID", raising=False)
+        monkeypatch.setattr(
+            "task_capture_agent.tools.fallback.local_log_path", lambda: log_path
+        )
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            return asyncio.run(replay_fallback(source="local", **kwargs))
+
+    def test_replays_and_never_resubmits(self, monkeypatch, tmp_path):
+        log_path = str(tmp_path / "fallback_log.jsonl")
+        self._write_log(log_path, [f"Task {i}" for i in range(12)])
+        client, created = self._client()
+
+        stats = self._run(monkeypatch, log_path, client, max_concurrency=4)
+        assert stats["replayed"] == 12 and stats["failed"] == 0
+        # master + topic per entry
+        assert len(created) == 24
+
+        stats = self._run(monkeypatch, log_path, client)
+        assert stats["replayed"] == 0
+        assert len(created) == 24
+
+    def test_resumes_after_limit_and_keeps_failures_pending(self, monkeypatch, tmp_path):
+        log_path = str(tmp_path / "fallback_log.jsonl")
+        self._write_log(log_path, ["A", "B", "C", "D"])
+        client, created = self._client(fail_titles=("B",))
+
+        stats = self._run(monkeypatch, log_path, client, limit=2, max_concurrency=1)
+        assert stats == {
+            "replayed": 1, "failed": 1, "skipped": 0,
+            "errors": ["B: still down"],
+        }
+
+        client, created = self._client()
+        stats = self._run(monkeypatch, log_path, client)
+        assert stats["replayed"] == 3
+        assert sorted(set(created)) == ["B", "C", "D"]
+
+    def test_checkpoint_advances_past_out_of_order_completions(self, tmp_path):
+        checkpoint = ReplayCheckpoint(str(tmp_path / "cp.json"))
+        checkpoint.mark(10, 20)
+        assert checkpoint.offset == 0 and checkpoint.is_done(10)
+        checkpoint.mark(0, 10)
+        assert checkpoint.offset == 20 and checkpoint.done == {}
+        assert ReplayCheckpoint(str(tmp_path / "cp.json")).offset == 20
+
+    def test_sheet_bound_entries_wait_for_their_flush(self, monkeypatch, isolated_fallback_log):
+        from datetime import datetime, timedelta, timezone
+
+        now = datetime.now(timezone.utc)
+        journal = FallbackJournal(str(isolated_fallback_log))
+        journal.append_many([
+            {"timestamp": now.isoformat(), "title": "Just logged", "sheet_id": "sheet-1"},
+            {"timestamp": (now - timedelta(minutes=5)).isoformat(),
+             "title": "Never flushed", "sheet_id": "sheet-1"},
+        ])
+        journal.close()
+        client, created = self._client()
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            stats = asyncio.run(replay_fallback(source="local"))
+
+        assert stats["replayed"] == 1
+        assert created == ["Never flushed", "Never flushed"]
+
+    def test_sheet_rows_marked_replayed(self, monkeypatch):
+        sheet = MagicMock()
+        sheet.get_all_values.return_value = [
+            ["Timestamp", "Title", "Category", "Priority", "Source", "Status", "Error"],
+            ["t", "Pay rent", "Personal", "High", "Google ADK", "Pending", "503"],
+            ["t", "Old task", "Personal", "Low", "Google ADK", "Replayed", ""],
+        ]
+        monkeypatch.setenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "creds.json")
+        monkeypatch.setenv("GOOGLE_SHEETS_FALLBACK_ID", "sheet-1")
+        monkeypatch.setattr(
+            "task_capture_agent.tools.sheets.open_fallback_sheet", lambda *a: sheet
+        )
+        monkeypatch.setattr("task_capture_agent.tools.sheets._sinks", {})
+        client, created = self._client()
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            stats = asyncio.run(replay_fallback(source="sheets"))
+
+        assert stats["replayed"] == 1
+        assert created == ["Pay rent", "Pay rent"]
+        sheet.batch_update.assert_called_once_with(
+            [{"range": "F2", "values": [["Replayed"]]}]
+        )
+
+    def test_sheet_row_replayed_before_a_crash_is_not_resubmitted(self, monkeypatch):
+        from task_capture_agent.tools.replay import SheetReplayMarks
+
+        sheet = MagicMock()
+        sheet.get_all_values.return_value = [
+            ["Timestamp", "Title", "Category", "Priority", "Source", "Status", "Error"],
+            ["t1", "Pay rent", "Personal", "High", "Google ADK", "Pending", "503"],
+            ["t2", "Fix CI", "Technical / Dev", "High", "Google ADK", "Pending", "503"],
+        ]
+        monkeypatch.setenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "creds.json")
+        monkeypatch.setenv("GOOGLE_SHEETS_FALLBACK_ID", "sheet-1")
+        monkeypatch.setattr(
+            "task_capture_agent.tools.sheets.open_fallback_sheet", lambda *a: sheet
+        )
+        monkeypatch.setattr("task_capture_agent.tools.sheets._sinks", {})
+        marks_path = os.path.join(os.environ["FALLBACK_LOG_DIR"], "sheet-sheet-1.replayed")
+        # "Pay rent" was replayed, then the process died before its batched mark.
+        SheetReplayMarks(marks_path).add(SheetReplayMarks.key(sheet.get_all_values.return_value[1]))
+        client, created = self._client()
+
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            stats = asyncio.run(replay_fallback(source="sheets"))
+
+        assert stats["replayed"] == 1
+        assert created == ["Fix CI", "Fix CI"]
+        sheet.batch_update.assert_called_once_with([
+            {"range": "F2", "values": [["Replayed"]]},
+            {"range": "F3", "values": [["Replayed"]]},
+        ])
+        assert not os.path.exists(marks_path)
+
+
+
+class TestBulkImport:
+    def _client(self, fail_titles=(), unavailable_titles=()):
+        created = []
+        databases = {info["data_source_id"]: name for name, info in TOPIC_DATABASES.items()}
+
+        async def create(**kwargs):
+            title = kwargs["properties"]["Task"]["title"][0]["text"]["content"]
+            if title in fail_titles:
+                raise RuntimeError("validation_error")
+            if title in unavailable_titles:
+                raise FakeAPIError(503)
+            database = databases.get(kwargs["parent"]["data_source_id"])
+            if database:
+                created.append((title, database))
+            return {"id": f"id-{title}", "url": f"https://notion.so/{len(created)}"}
+
+        client = MagicMock()
+        client.pages.create = create
+        client.pages.update = AsyncMock(return_value={})
+        return client, created
+
+    def _run(self, client, path, **kwargs):
+        with patch("task_capture_agent.tools.aio._get_async_client", return_value=client):
+            return asyncio.run(bulk_import(str(path), **kwargs))
+
+    def test_csv_rows_classified_and_routed(self, tmp_path):
+        path = tmp_path / "backlog.csv"
+        path.write_text(
+            "Title,Category,Priority,Notes,Location\n"
+            'Buy milk,Shopping / Errands,Low,"two\nlines",Corner shop\n'
+            "Pay electric bill,,High,,\n"
+            "\n"
+            "xyzzy plugh,,,,\n"
+        )
+        client, created = self._client()
+
+        stats = self._run(client, path, batch_size=2)
+
+        assert stats == {
+            "imported": 3, "needs_sorting": 1, "failed": 0, "deferred": 0,
+            "skipped": 1, "saved_calls": 0, "errors": [],
+        }
+        assert sorted(created) == [
+            ("Buy milk", "Shopping / Errands"),
+            ("Pay electric bill", "Personal"),
+            ("xyzzy plugh", "Needs Sorting"),
+        ]
+
+    def test_markdown_checklist_resumes_without_duplicates(self, tmp_path):
+        path = tmp_path / "todo.md"
+        path.write_text(
+            "# Backlog\n- [x] Already done\n- [ ] Fix CI\n"
+            "- [ ] Pay electric bill\n* [ ] Get groceries\n"
+        )
+        client, created = self._client()
+
+        stats = self._run(client, path, limit=1)
+        assert (stats["imported"], stats["skipped"]) == (1, 2)
+
+        stats = self._run(client, path)
+        assert stats["imported"] == 2
+        assert sorted(title for title, _ in created) == [
+            "Fix CI", "Get groceries", "Pay electric bill",
+        ]
+        assert self._run(client, path)["imported"] == 0
+
+    def test_failures_go_to_rejects_file(self, tmp_path):
+        path = tmp_path / "tasks.jsonl"
+        path.write_text(
+            json.dumps({"title": "A", "category": "Personal"}) + "\n"
+            "not json\n"
+            + json.dumps({"task": "B", "category": "Personal", "area": "Home"}) + "\n"
+        )
+        client, created = self._client(fail_titles=("B",))
+
+        stats = self._run(client, path)
+        assert (stats["imported"], stats["failed"]) == (1, 2)
+        rejects = tmp_path / "tasks.jsonl.rejects.jsonl"
+        rejected = [json.loads(line) for line in rejects.read_text().splitlines()]
+        assert rejected[-1]["title"] == "B" and rejected[-1]["area"] == "Home"
+
+        assert self._run(client, path)["failed"] == 0
+
+        client, created = self._client()
+        stats = self._run(client, rejects, fmt="jsonl")
+        assert (stats["imported"], stats["skipped"]) == (1, 1)
+        assert created == [("B", "Personal")]
+
+    def test_outage_waits_and_defers_instead_of_rejecting(self, tmp_path, monkeypatch):
+        from task_capture_agent.tools import bulk_import as bulk_import_module
+
+        monkeypatch.setattr(bulk_import_module, "BREAKER_POLL_SECONDS", 0)
+        circuit = CircuitBreaker(min_calls=1000, probe=lambda: None)
+        polls = iter([False, False, False])
+        monkeypatch.setattr(circuit, "available", lambda: next(polls, True))
+        monkeypatch.setattr(breaker, "_breaker", circuit)
+        path = tmp_path / "tasks.jsonl"
+        path.write_text("".join(
+            json.dumps({"title": title, "category": "Personal"}) + "\n" for title in ("A", "B", "C")
+        ))
+        client, created = self._client(unavailable_titles=("B",))
+
+        stats = self._run(client, path)
+        assert (stats["imported"], stats["failed"], stats["deferred"]) == (2, 0, 1)
+        assert next(polls, None) is None  # Waited out the open breaker first.
+        assert not (tmp_path / "tasks.jsonl.rejects.jsonl").exists()
+
+        client, created = self._client()
+        stats = self._run(client, path)
+        assert (stats["imported"], stats["deferred"]) == (1, 0)
+        assert created == [("B", "Personal")]
+
+
+# --- SheetsSink tests ---
+
+class TestSheetsSink:
+    def _sink(self, monkeypatch, sheet, **kwargs):
+        opened = []
+
+        def fake_open(creds_path, sheet_id):
+            opened.append(sheet_id)
+            return sheet
+
+        monkeypatch.setattr("task_capture_agent.tools.sheets.open_fallback_sheet", fake_open)
+        return SheetsSink("creds.json", "sheet-1", **kwargs), opened
+
+    def test_burst_coalesces_into_few_calls(self, monkeypatch):
+        sheet = MagicMock()
+        sink, opened = self._sink(monkeypatch, sheet, batch_size=100, flush_interval=60)
+        for i in range(500):
+            sink.append([f"row {i}"])
+        sink.close()
+        assert sheet.append_rows.call_count == 5
+        assert sum(len(c.args[0]) for c in sheet.append_rows.call_args_list) == 500
+        assert opened == ["sheet-1"]
+
+    def test_flushes_on_interval(self, monkeypatch):
+        import time
+        sheet = MagicMock()
+        sink, _ = self._sink(monkeypatch, sheet, batch_size=100, flush_interval=0.05)
+        sink.append(["row"])
+        time.sleep(0.3)
+        assert sheet.append_rows.call_count == 1
+        sink.close()
+
+    def test_failed_flush_confirms_nothing_and_reauthorizes(self, monkeypatch):
+        sheet = MagicMock()
+        sheet.append_rows.side_effect = [RuntimeError("quota"), None]
+        written = []
+        sink, opened = self._sink(
+            monkeypatch, sheet, written=written.extend, batch_size=2, flush_interval=60,
+        )
+        sink.append(["a"], "ref-a")
+        sink.append(["b"], "ref-b")
+        assert written == []
+        sink.append(["c"], "ref-c")
+        sink.close()
+        assert written == ["ref-c"]
+        assert opened == ["sheet-1", "sheet-1"]
+
+    def test_log_fallback_uses_shared_sink(self, monkeypatch, isolated_fallback_log):
+        sheet = MagicMock()
+        sheet.append_rows.side_effect = RuntimeError("Sheets down")
+        monkeypatch.setenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "creds.json")
+        monkeypatch.setenv("GOOGLE_SHEETS_FALLBACK_ID", "sheet-1")
+        monkeypatch.setenv("FALLBACK_SHEETS_FLUSH_SECONDS", "60")
+        monkeypatch.setattr("task_capture_agent.tools.sheets._sinks", {})
+        monkeypatch.setattr(
+            "task_capture_agent.tools.sheets.open_fallback_sheet", lambda *a: sheet
+        )
+
+        result = log_fallback("Pay rent", "Personal", error_message="Notion 503")
+        assert result["logged_to"] == "google_sheets"
+        from task_capture_agent.tools.sheets import close_sinks
+        close_sinks()
+
+        [(_, _, entry)] = list(FallbackJournal(str(isolated_fallback_log)).pending())
+        assert entry["title"] == "Pay rent"
+        assert entry["error"] == "Notion 503"
+
+    def test_rows_in_the_sheet_are_handed_off_from_the_journal(
+        self, monkeypatch, isolated_fallback_log
+    ):
+        sheet = MagicMock()
+        monkeypatch.setenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "creds.json")
+        monkeypatch.setenv("GOOGLE_SHEETS_FALLBACK_ID", "sheet-1")
+        monkeypatch.setattr("task_capture_agent.tools.sheets._sinks", {})
+        monkeypatch.setattr(
+            "task_capture_agent.tools.sheets.open_fallback_sheet", lambda *a: sheet
+        )
+
+        log_fallback("Pay rent", "Personal", error_message="Notion 503")
+        [(_, _, entry)] = list(FallbackJournal(str(isolated_fallback_log)).pending())
+        assert entry["sheet_id"] == "sheet-1"
+        from task_capture_agent.tools.sheets import close_sinks
+        close_sinks()
+
+        assert sheet.append_rows.call_args.args[0][0][1] == "Pay rent"
+        assert list(FallbackJournal(str(isolated_fallback_log)).pending()) == []
+
+    def test_killed_mid_buffer_keeps_the_task(self, tmp_path):
+        import subprocess
+        import textwrap
+
+        script = textwrap.dedent("""
+            import os, signal
+            from unittest.mock import MagicMock
+            from task_capture_agent.tools import sheets
+            from task_capture_agent.tools.fallback import log_fallback
+
+            sheets.open_fallback_sheet = lambda *a: MagicMock()
+            result = log_fallback("Pay rent", "Personal", error_message="Notion 503")
+            assert result["logged_to"] == "google_sheets"
+            os.kill(os.getpid(), signal.SIGKILL)
+        """)
+        env = {
+            **os.environ,
+            "FALLBACK_LOG_DIR": str(tmp_path),
+            "GOOGLE_SHEETS_CREDENTIALS_PATH": "creds.json",
+            "GOOGLE_SHEETS_FALLBACK_ID": "sheet-1",
+            "FALLBACK_SHEETS_FLUSH_SECONDS": "60",
+        }
+        root = os.path.join(os.path.dirname(__file__), "..")
+        process = subprocess.run([sys.executable, "-c", script], cwd=root, env=env)
+        assert process.returncode == -9
+
+        [(_, _, entry)] = list(FallbackJournal(str(tmp_path)).pending())
+        assert entry["title"] == "Pay rent"
+
+
+# --- idempotency tests ---
+
+class TestIdempotentCreates:
+    @patch("task_capture_agent.tools.notion._get_client")
+    def test_retry_returns_original_page(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_client.pages.create.return_value = {"id": "page-1", "url": "u-1"}
+        mock_get_client.return_value = mock_client
+
+        first = create_master_record("Pick up dry cleaning")
+        again = create_master_record("  pick up DRY cleaning! ")
+
+        assert mock_client.pages.create.call_count == 1
+        assert again["page_id"] == first["page_id"] == "page-1"
+        assert again["deduplicated"] is True
+
+    @patch("task_capture_agent.tools.notion._get_client")
+    def test_sessions_are_separate(self, mock_get_client):
+        mock_client = MagicMock()
+        mock_client.pages.create.return_value = {"id": "p", "url": "u"}
+        mock_get_client.return_value = mock_client
+
+        with session_scope("session-a"):
+            create_topic_entry("Personal", "Call Dad")
+        with session_scope("session-b"):
+            create_topic_entry("Personal", "Call Dad")
+
+        assert mock_client.pages.create.call_count == 2
+
+    def test_concurrent_duplicate_waits_for_first(self):
+        calls = []
+
+        async def slow_create(**kwargs):
+            calls.append(kwargs)
+            await asyncio.sleep(0.05)
+            return {"id": "master-1", "url": "u"}
+
+        mock_client = MagicMock()
+        mock_client.pages.create = slow_create
+
+        async def run():
+            with patch("task_capture_agent.tools.aio._get_async_client",
+                       return_value=mock_client):
+                return await asyncio.gather(
+                    aio.create_master_record("Renew passport"),
+                    aio.create_master_record("Renew passport"),
+                )
+
+        first, second = asyncio.run(run())
+        assert len(calls) == 1
+        assert first["page_id"] == second["page_id"] == "master-1"
+
+    def test_failures_are_not_cached(self):
+        cache = IdempotencyCache(ttl=60)
+        with pytest.raises(RuntimeError):
+            cache.run_once("k", MagicMock(side_effect=RuntimeError("503")))
+        assert cache.run_once("k", lambda: {"page_id": "p"}) == {"page_id": "p"}
+
+    def test_entries_expire_and_evict(self):
+        import time
+        cache = IdempotencyCache(ttl=0.05, max_entries=2)
+        cache.put("a", {"page_id": "a"})
+        cache.put("b", {"page_id": "b"})
+        cache.put("c", {"page_id": "c"})
+        assert cache.get("a") is None
+        assert cache.get("c") == {"page_id": "c"}
+        time.sleep(0.06)
+        assert cache.get("c") is None
+
+    def test_disk_store_shared_between_caches(self, tmp_path):
+        db_path = str(tmp_path / "dedup.sqlite")
+        IdempotencyCache(ttl=60, db_path=db_path).put("k", {"page_id": "p"})
+        other = IdempotencyCache(ttl=60, db_path=db_path)
+        create = MagicMock()
+        assert other.run_once("k", create)["page_id"] == "p"
+        create.assert_not_called()
+
+    def test_capture_task_retry_does_not_duplicate(self):
+        mock_client = MagicMock()
+        mock_client.pages.create = AsyncMock(side_effect=[
+            {"id": "master-1", "url": "m"}, {"id": "topic-1", "url": "t"},
+        ])
+        mock_client.pages.update = AsyncMock(return_value={})
+        context = MagicMock()
+        context.session.id = "session-1"
+
+        async def run():
+            with patch("task_capture_agent.tools.aio._get_async_client",
+                       return_value=mock_client):
+                await capture_task("Get groceries", "Shopping / Errands", tool_context=context)
+                return await capture_task(
+                    "Get groceries", "Shopping / Errands", tool_context=context,
+                )
+
+        result = asyncio.run(run())
+        assert mock_client.pages.create.call_count == 2
+        assert result["topic_url"] == "t"
+
+
 # --- Config validation tests ---
 
 class TestConfig:
@@ -212,3 +1911,82 @@ class TestConfig:
             assert "data_source_id" in db, f"{name} missing database_id"
             assert "required_fields" in db, f"{name} missing required_fields"
             assert "Task" in db["required_fields"], f"{name} missing 'Task' field"
+
+
+def _edit_config(path, edit):
+    """Rewrite a config file through edit(data), bumping its mtime past the last load."""
+    data = json.loads(path.read_text())
+    edit(data)
+    path.write_text(json.dumps(data))
+    mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+class TestRoutingConfig:
+    def test_builtin_config_compiles_to_read_only_tables(self):
+        config = get_config()
+        assert set(config.routes) == set(TOPIC_DATABASES)
+        assert config.master_db_id == MASTER_DB_ID
+        assert "- Technical / Dev: project, repo" in config.field_list
+        with pytest.raises(TypeError):
+            config.routes["New"] = config.routes["Personal"]
+        with pytest.raises(TypeError):
+            config.field_map["project"] = "Other"
+
+    def test_route_builds_topic_fields(self):
+        config = get_config()
+        fields = config.route("Technical / Dev").fields(
+            "Fix auth bug", "High", "", {"project": "login", "unknown": "x"}
+        )
+        assert fields["Task"] == "Fix auth bug"
+        assert fields["Priority"] == "High"
+        assert fields["Project"] == "login"
+        assert "unknown" not in fields and "Notes" not in fields
+        assert config.route("Nonexistent").category == "Needs Sorting"
+        assert "Priority" not in config.route("Needs Sorting").fields("t", "High", "", {})
+
+    def test_invalid_config_is_rejected(self):
+        data = default_config_data()
+        data["categories"] = {**data["categories"], "Travel": {"description": "Trips", "examples": []}}
+        data["confidence_threshold"] = 2
+        with pytest.raises(ConfigError) as excinfo:
+            compile_config(data)
+        assert "Travel" in str(excinfo.value)
+        assert "confidence_threshold" in str(excinfo.value)
+
+    def test_edit_is_picked_up_without_restart(self, config_file):
+        before = get_config()
+        assert get_config() is before
+
+        def add_travel(data):
+            data["categories"]["Travel"] = {"description": "Trips", "examples": ["Book flights"]}
+            data["topic_databases"]["Travel"] = {
+                "data_source_id": "travel-ds", "name": "Travel",
+                "defaults": {"Status": "Not started"},
+                "required_fields": ["Task"], "optional_fields": ["Location"],
+            }
+
+        _edit_config(config_file, add_travel)
+        after = get_config()
+        assert after.version != before.version
+        assert "Travel" not in before.routes
+        assert "- Travel: location" in after.field_list
+
+        route, request = notion._topic_entry_request("Travel", "Book flights", "Medium", "", {"location": "Lisbon"})
+        assert route.name == "Travel"
+        assert request["parent"]["data_source_id"] == "travel-ds"
+        assert "Location" in request["properties"]
+
+    def test_invalid_edit_keeps_previous_config(self, config_file):
+        from task_capture_agent.config import loader
+
+        before = get_config()
+        _edit_config(config_file, lambda data: data.pop("master_db_id"))
+        assert get_config() is before
+        assert "master_db_id" in loader._watcher.last_error
+
+        _edit_config(config_file, lambda data: data.update(
+            master_db_id=MASTER_DB_ID, confidence_threshold=0.9,
+        ))
+        assert get_config().confidence_threshold == 0.9
+        assert loader._watcher.last_error is None